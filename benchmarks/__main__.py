@@ -0,0 +1,55 @@
+"""Run the offline benchmark suite
+
+    python -m benchmarks [--recordings DIR] [--repeat N] [--save results.json] [--compare baseline.json]
+
+GraphQL responses are served by a local stub server, so no credentials or network are needed.
+With `--compare`, the run fails if any benchmark is slower than the baseline by more than `--tolerance`.
+"""
+
+import argparse
+import json
+import sys
+
+from . import bench_import, bench_transport
+from .timing import HEADER
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recordings", help="directory with recorded responses named <OperationName>.json")
+    parser.add_argument("--repeat", type=int, default=10, help="number of timed runs of each benchmark")
+    parser.add_argument("--save", help="save results as JSON")
+    parser.add_argument("--compare", help="compare with results saved by a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown (default 0.25)")
+    args = parser.parse_args()
+
+    results = bench_import.run(repeat=args.repeat)
+    results += bench_transport.run(recordings=args.recordings, repeat=args.repeat)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {item["name"]: item for item in json.load(f)}
+
+    print(HEADER + ("    vs baseline" if baseline else ""))
+    regressions = []
+    for result in results:
+        line = str(result)
+        if result.name in baseline:
+            ratio = result.median / baseline[result.name]["median"]
+            line += f"    {ratio:.2f}x"
+            if ratio > 1 + args.tolerance:
+                regressions.append(result.name)
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump([result.as_dict() for result in results], f, indent=2)
+
+    if regressions:
+        print("Regressions: " + ", ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""Import time of the package, measured in fresh interpreters
+
+Run with `python -m benchmarks.bench_import` from the repository root to also list heavy
+dependencies loaded by `import ccai_client` (there should be none).
+"""
+
+import subprocess
+import sys
+
+from .timing import Result, measure
+
+# loaded only when DICOM studies, slide pyramids or shapes are first used
+HEAVY_MODULES = (
+    "dicomweb_client",
+    "pydicom",
+    "histpat_toolkit.dzi_file",
+    "histpat_toolkit.geom",
+    "histpat_toolkit.image_pyramid",
+)
+
+
+def python(code: str) -> str:
+    return subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+
+
+def heavy_modules_loaded() -> list[str]:
+    """Heavy modules in `sys.modules` after `import ccai_client`"""
+    code = f"import sys, ccai_client; print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    return python(code).split()
+
+
+def run(repeat: int = 10) -> list[Result]:
+    return [
+        measure("python startup", lambda: python("pass"), unit="runs", repeat=repeat),
+        measure("import ccai_client", lambda: python("import ccai_client"), unit="runs", repeat=repeat),
+    ]
+
+
+def main():
+    for result in run():
+        print(result)
+    print("Heavy modules loaded on import: " + (", ".join(heavy_modules_loaded()) or "none"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Parse throughput of API objects with and without pydantic validation
+
+Run with `python -m benchmarks.bench_parsing` from the repository root.
+"""
+
+import time
+
+from ccai_client import API
+from ccai_client.core_classes import Comment, Tag, set_strict_validation
+from ccai_client.file_classes import parse_graphql_file
+from ccai_client.patho import Annotation, PointCloud, PointCloudPoint, TiledMask
+
+from . import synthetic
+
+
+def throughput(parse, items: list, min_time: float = 0.5) -> float:
+    """Return number of items parsed per second"""
+    parsed = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            parse(item)
+        parsed += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return parsed / elapsed
+
+
+def main():
+    api = API(api_url="http://localhost", auth_headers={})
+    cases = [
+        ("Tag", Tag.from_graphql, [synthetic.tag(i) for i in range(1000)]),
+        (
+            "Comment",
+            lambda edge: Comment.from_graphql(edge["node"]),
+            synthetic.discussion(0, comments=1000)["comments"]["edges"],
+        ),
+        ("PointCloudPoint", PointCloudPoint.from_graphql, synthetic.points(10_000)),
+        ("PointCloud (10k points)", PointCloud.from_graphql, [synthetic.point_cloud(0, 10_000)]),
+        ("Annotation (50 vertices)", Annotation.from_graphql, [synthetic.annotation(i) for i in range(500)]),
+        ("TiledMask", TiledMask.from_graphql, [synthetic.tiled_mask(i) for i in range(500)]),
+        ("File (folder)", lambda data: parse_graphql_file(data, api), [synthetic.folder(i) for i in range(1000)]),
+        ("PathologySlideNode", lambda data: parse_graphql_file(data, api), [synthetic.slide(i) for i in range(1000)]),
+    ]
+
+    print(f"{'object type':<28}{'trusted [obj/s]':>18}{'strict [obj/s]':>18}{'speedup':>10}")
+    for name, parse, items in cases:
+        set_strict_validation(True)
+        strict = throughput(parse, items)
+        set_strict_validation(False)
+        trusted = throughput(parse, items)
+        print(f"{name:<28}{trusted:>18,.0f}{strict:>18,.0f}{trusted / strict:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""End-to-end benchmarks of GraphQL queries, parsing and transfers against a local stub server"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from ccai_client import API
+from ccai_client.file_classes import File, parse_graphql_file, upload_files_to_container
+from ccai_client.patho import Annotation, PointCloud, TiledMask
+from ccai_client.queries import query_entity
+
+from . import synthetic
+from .stub_server import StubServer
+from .timing import Result, measure
+
+FOLDER_CHILDREN = 5000
+ANNOTATIONS = 5000
+POINTS = 200_000
+TILES = 100_000
+BLOB_SIZE = 64 << 20
+
+
+def synthetic_responses(server_url: str) -> dict[str, dict]:
+    folder = synthetic.folder(0)
+    folder["children"] = {"edges": [{"node": synthetic.slide(i)} for i in range(FOLDER_CHILDREN)]}
+    return {
+        "GetCurrentEntity": {"data": {"entity": {"id": "1", "name": "User", "organization": {"name": "Org"}}}},
+        "FileChildren": {"data": {"file": folder}},
+        "GetFile": {"data": {"file": synthetic.slide(0, point_clouds=1, points_per_cloud=POINTS)}},
+        "GetPathologySlideAnnotations": {
+            "data": {
+                "file": {"annotations": {"edges": [{"node": synthetic.annotation(i)} for i in range(ANNOTATIONS)]}}
+            }
+        },
+        "GetTiledMaskTiles": {"data": {"tiledMask": synthetic.tiles(TILES)}},
+        "GetPathologySlideDownload": {"data": {"file": {"downloadUrl": f"{server_url}/blob/{BLOB_SIZE}"}}},
+        "UploadContainer": {
+            "data": {
+                "uploadContainerCreate": {
+                    "container": {"id": "container-0"},
+                    "presignUpload": {
+                        "files": [{"url": f"{server_url}/upload", "method": "PUT", "data": {}, "headers": {}}]
+                    },
+                }
+            }
+        },
+    }
+
+
+def quiet(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def run(recordings: str | Path | None = None, repeat: int = 10) -> list[Result]:
+    results = []
+    with StubServer(recordings=recordings) as server:
+        for name, body in synthetic_responses(server.url).items():
+            # recorded responses take precedence over synthetic ones
+            if name not in server.responses:
+                server.set_response(name, body)
+        responses = {name: json.loads(body) for name, body in server.responses.items()}
+
+        api = API(api_url=server.url, auth_headers={})
+        folder = parse_graphql_file(synthetic.folder(0), api)
+        slide = parse_graphql_file(synthetic.slide(0), api)
+
+        results.append(
+            measure("query_graphql (small query)", lambda: api.query_graphql(query_entity), repeat=10 * repeat)
+        )
+
+        children = responses["FileChildren"]["data"]["file"]["children"]["edges"]
+        results.append(
+            measure("File.children (large folder)", folder.children, items=len(children), unit="files", repeat=repeat)
+        )
+        results.append(
+            measure(
+                "parse_graphql_file (large folder)",
+                lambda: [parse_graphql_file(edge["node"], api) for edge in children],
+                items=len(children),
+                unit="files",
+                repeat=repeat,
+            )
+        )
+
+        annotations = responses["GetPathologySlideAnnotations"]["data"]["file"]["annotations"]["edges"]
+        results.append(
+            measure(
+                "list_annotations (annotation-heavy slide)",
+                slide.list_annotations,
+                items=len(annotations),
+                unit="annotations",
+                repeat=repeat,
+            )
+        )
+        results.append(
+            measure(
+                "Annotation.from_graphql",
+                lambda: [Annotation.from_graphql(edge["node"]) for edge in annotations],
+                items=len(annotations),
+                unit="annotations",
+                repeat=repeat,
+            )
+        )
+
+        point_clouds = responses["GetFile"]["data"]["file"]["pointClouds"]["edges"]
+        points = sum(len(edge["node"]["pointsList"]) for edge in point_clouds)
+        results.append(
+            measure(
+                "File.get (slide with big point cloud)",
+                lambda: File.get(api, id="slide-0"),
+                items=points,
+                unit="points",
+                repeat=repeat,
+            )
+        )
+        results.append(
+            measure(
+                "PointCloud.from_graphql",
+                lambda: [PointCloud.from_graphql(edge["node"]) for edge in point_clouds],
+                items=points,
+                unit="points",
+                repeat=repeat,
+            )
+        )
+
+        tiles = len(responses["GetTiledMaskTiles"]["data"]["tiledMask"]["tiles"])
+        mask = TiledMask.from_graphql(synthetic.tiled_mask(0))
+        results.append(
+            measure(
+                "TiledMask.get_pyramid_info (tile list)",
+                lambda: mask.get_pyramid_info(api),
+                items=tiles,
+                unit="tiles",
+                repeat=repeat,
+            )
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            results.append(
+                measure(
+                    "download_original",
+                    lambda: quiet(slide.download_original, directory),
+                    items=BLOB_SIZE,
+                    unit="B",
+                    repeat=max(1, repeat // 2),
+                )
+            )
+
+            upload_path = os.path.join(directory, "upload.bin")
+            with open(upload_path, "wb") as f:
+                f.write(os.urandom(BLOB_SIZE))
+            results.append(
+                measure(
+                    "upload_files_to_container",
+                    lambda: upload_files_to_container(api, [upload_path], ["upload.bin"]),
+                    items=BLOB_SIZE,
+                    unit="B",
+                    repeat=max(1, repeat // 2),
+                )
+            )
+    return results
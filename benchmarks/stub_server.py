@@ -0,0 +1,109 @@
+"""Local HTTP server replaying GraphQL responses and serving blobs for offline benchmarks"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from ccai_client.instrumentation import operation_name
+
+BLOB_CHUNK = bytes(range(256)) * 4096
+
+
+class StubServer:
+    """GraphQL stub answering each operation with a fixed response body
+
+    Responses are keyed by operation name (e.g. `FileChildren`). They can be given as Python
+    objects or loaded from a directory of recorded responses named `<OperationName>.json`,
+    each containing the full response body (`{"data": ...}`).
+
+    Besides `/graphql` the server exposes `GET /blob/<size>` returning `size` bytes and
+    `PUT|POST /upload` which reads and discards the request body.
+    """
+
+    def __init__(self, responses: dict[str, dict] | None = None, recordings: str | Path | None = None):
+        self.responses: dict[str, bytes] = {}
+        for name, body in (responses or {}).items():
+            self.set_response(name, body)
+        if recordings:
+            for path in Path(recordings).glob("*.json"):
+                self.responses[path.stem] = path.read_bytes()
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_response(self, operation_name: str, body: dict):
+        self.responses[operation_name] = json.dumps(body).encode()
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are buffered and flushed in one write at the end of each request. Sent
+            # separately on a keep-alive connection they are held back by Nagle's algorithm until the
+            # client's delayed ACK, adding ~40 ms to every request.
+            wbufsize = 1 << 16
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self):
+                stub.requests += 1
+                if self.path.startswith("/upload"):
+                    self._read_body()
+                    return self._send(204, b"")
+                if not self.path.startswith("/graphql"):
+                    return self._send(404, b"")
+
+                name = operation_name(json.loads(self._read_body())["query"])
+                body = stub.responses.get(name)
+                if body is None:
+                    error = {"errors": [{"message": f"No stub response for {name}"}]}
+                    return self._send(200, json.dumps(error).encode())
+                self._send(200, body)
+
+            def do_PUT(self):
+                self.do_POST()
+
+            def do_GET(self):
+                stub.requests += 1
+                if not self.path.startswith("/blob/"):
+                    return self._send(404, b"")
+                size = int(self.path.split("/")[2].split("?")[0])
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(size))
+                self.send_header("Content-Disposition", f'attachment; filename="blob-{size}.bin"')
+                self.end_headers()
+                while size > 0:
+                    chunk = BLOB_CHUNK[: min(size, len(BLOB_CHUNK))]
+                    self.wfile.write(chunk)
+                    size -= len(chunk)
+
+        return Handler
@@ -0,0 +1,135 @@
+"""Synthetic GraphQL payloads shaped like real API responses, used by the benchmarks"""
+
+import random
+
+CREATED_AT = "2025-01-01T12:00:00.000000+00:00"
+
+
+def author(i: int = 0) -> dict:
+    return {"name": f"User {i % 10}"}
+
+
+def discussion(i: int, comments: int = 2) -> dict:
+    return {
+        "id": f"discussion-{i}",
+        "comments": {
+            "edges": [
+                {
+                    "node": {
+                        "id": f"comment-{i}-{j}",
+                        "text": "Lorem ipsum",
+                        "createdAt": CREATED_AT,
+                        "author": author(j),
+                    }
+                }
+                for j in range(comments)
+            ]
+        },
+    }
+
+
+def tag(i: int) -> dict:
+    return {"id": f"tag-{i}", "value": f"tag {i % 20}"}
+
+
+def annotation(i: int, vertices: int = 50) -> dict:
+    rng = random.Random(i)
+    return {
+        "id": f"annotation-{i}",
+        "number": i,
+        "author": author(i),
+        "shapeType": "polygon",
+        "shapeData": [rng.randrange(100_000) for _ in range(2 * vertices)],
+        "color": "#ff0000",
+        "label": f"label {i % 5}",
+        "isLabelVisible": True,
+        "slideId": "slide-0",
+        "pointType": None,
+        "createdAt": CREATED_AT,
+        "discussion": discussion(i),
+    }
+
+
+def points(count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {"x": rng.randrange(100_000), "y": rng.randrange(100_000), "v": rng.randrange(4), "r": 3.5, "s": 90}
+        for _ in range(count)
+    ]
+
+
+def point_cloud(i: int, count: int) -> dict:
+    return {
+        "id": f"point-cloud-{i}",
+        "statistics": [{"color": {"value": str(key), "name": f"class {key}"}, "value": count // 4} for key in range(4)],
+        "pointsList": points(count, seed=i),
+    }
+
+
+def slide(i: int, point_clouds: int = 0, points_per_cloud: int = 0) -> dict:
+    return {
+        "id": f"slide-{i}",
+        "name": f"Slide {i}.svs",
+        "__typename": "PathologySlideNode",
+        "createdAt": CREATED_AT,
+        "updatedAt": CREATED_AT,
+        "tags": [tag(i), tag(i + 1)],
+        "discussion": discussion(i),
+        "isReady": True,
+        "thumbnailUrl": f"https://example.com/{i}/thumbnail.jpg",
+        "processingTask": {"status": "DONE", "progress": 1.0, "errorMessage": None},
+        "dziUrl": f"https://example.com/{i}/image.dzi",
+        "slideProperties": {"mpp": 0.25, "magnification": 40},
+        "pointClouds": {"edges": [{"node": point_cloud(j, points_per_cloud)} for j in range(point_clouds)]},
+    }
+
+
+def folder(i: int) -> dict:
+    return {
+        "id": f"folder-{i}",
+        "name": f"Folder {i}",
+        "__typename": "FolderNode",
+        "createdAt": CREATED_AT,
+        "updatedAt": CREATED_AT,
+        "tags": [],
+        "discussion": discussion(i, comments=0),
+    }
+
+
+def color_map(i: int = 0, colors: int = 8) -> dict:
+    return {
+        "id": f"color-map-{i}",
+        "name": f"Color map {i}",
+        "codename": f"color-map-{i}",
+        "colors": {
+            "edges": [
+                {"node": {"name": f"class {key}", "key": key, "value": f"#{key * 30:02x}{255 - key * 30:02x}00"}}
+                for key in range(colors)
+            ]
+        },
+    }
+
+
+def tiled_mask(i: int) -> dict:
+    return {
+        "id": f"tiled-mask-{i}",
+        "author": author(i),
+        "colorMap": color_map(),
+        "algorithmRun": {
+            "id": f"algorithm-run-{i}",
+            "algorithm": {"id": "algorithm-0", "name": "Algorithm"},
+            "discussion": discussion(i),
+            "ratings": [{"score": 5, "author": author(i)}],
+        },
+        "updatedAt": CREATED_AT,
+    }
+
+
+def tiles(count: int, level: int = 10) -> dict:
+    side = int(count**0.5) + 1
+    return {
+        "tileSize": 256,
+        "tilesUrl": "https://example.com/tiles",
+        "scale": 0.5,
+        "tiles": [{"x": i % side, "y": i // side, "level": level} for i in range(count)],
+    }
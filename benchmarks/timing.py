@@ -0,0 +1,39 @@
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+
+@dataclass
+class Result:
+    name: str
+    median: float
+    p95: float
+    # items (objects, bytes, ...) processed per second, based on the median time
+    throughput: float
+    unit: str
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:<40}{self.median * 1000:>12.2f}{self.p95 * 1000:>12.2f}{self.throughput:>16,.0f} {self.unit}/s"
+        )
+
+
+HEADER = f"{'benchmark':<40}{'median [ms]':>12}{'p95 [ms]':>12}{'throughput':>16}"
+
+
+def measure(name: str, fn: Callable[[], object], items: int = 1, unit: str = "req", repeat: int = 10) -> Result:
+    """Run `fn` once as warm-up and then `repeat` times, `items` is the amount of work done by a single call"""
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    median = statistics.median(times)
+    p95 = times[min(len(times) - 1, round(0.95 * (len(times) - 1)))]
+    return Result(name=name, median=median, p95=p95, throughput=items / median, unit=unit)
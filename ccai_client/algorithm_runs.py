@@ -0,0 +1,180 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Literal
+
+from . import queries
+from .api import API
+from .file_classes import File, PathologySlideNode
+from .patho import Algorithm, Annotation, PointCloud, RunAlgorithm, TiledMask
+
+SlideInput = PathologySlideNode | tuple[PathologySlideNode, Annotation | str | None]
+
+
+@dataclass
+class AlgorithmRunResult:
+    """Finished (or failed) run of an algorithm on one slide"""
+
+    slide: PathologySlideNode
+    roi: str | None
+    run: RunAlgorithm | None
+    tiled_masks: list[TiledMask] = field(default_factory=list)
+    point_clouds: list[PointCloud] = field(default_factory=list)
+    # seconds from starting the run to finding its outputs
+    elapsed: float = 0.0
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class _PendingRun:
+    slide: PathologySlideNode
+    roi: str | None
+    run: RunAlgorithm
+    known_point_clouds: set[str]
+    started: float
+    next_poll: float
+    interval: float
+    new_masks: set[str] = field(default_factory=set)
+    new_point_clouds: set[str] = field(default_factory=set)
+
+
+def _outputs(api: API, slide_id: str) -> tuple[dict[str, str | None], set[str]]:
+    """Run IDs of tiled masks (by mask ID) and IDs of point clouds of a slide"""
+    data = api.query_graphql(queries.query_pathologyslide_algorithm_outputs, variables={"id": slide_id})
+    masks = {
+        edge["node"]["id"]: edge["node"]["algorithmRun"]["id"] if edge["node"]["algorithmRun"] else None
+        for edge in data["tiledMasks"]["edges"]
+    }
+    return masks, {edge["node"]["id"] for edge in data["pointClouds"]["edges"]}
+
+
+def run_algorithm_on_slides(
+    api: API,
+    algorithm: Algorithm | str,
+    slides: Iterable[SlideInput],
+    wait_for: Literal["any", "tiled_mask", "point_cloud", "both"] = "any",
+    max_running: int = 8,
+    poll_interval: float = 5.0,
+    max_poll_interval: float = 60.0,
+    timeout: float | None = 3600.0,
+    verbose: bool = False,
+) -> Iterator[AlgorithmRunResult]:
+    """Run an algorithm on many slides and yield every run with its outputs as soon as it finishes
+
+    At most `max_running` runs are started at once, the next slide is submitted when one of them
+    finishes. Runs are polled with a lean query, waiting longer between polls of long-running ones.
+    A run is finished when a tiled mask created by the run appears on the slide and/or a point cloud
+    which was not there before the run (see `wait_for`). Point clouds are not linked to runs, so
+    running several algorithms on one slide at the same time can attribute point clouds wrongly.
+
+    Example:
+        slides = root.search_files(deep=True, types=["PathologySlideNode"])
+        for result in run_algorithm_on_slides(api, algorithm, slides):
+            print(result.slide.name, result.error or len(result.tiled_masks))
+
+    Args:
+        api: API instance
+        algorithm: Algorithm or its ID
+        slides: Slides, or (slide, ROI annotation or its ID) pairs, e.g. a generator of search results
+        wait_for: Which outputs finish a run
+        max_running: Maximum number of runs in progress
+        poll_interval: Seconds between the first polls of a run
+        max_poll_interval: Maximum seconds between polls of a run
+        timeout: Seconds after which a run without outputs is reported as failed, None to wait forever
+        verbose: If True, print progress messages
+
+    Returns:
+        Iterator[AlgorithmRunResult]: Runs in the order they finish
+    """
+    algorithm_id = algorithm if isinstance(algorithm, str) else algorithm.id
+    inputs = iter(slides)
+    running: list[_PendingRun] = []
+    exhausted = False
+
+    def finished(pending: _PendingRun) -> bool:
+        match wait_for:
+            case "tiled_mask":
+                return bool(pending.new_masks)
+            case "point_cloud":
+                return bool(pending.new_point_clouds)
+            case "both":
+                return bool(pending.new_masks and pending.new_point_clouds)
+            case _:
+                return bool(pending.new_masks or pending.new_point_clouds)
+
+    def poll(pending: _PendingRun) -> Exception | None:
+        try:
+            masks, point_clouds = _outputs(api, pending.slide.id)
+        except Exception as e:
+            return e
+        pending.new_masks = {mask_id for mask_id, run_id in masks.items() if run_id == pending.run.id}
+        pending.new_point_clouds = point_clouds - pending.known_point_clouds
+        return None
+
+    def collect(pending: _PendingRun) -> AlgorithmRunResult:
+        result = AlgorithmRunResult(pending.slide, pending.roi, pending.run, elapsed=time.monotonic() - pending.started)
+        if pending.new_masks:
+            result.tiled_masks = [mask for mask in pending.slide.list_tiled_masks() if mask.id in pending.new_masks]
+        if pending.new_point_clouds:
+            slide = File.get(api, id=pending.slide.id)
+            result.point_clouds = [cloud for cloud in slide.point_clouds if cloud.id in pending.new_point_clouds]
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_running) as executor:
+        while True:
+            while not exhausted and len(running) < max_running:
+                item = next(inputs, None)
+                if item is None:
+                    exhausted = True
+                    break
+                slide, roi = item if isinstance(item, tuple) else (item, None)
+                roi_id = roi.id if isinstance(roi, Annotation) else roi
+                try:
+                    _, known_point_clouds = _outputs(api, slide.id)
+                    run = RunAlgorithm.run(api, slide.id, algorithm_id, roi=roi_id)
+                except Exception as e:
+                    yield AlgorithmRunResult(slide, roi_id, None, error=str(e))
+                    continue
+                if verbose:
+                    print(f"Started {run.algorithm.name} on {slide.name}")
+                now = time.monotonic()
+                running.append(
+                    _PendingRun(slide, roi_id, run, known_point_clouds, now, now + poll_interval, poll_interval)
+                )
+            if not running:
+                break
+
+            time.sleep(max(0.0, min(pending.next_poll for pending in running) - time.monotonic()))
+            now = time.monotonic()
+            due = [pending for pending in running if pending.next_poll <= now]
+            errors = list(executor.map(poll, due))
+
+            done = []
+            for pending, error in zip(due, errors):
+                if error is None and finished(pending):
+                    done.append(pending)
+                elif timeout is not None and now - pending.started > timeout:
+                    running.remove(pending)
+                    yield AlgorithmRunResult(
+                        pending.slide, pending.roi, pending.run, elapsed=now - pending.started, error="Timed out"
+                    )
+                else:
+                    # transient poll errors are retried at the next poll
+                    pending.interval = min(pending.interval * 1.5, max_poll_interval)
+                    pending.next_poll = now + pending.interval
+
+            for pending in done:
+                running.remove(pending)
+            futures = [(pending, executor.submit(collect, pending)) for pending in done]
+            for pending, future in futures:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = AlgorithmRunResult(pending.slide, pending.roi, pending.run, error=str(e))
+                if verbose:
+                    print(f"Finished {pending.run.algorithm.name} on {pending.slide.name} in {result.elapsed:.0f}s")
+                yield result
@@ -1,10 +1,30 @@
 import json
+import threading
+import time
 from pathlib import Path
+from typing import Any, Iterator
 
 import requests
 
-from .auth import authenticate
+from .auth import AuthenticationError, authenticate
+from .compression import ACCEPT_ENCODING, CompressionPolicy
+from .identity import IdentityMap
+from .instrumentation import Hook, Metrics, RequestEvent, parse_operation
 from .queries import query_entity
+from .ratelimit import RateLimiter
+from .retry import IDEMPOTENT_METHODS, RetryPolicy
+from .streaming import iter_json_items, loads
+from .token_store import load_token, locked, save_token
+
+
+def _rejects_content_encoding(response: requests.Response) -> bool:
+    """Whether the server refused a compressed request body: 415, or 400 failing to decode it"""
+    if response.status_code == 415:
+        return True
+    if response.status_code != 400:
+        return False
+    text = response.text[:1000].lower()
+    return any(word in text for word in ("decod", "encoding", "gzip", "compress"))
 
 
 class API:
@@ -14,69 +34,379 @@ class API:
         api_url: str = "https://api.cancercenter.ai",
         save_token_to: str | Path | None = None,
         debug_logs: bool = False,
+        auth_headers: dict[str, str] | None = None,
+        retry_policy: RetryPolicy | None = None,
+        graphql_limiter: RateLimiter | None = None,
+        transfer_limiter: RateLimiter | None = None,
+        verify_token: bool = False,
+        interactive_login: bool = True,
+        compression: CompressionPolicy | None = None,
     ):
+        """Client of the CancerCenter.ai API, safe to share between threads
+
+        A token saved in `save_token_to` is trusted without a round trip to the server. When the
+        server rejects it (HTTP 401), the user is asked to log in again once (or `AuthenticationError`
+        is raised if `interactive_login` is False) and the new token is saved. The token file is
+        locked while it is updated, so many processes can share it.
+
+        Args:
+            organization: Codename of the organization
+            api_url: URL of the API
+            save_token_to: JSON file where authentication tokens are saved and loaded from
+            debug_logs: Print all queries and responses
+            auth_headers: Use these authentication headers instead of logging in
+            retry_policy: Timeouts and retries of HTTP requests
+            graphql_limiter: Rate limiter of GraphQL queries
+            transfer_limiter: Rate limiter of uploads and downloads
+            verify_token: Verify a loaded token with a query right away and log in again if it fails
+            interactive_login: Ask the user to log in when no valid token is available
+            compression: Compression of GraphQL requests, responses are always requested compressed
+        """
         self.api_url = api_url
         self.organization = organization
         self.debug_logs = debug_logs
-        if save_token_to:
-            auth_headers_loaded = self.try_load_auth_headers(Path(save_token_to))
+        self.interactive_login = interactive_login
+        self.token_path = Path(save_token_to) if save_token_to else None
+        self.retry_policy = retry_policy or RetryPolicy()
+        # separate budgets for API queries and for uploads/downloads, shared by all threads using this API
+        self.graphql_limiter = graphql_limiter or RateLimiter()
+        self.transfer_limiter = transfer_limiter or RateLimiter()
+        self.compression = compression or CompressionPolicy()
+        # whether the server accepts compressed request bodies, None until the first one is sent
+        self._compression_accepted: bool | None = None
+        self._compression_probe = threading.Lock()
+        self.metrics = Metrics()
+        self.hooks: list[Hook] = [self.metrics]
+        # one object per file, annotation and tiled mask, updated when fetched again
+        self.identity_map = IdentityMap()
+        self._auth_lock = threading.Lock()
+        self._local = threading.local()
+        if auth_headers is not None:
+            self.auth_headers = auth_headers
+            return
+
+        if self.token_path and self.try_load_auth_headers(self.token_path):
+            if verify_token and not self.verify_auth():
+                self._refresh_auth(self.auth_headers)
+            return
+
+        self.auth_headers = None
+        self._refresh_auth(None)
+
+    def __getstate__(self) -> dict:
+        """Pickle only the configuration - the token is reloaded from `token_path` when it is set.
+
+        Metrics, custom hooks, the identity map and HTTP sessions are not pickled, an unpickled API (e.g. in a worker
+        process) starts with fresh metrics and opens its own connections when first used.
+        """
+        state = {
+            "api_url": self.api_url,
+            "organization": self.organization,
+            "debug_logs": self.debug_logs,
+            "interactive_login": self.interactive_login,
+            "token_path": self.token_path,
+            "retry_policy": self.retry_policy,
+            "graphql_limiter": self.graphql_limiter,
+            "transfer_limiter": self.transfer_limiter,
+            "compression": self.compression,
+        }
+        if self.token_path is None or load_token(self.token_path, self._token_key) != self.auth_headers:
+            state["auth_headers"] = self.auth_headers
+        return state
+
+    def __setstate__(self, state: dict):
+        auth_headers = state.pop("auth_headers", None)
+        self.__dict__.update(state)
+        self._compression_accepted = None
+        self._compression_probe = threading.Lock()
+        self.metrics = Metrics()
+        self.hooks = [self.metrics]
+        self.identity_map = IdentityMap()
+        self._auth_lock = threading.Lock()
+        self._local = threading.local()
+        if auth_headers is None and self.token_path is not None:
+            auth_headers = load_token(self.token_path, self._token_key)
+        self.auth_headers = auth_headers
+
+    @property
+    def _token_key(self) -> str:
+        return f"{self.api_url}:{self.organization}"
+
+    @property
+    def session(self) -> requests.Session:
+        """HTTP session of the current thread, reusing connections between requests"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            # requests asks only for gzip and deflate, urllib3 can also decode br and zstd when installed
+            session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        return session
+
+    def _login(self) -> dict[str, str]:
+        if not self.interactive_login:
+            raise AuthenticationError("Token expired or invalid, log in again")
+        return authenticate(self.api_url, self.organization, timeout=self.retry_policy.timeout)
+
+    def _refresh_auth(self, rejected_headers: dict[str, str] | None):
+        """Replace rejected authentication headers - once, even if many threads or processes find them rejected"""
+        with self._auth_lock:
+            if self.auth_headers != rejected_headers:
+                # another thread has already refreshed them
+                return
+            if self.token_path is None:
+                self.auth_headers = self._login()
+                return
+            with locked(self.token_path):
+                saved = load_token(self.token_path, self._token_key)
+                if saved and saved != rejected_headers:
+                    # another process has already logged in
+                    self.auth_headers = saved
+                    return
+                self.auth_headers = self._login()
+                save_token(self.token_path, self._token_key, self.auth_headers)
+
+    def add_hook(self, hook: Hook):
+        """Register a callable receiving a `RequestEvent` after every request"""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Hook):
+        self.hooks.remove(hook)
+
+    def _emit(self, event: RequestEvent):
+        for hook in self.hooks:
+            hook(event)
+
+    def _send(self, method: str, url: str, kind: str, operation: str, idempotent: bool, **kwargs):
+        """Send a request, retrying it according to the retry policy, and describe it with an event
+
+        The event is not emitted yet, so that the caller can complete it.
+        """
+        kwargs.setdefault("timeout", self.retry_policy.timeout)
+        data = kwargs.get("data")
+        request_bytes = len(data) if isinstance(data, (bytes, str)) else 0
+        position = None
+        if hasattr(data, "seek") and hasattr(data, "tell"):
+            # uploaded file - its size is what is left to read, it is rewound before every retry
+            position = data.tell()
+            request_bytes = data.seek(0, 2) - position
+            data.seek(position)
+
+        limiter = self.graphql_limiter if kind == "graphql" else self.transfer_limiter
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            response = error = None
+            with limiter:
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except requests.RequestException as e:
+                    error = e
+            if response is not None and response.status_code == 429:
+                limiter.on_throttled()
+            elif error is None:
+                limiter.on_success()
+            if not self.retry_policy.should_retry(attempt, idempotent, response, error):
+                break
+            if response is not None:
+                response.close()
+            time.sleep(self.retry_policy.backoff(attempt, response))
+            attempt += 1
+            if position is not None:
+                data.seek(position)
+
+        latency = time.perf_counter() - start
+        if error is not None:
+            event = RequestEvent(kind, operation, None, latency, request_bytes, 0, retries=attempt, error=str(error))
+            self._emit(event)
+            raise error
+
+        bytes_saved = 0
+        if kwargs.get("stream"):
+            # completed by _emit_when_closed once the body is read
+            response_bytes = 0
+        else:
+            # bytes read from the connection, before decoding the Content-Encoding
+            response_bytes = response.raw.tell()
+            bytes_saved = max(len(response.content) - response_bytes, 0)
+        event = RequestEvent(
+            kind=kind,
+            operation=operation,
+            status=response.status_code,
+            latency=latency,
+            request_bytes=request_bytes,
+            response_bytes=response_bytes,
+            retries=attempt,
+            error=None if response.ok else f"HTTP {response.status_code}",
+            bytes_saved=bytes_saved,
+        )
+        return response, event
+
+    def request(self, method: str, url: str, idempotent: bool | None = None, **kwargs) -> requests.Response:
+        """Send an HTTP request outside of the GraphQL API (uploads, downloads) and record it
+
+        Accepts the same keyword arguments as `requests.request`. Timeouts and retries follow
+        `retry_policy`; `idempotent` defaults to True for GET, HEAD, OPTIONS, PUT and DELETE requests.
+        Streamed responses (`stream=True`) are recorded when they are closed, so they should be used
+        as context managers (`with api.request(...) as response:`).
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        response, event = self._send(method, url, "transfer", method.upper(), idempotent, **kwargs)
+        if kwargs.get("stream"):
+            self._emit_when_closed(response, event)
         else:
-            auth_headers_loaded = False
+            self._emit(event)
+        return response
+
+    def _emit_when_closed(self, response: requests.Response, event: RequestEvent):
+        """Emit the event of a streamed response when it is closed, including the time and bytes of its body"""
+        headers_received = time.perf_counter()
+        close = response.close
+        emitted = False
 
-        if not auth_headers_loaded:
-            self.auth_headers = authenticate(self.api_url, organization)
-            if save_token_to:
-                self.save_auth_headers(Path(save_token_to))
+        def close_and_emit():
+            nonlocal emitted
+            if not emitted:
+                emitted = True
+                event.latency += time.perf_counter() - headers_received
+                event.response_bytes = response.raw.tell()
+                self._emit(event)
+            close()
+
+        response.close = close_and_emit
+
+    def _post_graphql(self, query: str, variables: dict | None, retry: bool | None, stream: bool = False):
+        operation_type, operation = parse_operation(query)
+        if retry is None:
+            retry = operation_type != "mutation" or self.retry_policy.retry_mutations
 
-    def query_graphql(self, query: str, variables: dict | None = None):
         if self.debug_logs:
             print(f"Query: {query}")
             print(f"Variables: {variables}")
 
-        response = requests.post(
-            self.api_url + "/graphql",
-            json={"query": query, "variables": variables},
-            headers=self.auth_headers,
-        )
+        body = json.dumps({"query": query, "variables": variables}).encode()
+        compressed = None if self._compression_accepted is False else self.compression.compress(body)
+        # the first compressed request finds out whether the server accepts them, the others wait for it
+        probe = compressed is not None and self._compression_accepted is None
+        if probe:
+            self._compression_probe.acquire()
+            if self._compression_accepted is False:
+                compressed = None
+        try:
+            refreshed = False
+            while True:
+                auth_headers = self.auth_headers
+                headers = {**auth_headers, "Content-Type": "application/json"}
+                if compressed is not None:
+                    headers["Content-Encoding"] = "gzip"
+                response, event = self._send(
+                    "POST",
+                    self.api_url + "/graphql",
+                    "graphql",
+                    operation,
+                    retry,
+                    data=body if compressed is None else compressed,
+                    headers=headers,
+                    stream=stream,
+                )
+                if compressed is not None:
+                    event.bytes_saved += len(body) - len(compressed)
+                    if _rejects_content_encoding(response):
+                        # do not compress requests anymore, and send this query again uncompressed
+                        self._compression_accepted = False
+                        response.close()
+                        self._emit(event)
+                        compressed = None
+                        continue
+                    if response.ok:
+                        self._compression_accepted = True
+                if response.status_code != 401 or refreshed:
+                    return response, event
+                # token expired - log in again and repeat the query once
+                response.close()
+                self._emit(event)
+                self._refresh_auth(auth_headers)
+                refreshed = True
+        finally:
+            if probe:
+                self._compression_probe.release()
+
+    def execute_graphql(self, query: str, variables: dict | None = None, retry: bool | None = None) -> dict:
+        """Send a GraphQL query and return the whole response body, including `errors`
+
+        Unlike `query_graphql`, GraphQL errors are not raised, so partial results of documents
+        with many operations (see `ccai_client.batch`) can be inspected. HTTP errors are raised.
+        """
+        response, event = self._post_graphql(query, variables, retry)
 
         if self.debug_logs:
             print(f"Response: {response.text}")
 
-        response.raise_for_status()
-        responsein_json = response.json()
+        try:
+            response.raise_for_status()
+            responsein_json = loads(response.content)
+
+            if "errors" in responsein_json:
+                event.error = responsein_json["errors"][0]["message"]
+        finally:
+            self._emit(event)
+        return responsein_json
+
+    def stream_graphql(
+        self, query: str, prefixes: tuple[str, ...], variables: dict | None = None, retry: bool | None = None
+    ) -> Iterator[tuple[str, Any]]:
+        """Send a GraphQL query and yield values at the given JSON paths while the response is received
 
+        Large responses (annotations, point clouds) are parsed incrementally when ijson is installed,
+        so values can be processed or stored before the rest of the response arrives. See
+        `ccai_client.streaming.iter_json_items` for the path syntax.
+
+        Example:
+            for _, node in api.stream_graphql(query, ("data.file.annotations.edges.item.node",), {"id": id}):
+                ...
+
+        Raises:
+            Exception: When the response contains GraphQL errors
+        """
+        response, event = self._post_graphql(query, variables, retry, stream=True)
+        received = time.perf_counter()
+        try:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            for prefix, value in iter_json_items(response.raw, (*prefixes, "errors.item")):
+                if prefix == "errors.item":
+                    event.error = value["message"]
+                    raise Exception("GraphQL query failed: " + value["message"])
+                yield prefix, value
+        finally:
+            response.close()
+            event.latency += time.perf_counter() - received
+            event.response_bytes = response.raw.tell()
+            self._emit(event)
+
+    def query_graphql(self, query: str, variables: dict | None = None, retry: bool | None = None):
+        """Send a GraphQL query and return the first field of its data
+
+        Queries are retried according to `retry_policy`. Mutations are retried only if
+        `retry` is True or the policy allows retrying mutations.
+        """
+        responsein_json = self.execute_graphql(query, variables, retry)
         if "errors" in responsein_json:
-            error_message = responsein_json["errors"][0]["message"]
-            raise Exception("GraphQL query failed: " + error_message)
+            raise Exception("GraphQL query failed: " + responsein_json["errors"][0]["message"])
 
         data = responsein_json["data"]
         return list(data.values())[0]
 
     def try_load_auth_headers(self, path: Path):
-        if not path.exists():
+        auth_headers = load_token(path, self._token_key)
+        if auth_headers is None:
             return False
-
-        with open(path, "r") as f:
-            data = json.load(f)
-
-        key = f"{self.api_url}:{self.organization}"
-        if key not in data:
-            return False
-
-        self.auth_headers = data[key]
-        return self.verify_auth()
+        self.auth_headers = auth_headers
+        return True
 
     def save_auth_headers(self, path: Path):
-        key = f"{self.api_url}:{self.organization}"
-        if path.exists():
-            with open(path, "r") as f:
-                data = json.load(f)
-        else:
-            data = {}
-
-        data[key] = self.auth_headers
-        with open(path, "w") as f:
-            json.dump(data, f)
+        with locked(path):
+            save_token(path, self._token_key, self.auth_headers)
 
     def verify_auth(self):
         try:
@@ -2,19 +2,31 @@ import time
 
 import requests
 
+DEFAULT_TIMEOUT = (10.0, 60.0)
 
-def create_token(api_url: str, organization: str | None):
+
+class AuthenticationError(Exception):
+    pass
+
+
+def create_token(api_url: str, organization: str | None, timeout=DEFAULT_TIMEOUT):
     headers = {}
     if organization:
         headers["x-organization"] = organization
-    response = requests.post(api_url + "/api/token/create", headers=headers)
+    response = requests.post(api_url + "/api/token/create", headers=headers, timeout=timeout)
     response.raise_for_status()
     result = response.json()
     return result["authorization_url"], result["activation_code"]
 
 
-def wait_for_login(api_url: str, activation_code: str) -> dict[str, str] | None:
-    response = requests.post(api_url + "/api/token/activate", json={"activation_code": activation_code})
+def wait_for_login(api_url: str, activation_code: str, timeout=DEFAULT_TIMEOUT) -> dict[str, str] | None:
+    try:
+        response = requests.post(
+            api_url + "/api/token/activate", json={"activation_code": activation_code}, timeout=timeout
+        )
+    except (requests.ConnectionError, requests.Timeout):
+        # keep polling, the user may still be logging in
+        return
     if response.status_code == 401:
         return
     response.raise_for_status()
@@ -27,12 +39,12 @@ def wait_for_login(api_url: str, activation_code: str) -> dict[str, str] | None:
     return {"x-api-token": auth_token}
 
 
-def authenticate(api_url: str, organization: str | None) -> dict[str, str]:
-    magic_link, activation_code = create_token(api_url, organization)
+def authenticate(api_url: str, organization: str | None, timeout=DEFAULT_TIMEOUT) -> dict[str, str]:
+    magic_link, activation_code = create_token(api_url, organization, timeout=timeout)
     print("Paste the following link in your browser:\n\n" + magic_link)
 
     while True:
         time.sleep(1)
-        auth = wait_for_login(api_url, activation_code=activation_code)
+        auth = wait_for_login(api_url, activation_code=activation_code, timeout=timeout)
         if auth:
             return auth
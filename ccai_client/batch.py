@@ -0,0 +1,262 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
+
+from .api import API
+
+if TYPE_CHECKING:
+    from .file_classes import File
+    from .patho import Annotation
+
+# Documents are built only for these numbers of operations, so that the set of documents sent
+# to the API is fixed and can be whitelisted (see `batch_documents`).
+BATCH_SIZES = (64, 32, 16, 8, 4, 2, 1)
+
+
+@dataclass(frozen=True)
+class BatchMutation:
+    """GraphQL mutation which can be sent many times in one document under aliases
+
+    Args:
+        name: Operation name, documents are named `Batch<name><size>`
+        field: Mutation field, e.g. `fileUpdate`
+        arguments: (input field, GraphQL type) pairs passed as the mutation input
+        selection: Selection of the mutation payload, kept minimal to keep responses small
+    """
+
+    name: str
+    field: str
+    arguments: tuple[tuple[str, str], ...]
+    selection: str
+
+    @lru_cache(maxsize=None)
+    def document(self, size: int) -> str:
+        definitions = ", ".join(f"${name}_{i}: {type}" for i in range(size) for name, type in self.arguments)
+        operations = "\n".join(
+            "    item_{i}: {field}(input: {{{inputs}}}) {{ {selection} }}".format(
+                i=i,
+                field=self.field,
+                inputs=", ".join(f"{name}: ${name}_{i}" for name, _ in self.arguments),
+                selection=self.selection,
+            )
+            for i in range(size)
+        )
+        return f"mutation Batch{self.name}{size}({definitions}) {{\n{operations}\n}}\n"
+
+
+@dataclass
+class BatchItemResult:
+    """Outcome of one item of a batch, `data` is the selected payload of its mutation"""
+
+    item: dict[str, Any]
+    data: dict | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchReport:
+    """Per-item outcome of a batch, in the order of the items"""
+
+    results: list[BatchItemResult] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> list[BatchItemResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> list[BatchItemResult]:
+        return [result for result in self.results if not result.ok]
+
+
+def _split(count: int, chunk_size: int) -> list[int]:
+    """Sizes of chunks covering `count` items, each one of BATCH_SIZES"""
+    sizes = []
+    while count:
+        size = next(size for size in BATCH_SIZES if size <= min(count, chunk_size))
+        sizes.append(size)
+        count -= size
+    return sizes
+
+
+def _send_chunk(api: API, mutation: BatchMutation, items: list[dict[str, Any]]) -> list[BatchItemResult]:
+    results = [BatchItemResult(item) for item in items]
+    # arguments missing in an item are not sent, so the API treats them as not given
+    variables = {f"{name}_{i}": value for i, item in enumerate(items) for name, value in item.items()}
+    try:
+        response = api.execute_graphql(mutation.document(len(items)), variables)
+    except Exception as e:
+        for result in results:
+            result.error = str(e)
+        return results
+
+    data = response.get("data") or {}
+    general_errors = []
+    for error in response.get("errors", []):
+        alias = (error.get("path") or [None])[0]
+        if isinstance(alias, str) and alias.startswith("item_"):
+            results[int(alias[5:])].error = error["message"]
+        else:
+            general_errors.append(error["message"])
+    for i, result in enumerate(results):
+        result.data = data.get(f"item_{i}")
+        if result.data is None and result.error is None:
+            result.error = general_errors[0] if general_errors else "No result returned"
+    return results
+
+
+def run_batch(
+    api: API,
+    mutation: BatchMutation,
+    items: list[dict[str, Any]],
+    chunk_size: int = 64,
+    max_workers: int = 4,
+    verbose: bool = False,
+) -> BatchReport:
+    """Send a mutation for every item, packing up to `chunk_size` of them in one request
+
+    Args:
+        api: API instance
+        mutation: Mutation to send
+        items: Input values of every mutation, keyed by argument name
+        chunk_size: Maximum number of mutations in one request, one of BATCH_SIZES
+        max_workers: Number of requests sent at the same time
+        verbose: If True, print progress messages
+
+    Returns:
+        BatchReport: Result or error of every item
+    """
+    if chunk_size not in BATCH_SIZES:
+        raise ValueError(f"chunk_size must be one of {BATCH_SIZES}")
+
+    chunks = []
+    start = 0
+    for size in _split(len(items), chunk_size):
+        chunks.append(items[start : start + size])
+        start += size
+
+    report = BatchReport()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for index, results in enumerate(executor.map(lambda chunk: _send_chunk(api, mutation, chunk), chunks)):
+            report.results.extend(results)
+            if verbose:
+                failed = sum(not result.ok for result in results)
+                print(f"Chunk {index + 1}/{len(chunks)} done ({len(results) - failed} succeeded, {failed} failed)")
+    return report
+
+
+batch_rename_file = BatchMutation("RenameFile", "fileUpdate", (("id", "ID!"), ("name", "String!")), "file { id }")
+batch_delete_file = BatchMutation("DeleteFile", "fileDelete", (("id", "ID!"), ("parent", "ID!")), "file { id }")
+batch_delete_full_file = BatchMutation("DeleteFullFile", "fileDeleteFull", (("id", "ID!"),), "file { id }")
+batch_link_file = BatchMutation("LinkFile", "fileLink", (("id", "ID!"), ("target", "ID!")), "file { id }")
+batch_move_file = BatchMutation(
+    "MoveFile", "fileMove", (("id", "ID!"), ("parent", "ID!"), ("target", "ID!")), "file { id }"
+)
+
+FILE_MUTATIONS = (batch_rename_file, batch_delete_file, batch_delete_full_file, batch_link_file, batch_move_file)
+
+batch_update_annotation = BatchMutation(
+    "UpdateAnnotation",
+    "annotationUpdate",
+    (
+        ("id", "ID!"),
+        ("shapeData", "[Int!]"),
+        ("color", "ID"),
+        ("label", "String"),
+        ("pointType", "PointType"),
+        ("isLabelVisible", "Boolean"),
+    ),
+    "annotation { id shapeData color label isLabelVisible pointType }",
+)
+
+# Annotation attribute -> mutation argument and field of the response
+ANNOTATION_FIELDS = {
+    "shape_data": "shapeData",
+    "color": "color",
+    "label": "label",
+    "point_type": "pointType",
+    "is_label_visible": "isLabelVisible",
+}
+
+
+def batch_documents() -> dict[str, str]:
+    """All documents which can be sent by batch operations, by operation name"""
+    return {
+        f"Batch{mutation.name}{size}": mutation.document(size)
+        for mutation in (*FILE_MUTATIONS, batch_update_annotation)
+        for size in BATCH_SIZES
+    }
+
+
+def _id(file: "File | str") -> str:
+    return file if isinstance(file, str) else file.id
+
+
+def rename_files(api: API, items: list[tuple["File | str", str]], **kwargs) -> BatchReport:
+    """Rename many files, `items` are (file or ID, new name) pairs; see `run_batch` for other arguments"""
+    return run_batch(api, batch_rename_file, [{"id": _id(file), "name": name} for file, name in items], **kwargs)
+
+
+def delete_files(api: API, items: list[tuple["File | str", str]], **kwargs) -> BatchReport:
+    """Remove many files from folders, `items` are (file or ID, parent folder ID) pairs"""
+    return run_batch(api, batch_delete_file, [{"id": _id(file), "parent": parent} for file, parent in items], **kwargs)
+
+
+def delete_files_full(api: API, files: list["File | str"], **kwargs) -> BatchReport:
+    """Completely delete many files, removing them from all folders"""
+    return run_batch(api, batch_delete_full_file, [{"id": _id(file)} for file in files], **kwargs)
+
+
+def link_files(api: API, items: list[tuple["File | str", str]], **kwargs) -> BatchReport:
+    """Link many files to folders, `items` are (file or ID, target folder ID) pairs"""
+    return run_batch(api, batch_link_file, [{"id": _id(file), "target": target} for file, target in items], **kwargs)
+
+
+def move_files(api: API, items: list[tuple["File | str", str, str]], **kwargs) -> BatchReport:
+    """Move many files, `items` are (file or ID, source parent folder ID, target folder ID) triples"""
+    return run_batch(
+        api,
+        batch_move_file,
+        [{"id": _id(file), "parent": parent, "target": target} for file, parent, target in items],
+        **kwargs,
+    )
+
+
+def update_annotations(api: API, items: list[tuple["Annotation | str", dict[str, Any]]], **kwargs) -> BatchReport:
+    """Update many annotations, e.g. to change label visibility of all annotations of a slide
+
+    Changed values are written back to the given `Annotation` objects when their update succeeds.
+
+    Example:
+        update_annotations(api, [(annotation, {"is_label_visible": False}) for annotation in annotations])
+
+    Args:
+        api: API instance
+        items: (annotation or ID, changes) pairs, changes are keyed by `Annotation` attributes:
+            shape_data, color, label, point_type and is_label_visible
+        **kwargs: Passed to `run_batch`
+
+    Returns:
+        BatchReport: Result or error of every update
+    """
+    variables = []
+    for annotation, changes in items:
+        unknown = changes.keys() - ANNOTATION_FIELDS.keys()
+        if unknown:
+            raise ValueError(f"Annotation fields cannot be updated: {', '.join(sorted(unknown))}")
+        variables.append({"id": _id(annotation), **{ANNOTATION_FIELDS[name]: value for name, value in changes.items()}})
+
+    report = run_batch(api, batch_update_annotation, variables, **kwargs)
+    for (annotation, _), result in zip(items, report.results):
+        if isinstance(annotation, str) or not result.ok:
+            continue
+        data = result.data["annotation"]
+        for name, key in ANNOTATION_FIELDS.items():
+            setattr(annotation, name, data[key])
+        # geometry is cached from the shape data
+        annotation.__dict__.pop("geometry", None)
+    return report
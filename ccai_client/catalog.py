@@ -0,0 +1,332 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path, PurePosixPath
+from typing import Any, Iterator
+
+from . import queries
+from .api import API
+from .crawler import crawl
+from .file_classes import File, PathologySlideNode
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    created_at TEXT,
+    updated_at TEXT,
+    is_ready INTEGER,
+    mpp REAL,
+    magnification REAL,
+    processing_status TEXT,
+    processing_progress REAL,
+    processing_error TEXT,
+    annotation_count INTEGER,
+    mask_count INTEGER,
+    cataloged_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parents (
+    file_id TEXT NOT NULL,
+    parent_id TEXT NOT NULL,
+    PRIMARY KEY (file_id, parent_id)
+);
+CREATE TABLE IF NOT EXISTS ancestors (
+    file_id TEXT NOT NULL,
+    ancestor_id TEXT NOT NULL,
+    PRIMARY KEY (ancestor_id, file_id)
+);
+CREATE TABLE IF NOT EXISTS tags (
+    file_id TEXT NOT NULL,
+    tag_id TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (file_id, tag_id)
+);
+CREATE INDEX IF NOT EXISTS files_type ON files (type);
+CREATE INDEX IF NOT EXISTS files_mpp ON files (mpp);
+CREATE INDEX IF NOT EXISTS files_name ON files (name);
+CREATE INDEX IF NOT EXISTS parents_parent ON parents (parent_id);
+CREATE INDEX IF NOT EXISTS ancestors_file ON ancestors (file_id);
+CREATE INDEX IF NOT EXISTS tags_value ON tags (value);
+"""
+
+
+def _ancestors(parents: dict[str, set[str]]) -> dict[str, set[str]]:
+    """Transitive closure of the parent relation; files linked in many folders have all their ancestors"""
+    result: dict[str, set[str]] = {}
+
+    def resolve(file_id: str, path: frozenset) -> set[str]:
+        if file_id in result:
+            return result[file_id]
+        ancestors = set()
+        for parent_id in parents.get(file_id, ()):
+            ancestors.add(parent_id)
+            if parent_id not in path:
+                ancestors |= resolve(parent_id, path | {parent_id})
+        result[file_id] = ancestors
+        return ancestors
+
+    for file_id in parents:
+        resolve(file_id, frozenset([file_id]))
+    return result
+
+
+def _file_row(file: File, counts: tuple[int | None, int | None]) -> tuple:
+    properties = getattr(file, "slide_properties", None)
+    task = getattr(file, "processing_task", None)
+    return (
+        file.id,
+        file.name,
+        file.typename,
+        file.created_at.isoformat() if file.created_at else None,
+        file.updated_at.isoformat() if file.updated_at else None,
+        int(file.is_ready) if isinstance(file, PathologySlideNode) else None,
+        properties.mpp if properties else None,
+        properties.magnification if properties else None,
+        task.status if task else None,
+        task.progress if task else None,
+        task.error_message if task else None,
+        *counts,
+        datetime.now(timezone.utc).isoformat(),
+    )
+
+
+def _rejected_by_validation(response: dict) -> bool:
+    """Whether a GraphQL query was rejected before execution, e.g. for a field missing from the schema"""
+    errors = response.get("errors") or []
+    if any((error.get("extensions") or {}).get("code") == "GRAPHQL_VALIDATION_FAILED" for error in errors):
+        return True
+    # errors raised before execution have no path and come without data
+    return bool(errors) and response.get("data") is None and not any(error.get("path") for error in errors)
+
+
+def _total_counts(response: dict) -> tuple[int, int]:
+    if "errors" in response:
+        raise Exception("GraphQL query failed: " + response["errors"][0]["message"])
+    data = response["data"]["file"]
+    return data["annotations"]["totalCount"], data["tiledMasks"]["totalCount"]
+
+
+class Catalog:
+    """Local SQLite catalog of a file tree for fast offline queries
+
+    The catalog stores names, types, parents (and all ancestors), tags, slide properties, processing
+    status and annotation and mask counts of slides. `refresh` is a full re-crawl: every folder of
+    the subtree is listed again, since the `updated_at` of a folder does not change with the files
+    below it. Only counting is incremental - counts are fetched again only for slides whose
+    `updated_at` changed. Query with `find`, or with SQL through `sql`, and turn the results back into
+    `File` objects with `files`.
+
+    Example:
+        catalog = Catalog("catalog.sqlite", api)
+        catalog.refresh(File.get(api, id=folder_id))
+        slides = catalog.files(catalog.find(types=["PathologySlideNode"], tags=["X"], ready=True, max_mpp=0.3))
+    """
+
+    def __init__(self, path: str | Path, api: API):
+        self.api = api
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(_SCHEMA)
+        # whether the server supports totalCount, None until the first slide is counted
+        self._total_count: bool | None = None
+        self._total_count_lock = threading.Lock()
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _fetch_counts(self, slide_id: str) -> tuple[int, int]:
+        variables = {"id": slide_id}
+        if self._total_count is None:
+            with self._total_count_lock:
+                # the first slide counted tells whether connections of this server have totalCount,
+                # other threads wait for the answer
+                if self._total_count is None:
+                    response = self.api.execute_graphql(queries.query_pathologyslide_total_counts, variables)
+                    self._total_count = not _rejected_by_validation(response)
+                    if self._total_count:
+                        return _total_counts(response)
+        if self._total_count:
+            return _total_counts(self.api.execute_graphql(queries.query_pathologyslide_total_counts, variables))
+        # count IDs of all edges instead
+        data = self.api.query_graphql(queries.query_pathologyslide_counts, variables=variables)
+        return len(data["annotations"]["edges"]), len(data["tiledMasks"]["edges"])
+
+    def refresh(self, root: File, counts: bool = True, max_workers: int = 8, verbose: bool = False) -> int:
+        """Crawl the subtree of `root` again and update the catalog
+
+        This is a full re-crawl, every folder of the subtree is listed; annotations and masks are
+        counted only for new slides and slides whose `updated_at` changed. Files removed from the
+        subtree are removed from the catalog, unless they are still linked in another cataloged folder.
+
+        Args:
+            root: Folder to crawl
+            counts: If True, fetch annotation and mask counts of new and changed slides
+            max_workers: Number of folders listed and count queries sent at the same time
+            verbose: If True, print progress messages
+
+        Returns:
+            int: Number of cataloged files in the subtree
+        """
+        files: dict[str, File] = {}
+        parents: dict[str, set[str]] = {}
+        # folders are yielded before their children, so the parent of every path is already known
+        path_ids = {PurePosixPath("."): root.id}
+        for path, file in crawl(root, max_workers=max_workers, unique=False):
+            path_ids[path] = file.id
+            files[file.id] = file
+            parents.setdefault(file.id, set()).add(path_ids[path.parent])
+        if verbose:
+            print(f"Found {len(files)} files")
+
+        db = self.connection
+        saved = {
+            row[0]: row[1:]
+            for row in db.execute(
+                "SELECT id, updated_at, annotation_count, mask_count FROM files WHERE type LIKE ?", ("PathologySlide%",)
+            )
+        }
+        file_counts: dict[str, tuple[int | None, int | None]] = {}
+        to_count = []
+        for file in files.values():
+            if not isinstance(file, PathologySlideNode):
+                file_counts[file.id] = (None, None)
+                continue
+            updated_at, annotation_count, mask_count = saved.get(file.id, (None, None, None))
+            if annotation_count is not None and file.updated_at and updated_at == file.updated_at.isoformat():
+                file_counts[file.id] = (annotation_count, mask_count)
+            elif counts:
+                to_count.append(file.id)
+            else:
+                file_counts[file.id] = (None, None)
+        if to_count:
+            if verbose:
+                print(f"Counting annotations and masks of {len(to_count)} slides")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                file_counts.update(zip(to_count, executor.map(self._fetch_counts, to_count)))
+
+        ancestors = _ancestors(parents)
+        with db:
+            # files in the subtree are also under the folders containing `root`
+            outer = [row[0] for row in db.execute("SELECT ancestor_id FROM ancestors WHERE file_id = ?", (root.id,))]
+            previous = {row[0] for row in db.execute("SELECT file_id FROM ancestors WHERE ancestor_id = ?", (root.id,))}
+            db.execute("CREATE TEMP TABLE IF NOT EXISTS subtree (id TEXT PRIMARY KEY)")
+            db.execute("DELETE FROM subtree")
+            db.executemany("INSERT OR IGNORE INTO subtree VALUES (?)", [(file_id,) for file_id in [root.id, *files]])
+            # relations inside the subtree are rebuilt, those to folders outside of it are kept
+            db.execute("DELETE FROM parents WHERE parent_id IN (SELECT id FROM subtree)")
+            db.execute("DELETE FROM ancestors WHERE ancestor_id IN (SELECT id FROM subtree)")
+            db.executemany("DELETE FROM tags WHERE file_id = ?", [(file_id,) for file_id in files])
+
+            db.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [_file_row(file, file_counts[file.id]) for file in files.values()],
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO parents VALUES (?, ?)",
+                [(file_id, parent_id) for file_id, ids in parents.items() for parent_id in ids],
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO ancestors VALUES (?, ?)",
+                [
+                    (file_id, ancestor_id)
+                    for file_id, ids in ancestors.items()
+                    for ancestor_id in [*ids, *outer]
+                    if ancestor_id != file_id
+                ],
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO tags VALUES (?, ?, ?)",
+                [(file.id, tag.id, tag.value) for file in files.values() for tag in file.tags],
+            )
+
+            removed = [
+                (file_id,)
+                for file_id in previous - files.keys()
+                if not db.execute("SELECT 1 FROM parents WHERE file_id = ?", (file_id,)).fetchone()
+            ]
+            for table, column in (("files", "id"), ("parents", "file_id"), ("ancestors", "file_id")):
+                db.executemany(f"DELETE FROM {table} WHERE {column} = ?", removed)
+            db.executemany("DELETE FROM tags WHERE file_id = ?", removed)
+        if verbose:
+            print(f"Cataloged {len(files)} files, removed {len(removed)}")
+        return len(files)
+
+    def find(
+        self,
+        types: list[str] | None = None,
+        tags: list[str] | None = None,
+        under: str | File | None = None,
+        name: str | None = None,
+        ready: bool | None = None,
+        min_mpp: float | None = None,
+        max_mpp: float | None = None,
+        processing_status: str | None = None,
+        limit: int | None = None,
+    ) -> list[str]:
+        """Find IDs of cataloged files matching all given conditions
+
+        Args:
+            types: GraphQL type names, e.g. ["PathologySlideNode"]
+            tags: Tag values the file must all have
+            under: Folder (or its ID) the file must be in, at any depth
+            name: Case insensitive substring of the name
+            ready: Only slides which are (or are not) ready
+            min_mpp: Minimal microns per pixel of a slide
+            max_mpp: Maximal microns per pixel of a slide
+            processing_status: Status of the slide processing task
+            limit: Maximum number of results
+
+        Returns:
+            list[str]: File IDs sorted by name
+        """
+        conditions = []
+        params: list[Any] = []
+        if types:
+            conditions.append(f"type IN ({', '.join('?' * len(types))})")
+            params.extend(types)
+        for tag in tags or []:
+            conditions.append("id IN (SELECT file_id FROM tags WHERE value = ?)")
+            params.append(tag)
+        if under is not None:
+            conditions.append("id IN (SELECT file_id FROM ancestors WHERE ancestor_id = ?)")
+            params.append(under.id if isinstance(under, File) else under)
+        if name:
+            conditions.append("name LIKE ?")
+            params.append(f"%{name}%")
+        if ready is not None:
+            conditions.append("is_ready = ?")
+            params.append(int(ready))
+        if min_mpp is not None:
+            conditions.append("mpp >= ?")
+            params.append(min_mpp)
+        if max_mpp is not None:
+            conditions.append("mpp <= ?")
+            params.append(max_mpp)
+        if processing_status:
+            conditions.append("processing_status = ?")
+            params.append(processing_status)
+
+        query = "SELECT id FROM files"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY name"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [row[0] for row in self.connection.execute(query, params)]
+
+    def sql(self, query: str, params: tuple | dict = ()) -> list[tuple]:
+        """Run a custom SQL query on the catalog (tables `files`, `parents`, `ancestors` and `tags`)"""
+        return self.connection.execute(query, params).fetchall()
+
+    def files(self, ids: list[str], max_workers: int = 8) -> Iterator[File]:
+        """Fetch up-to-date `File` objects of cataloged files, in the order of `ids`"""
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(lambda file_id: File.get(self.api, id=file_id), ids)
@@ -0,0 +1,31 @@
+import gzip
+from dataclasses import dataclass
+
+# gzip and deflate, plus br and zstd when brotli and zstandard are installed (`compression` extra)
+from urllib3.util.request import ACCEPT_ENCODING
+
+
+@dataclass
+class CompressionPolicy:
+    """Compression of GraphQL traffic sent by `API`
+
+    Responses are always requested compressed with every encoding available (`ACCEPT_ENCODING`).
+    Request bodies of at least `min_size` bytes (e.g. a GeoJSON import) are gzipped when
+    `compress_requests` is set. The first compressed body probes the server: if it answers 415, or
+    400 failing to decode the body, it is sent again uncompressed and request compression is turned
+    off for that `API`; other requests wait for the probe instead of being rejected too.
+    """
+
+    compress_requests: bool = False
+    min_size: int = 64 << 10
+    level: int = 6
+
+    def compress(self, body: bytes) -> bytes | None:
+        """Gzipped body, or None if it should be sent as it is"""
+        if not self.compress_requests or len(body) < self.min_size:
+            return None
+        compressed = gzip.compress(body, compresslevel=self.level)
+        return compressed if len(compressed) < len(body) else None
+
+
+__all__ = ["ACCEPT_ENCODING", "CompressionPolicy"]
@@ -1,11 +1,77 @@
+import dataclasses
+import functools
+import os
 from datetime import datetime
-from typing import Any
+from typing import Any, TypeVar
 
-from pydantic.dataclasses import dataclass
+from pydantic import ConfigDict
+from pydantic.dataclasses import dataclass as pydantic_dataclass
 
 from ccai_client.api import API
+from ccai_client.identity import intern_name, interned
 from ccai_client.queries import mutation_comment_create
 
+T = TypeVar("T")
+
+# Data returned by the API is trusted and objects are built without pydantic validation.
+# Strict validation can be enabled for debugging with CCAI_STRICT_VALIDATION=1 or `set_strict_validation`.
+_strict_validation = os.environ.get("CCAI_STRICT_VALIDATION", "") not in ("", "0")
+_defaults_cache: dict[type, list[tuple[str, Any, bool]]] = {}
+
+# Decorator of all models. Their validation schemas are built when first needed (only with strict
+# validation, see `construct`) instead of when the package is imported. A config given to a
+# pydantic dataclass replaces the one of its base class, so all models share it; arbitrary types
+# are allowed for the `API` of files.
+dataclass = functools.partial(pydantic_dataclass, config=ConfigDict(defer_build=True, arbitrary_types_allowed=True))
+
+
+def set_strict_validation(enabled: bool):
+    """Validate all objects parsed from API responses with pydantic (slow, useful for debugging)"""
+    global _strict_validation
+    _strict_validation = enabled
+
+
+def _field_defaults(cls: type) -> list[tuple[str, Any, bool]]:
+    """List of (field name, default value or factory, is factory) for fields with defaults"""
+    defaults = _defaults_cache.get(cls)
+    if defaults is None:
+        defaults = []
+        for field in dataclasses.fields(cls):
+            if field.default is not dataclasses.MISSING:
+                defaults.append((field.name, field.default, False))
+            elif field.default_factory is not dataclasses.MISSING:
+                defaults.append((field.name, field.default_factory, True))
+        _defaults_cache[cls] = defaults
+    return defaults
+
+
+def construct(cls: type[T], **fields) -> T:
+    """Build a dataclass instance from trusted API data, skipping pydantic validation
+
+    Values must already have the declared types (see `parse_datetime`). When strict validation
+    is enabled, the regular validating constructor is used instead.
+    """
+    if _strict_validation:
+        return cls(**fields)
+    instance = object.__new__(cls)
+    for name, default, is_factory in _field_defaults(cls):
+        if name not in fields:
+            fields[name] = default() if is_factory else default
+    instance.__dict__.update(fields)
+    return instance
+
+
+def dataclass_state(instance) -> dict:
+    """Pickle state of a dataclass with only its fields, leaving out cached properties"""
+    names = [field.name for field in dataclasses.fields(instance)]
+    return {name: instance.__dict__[name] for name in names if name in instance.__dict__}
+
+
+def parse_datetime(value: str | datetime | None) -> datetime | None:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
 
 @dataclass
 class Comment:
@@ -16,7 +82,13 @@ class Comment:
 
     @staticmethod
     def from_graphql(data: dict[str, Any]) -> "Comment":
-        return Comment(id=data["id"], text=data["text"], author=data["author"]["name"], created_at=data["createdAt"])
+        return construct(
+            Comment,
+            id=data["id"],
+            text=data["text"],
+            author=intern_name(data["author"]["name"]),
+            created_at=parse_datetime(data["createdAt"]),
+        )
 
 
 @dataclass
@@ -26,7 +98,7 @@ class Tag:
 
     @staticmethod
     def from_graphql(data: dict[str, Any]) -> "Tag":
-        return Tag(id=data["id"], value=data["value"])
+        return interned(Tag, (data["id"], data["value"]), lambda: construct(Tag, id=data["id"], value=data["value"]))
 
 
 @dataclass
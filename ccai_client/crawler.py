@@ -0,0 +1,98 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import PurePosixPath
+from typing import Iterator
+
+from .file_classes import DicomStudyFile, File, FormFile, PathologySlideNode, SimpleFileNode
+
+# files of these types never contain other files, their children are not listed
+LEAF_TYPES = (SimpleFileNode, PathologySlideNode, DicomStudyFile, FormFile)
+
+
+def safe_name(name: str) -> str:
+    """File name usable as a local path component"""
+    return name.replace("/", "_").replace("\\", "_").strip() or "_"
+
+
+def _child_paths(folder_path: PurePosixPath, children: list[File]) -> list[tuple[PurePosixPath, File]]:
+    used_names = set()
+    result = []
+    for child in children:
+        name = safe_name(child.name)
+        # files with the same name in one folder get their ID appended, so every path is unique
+        if name in used_names:
+            name = f"{name} ({child.id})"
+        used_names.add(name)
+        result.append((folder_path / name, child))
+    return result
+
+
+def crawl(
+    root: File,
+    max_workers: int = 8,
+    max_depth: int | None = None,
+    types: list[str] | None = None,
+    unique: bool = True,
+) -> Iterator[tuple[PurePosixPath, File]]:
+    """Walk the file tree under `root` breadth first, listing many folders at the same time
+
+    Pairs of (path relative to `root`, file) are yielded as soon as their folder is listed, so
+    processing can start before the whole tree is known. Every folder is listed only once, even
+    when it is linked in several places. With `unique=False` the contents of a linked folder are
+    yielded under every path it is reached by, a folder is not entered again inside itself (cycles).
+
+    Args:
+        root: Folder to start from
+        max_workers: Number of folders listed at the same time
+        max_depth: Maximum depth of yielded files, 1 for children of `root` only, None for no limit
+        types: Yield only files of these GraphQL types (e.g. ["PathologySlideNode"]), folders are still crawled
+        unique: If True, every file is yielded only once, for the first path found
+
+    Returns:
+        Iterator[tuple[PurePosixPath, File]]: Paths and files, paths of direct children of `root` are their names
+    """
+    # listings by folder ID, kept with unique=False to expand folders reached again under other paths
+    listings: dict[str, list[File]] = {}
+    # paths waiting for a folder which is being listed, with their depth and the folders above them
+    waiting: dict[str, list[tuple[PurePosixPath, int, frozenset[str]]]] = {}
+    listed = {root.id}
+    # listed folders to walk, in the order they are expanded
+    ready: deque[tuple[list[File], PurePosixPath, int, frozenset[str]]] = deque()
+    yielded = set()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {executor.submit(root.children): (root.id, PurePosixPath("."), 1, frozenset([root.id]))}
+    try:
+        while pending or ready:
+            if not ready:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    folder_id, folder_path, depth, above = pending.pop(future)
+                    children = future.result()
+                    if not unique:
+                        listings[folder_id] = children
+                    ready.append((children, folder_path, depth, above))
+                    ready.extend((children, *waiter) for waiter in waiting.pop(folder_id, ()))
+                continue
+
+            children, folder_path, depth, above = ready.popleft()
+            for path, child in _child_paths(folder_path, children):
+                if not isinstance(child, LEAF_TYPES) and (max_depth is None or depth < max_depth):
+                    expand = (path, depth + 1, above | {child.id})
+                    if child.id not in listed:
+                        listed.add(child.id)
+                        pending[executor.submit(child.children)] = (child.id, *expand)
+                    elif not unique and child.id not in above:
+                        # folder linked in several places - walk its listing again under this path
+                        if child.id in listings:
+                            ready.append((listings[child.id], *expand))
+                        else:
+                            waiting.setdefault(child.id, []).append(expand)
+                if unique:
+                    if child.id in yielded:
+                        continue
+                    yielded.add(child.id)
+                if types is None or child.typename in types:
+                    yield path, child
+    finally:
+        # stop listing when the caller stops iterating
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,83 @@
+import math
+import xml.etree.ElementTree as ElementTree
+from dataclasses import dataclass
+from urllib.parse import urlsplit, urlunsplit
+
+from .api import API
+
+
+def _with_path(url: str, path: str) -> str:
+    """URL with its path replaced, keeping the query string (e.g. of presigned URLs)"""
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path=path))
+
+
+@dataclass(frozen=True)
+class DZIInfo:
+    """Geometry of a Deep Zoom image pyramid
+
+    Level `max_level` has the full resolution, every lower level is half the size of the next one
+    (rounded up) and level 0 is a single pixel. Tiles of a level are `tile_size` pixels wide and
+    high without the overlap; tiles have `overlap` extra pixels on each side which has a neighbour.
+    """
+
+    width: int
+    height: int
+    tile_size: int
+    overlap: int = 0
+    format: str = "png"
+
+    @staticmethod
+    def from_xml(xml: str | bytes) -> "DZIInfo":
+        root = ElementTree.fromstring(xml)
+        # the element names are the same in all versions of the schema, only namespaces differ
+        size = next(element for element in root.iter() if element.tag.rsplit("}", 1)[-1] == "Size")
+        return DZIInfo(
+            width=int(size.attrib["Width"]),
+            height=int(size.attrib["Height"]),
+            tile_size=int(root.attrib["TileSize"]),
+            overlap=int(root.attrib.get("Overlap", 0)),
+            format=root.attrib.get("Format", "png"),
+        )
+
+    @staticmethod
+    def fetch(api: API, dzi_url: str) -> "DZIInfo":
+        response = api.request("GET", dzi_url)
+        response.raise_for_status()
+        return DZIInfo.from_xml(response.content)
+
+    @property
+    def max_level(self) -> int:
+        return math.ceil(math.log2(max(self.width, self.height, 1)))
+
+    def level_dimensions(self, level: int) -> tuple[int, int]:
+        """(width, height) of a level"""
+        if not 0 <= level <= self.max_level:
+            raise ValueError(f"Level must be between 0 and {self.max_level}")
+        factor = 2 ** (self.max_level - level)
+        return math.ceil(self.width / factor), math.ceil(self.height / factor)
+
+    def level_for_downsample(self, downsample: float) -> int:
+        """Highest level at most `downsample` times smaller than the full resolution"""
+        return max(0, self.max_level - math.floor(math.log2(max(downsample, 1))))
+
+    def tile_grid(self, level: int) -> tuple[int, int]:
+        """Number of (columns, rows) of tiles of a level"""
+        width, height = self.level_dimensions(level)
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+    def tile_bounds(self, level: int, col: int, row: int) -> tuple[int, int, int, int]:
+        """(x0, y0, x1, y1) of the pixels of a level covered by a tile, without the overlap"""
+        width, height = self.level_dimensions(level)
+        x0, y0 = col * self.tile_size, row * self.tile_size
+        return x0, y0, min(x0 + self.tile_size, width), min(y0 + self.tile_size, height)
+
+    def tile_offset(self, col: int, row: int) -> tuple[int, int]:
+        """(x, y) of the first pixel of `tile_bounds` in the tile image, after the overlap"""
+        return (self.overlap if col else 0), (self.overlap if row else 0)
+
+    def tile_url(self, dzi_url: str, level: int, col: int, row: int) -> str:
+        """URL of a tile, `<name>_files/<level>/<col>_<row>.<format>` next to the `<name>.dzi` file"""
+        path = urlsplit(dzi_url).path
+        base = path[: -len(".dzi")] if path.endswith(".dzi") else path.rsplit(".", 1)[0]
+        return _with_path(dzi_url, f"{base}_files/{level}/{col}_{row}.{self.format}")
@@ -0,0 +1,233 @@
+import json
+from pathlib import Path
+from typing import Any, Iterable
+
+from . import queries
+from .file_classes import ANNOTATION_NODES, PathologySlideNode
+from .patho import ShapeType
+
+POINT_CLOUD_ID = "data.file.pointClouds.edges.item.node.id"
+POINT = "data.file.pointClouds.edges.item.node.pointsList.item"
+
+
+def _as_slide_list(slides: PathologySlideNode | Iterable[PathologySlideNode]) -> Iterable[PathologySlideNode]:
+    if isinstance(slides, PathologySlideNode):
+        return [slides]
+    return slides
+
+
+def _iter_annotation_nodes(slide: PathologySlideNode):
+    for _, node in slide.api.stream_graphql(
+        queries.query_pathologyslide_annotations_export, (ANNOTATION_NODES,), variables={"id": slide.id}
+    ):
+        yield node
+
+
+def _pairs(shape_data: list[int]) -> list[list[int]]:
+    return [list(point) for point in zip(shape_data[::2], shape_data[1::2])]
+
+
+def annotation_geometry(shape_type: str, shape_data: list[int]) -> dict[str, Any] | None:
+    """Convert annotation shape data to a GeoJSON geometry
+
+    Circles and ellipses are exported as their center point, their radii are kept in `shape_data`.
+    Returns None for shape types without a GeoJSON counterpart.
+    """
+    match shape_type:
+        case ShapeType.RECT:
+            x, y, width, height = shape_data[:4]
+            ring = [[x, y], [x + width, y], [x + width, y + height], [x, y + height], [x, y]]
+            return {"type": "Polygon", "coordinates": [ring]}
+        case ShapeType.POLYGON | ShapeType.CLOSED_PATH:
+            ring = _pairs(shape_data)
+            if ring and ring[0] != ring[-1]:
+                ring.append(ring[0])
+            return {"type": "Polygon", "coordinates": [ring]}
+        case ShapeType.PATH | ShapeType.LINE | ShapeType.ARROW_LINE:
+            return {"type": "LineString", "coordinates": _pairs(shape_data)}
+        case ShapeType.POINT | ShapeType.CIRCLE | ShapeType.ELLIPSE:
+            return {"type": "Point", "coordinates": shape_data[:2]}
+        case _:
+            return None
+
+
+def export_annotations_geojsonl(slides: PathologySlideNode | Iterable[PathologySlideNode], path: str | Path) -> int:
+    """Export annotations of one or many slides to a newline-delimited GeoJSON file
+
+    Every line is a Feature with the original shape type and data, label, color, author and
+    slide ID in its properties. Annotations are written slide by slide, so only one slide is kept in memory.
+
+    Args:
+        slides: Slide or iterable of slides (e.g. a generator) to export
+        path: Output file path
+
+    Returns:
+        int: Number of exported annotations
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for slide in _as_slide_list(slides):
+            for node in _iter_annotation_nodes(slide):
+                feature = {
+                    "type": "Feature",
+                    "id": node["id"],
+                    "geometry": annotation_geometry(node["shapeType"], node["shapeData"]),
+                    "properties": {
+                        "slide_id": node["slideId"],
+                        "number": node["number"],
+                        "shape_type": node["shapeType"],
+                        "shape_data": node["shapeData"],
+                        "label": node["label"],
+                        "color": node["color"],
+                        "author": node["author"]["name"] if node["author"] else None,
+                        "point_type": node["pointType"],
+                        "created_at": node["createdAt"],
+                    },
+                }
+                f.write(json.dumps(feature, separators=(",", ":")))
+                f.write("\n")
+                count += 1
+    return count
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Columnar export requires pyarrow. Install it with `pip install ccai-client[parquet]`")
+    return pyarrow
+
+
+def _open_table_writer(path: str | Path, schema):
+    """Open a Parquet writer, or an Arrow IPC writer for `.arrow` and `.feather` files"""
+    pa = _import_pyarrow()
+    if Path(path).suffix in (".arrow", ".feather"):
+        return pa.ipc.new_file(str(path), schema)
+    return pa.parquet.ParquetWriter(str(path), schema)
+
+
+def export_annotations_table(
+    slides: PathologySlideNode | Iterable[PathologySlideNode], path: str | Path, batch_size: int = 10_000
+) -> int:
+    """Export annotations of one or many slides to a Parquet (or Arrow IPC) file
+
+    Annotations are streamed from the API and written in record batches, so memory stays bounded
+    by `batch_size` annotations (with ijson installed, see `API.stream_graphql`).
+
+    Args:
+        slides: Slide or iterable of slides (e.g. a generator) to export
+        path: Output file path, `.arrow`/`.feather` suffix selects Arrow IPC format, otherwise Parquet
+        batch_size: Number of annotations in one record batch
+
+    Returns:
+        int: Number of exported annotations
+    """
+    pa = _import_pyarrow()
+    schema = pa.schema(
+        [
+            ("slide_id", pa.string()),
+            ("id", pa.string()),
+            ("number", pa.int64()),
+            ("shape_type", pa.string()),
+            ("shape_data", pa.list_(pa.int64())),
+            ("label", pa.string()),
+            ("color", pa.string()),
+            ("author", pa.string()),
+            ("point_type", pa.string()),
+            ("created_at", pa.string()),
+        ]
+    )
+
+    def write(nodes: list[dict]):
+        columns = {
+            "slide_id": [node["slideId"] for node in nodes],
+            "id": [node["id"] for node in nodes],
+            "number": [node["number"] for node in nodes],
+            "shape_type": [node["shapeType"] for node in nodes],
+            "shape_data": [node["shapeData"] for node in nodes],
+            "label": [node["label"] for node in nodes],
+            "color": [node["color"] for node in nodes],
+            "author": [node["author"]["name"] if node["author"] else None for node in nodes],
+            "point_type": [node["pointType"] for node in nodes],
+            "created_at": [node["createdAt"] for node in nodes],
+        }
+        writer.write_table(pa.table(columns, schema=schema))
+
+    count = 0
+    nodes = []
+    with _open_table_writer(path, schema) as writer:
+        for slide in _as_slide_list(slides):
+            for node in _iter_annotation_nodes(slide):
+                nodes.append(node)
+                if len(nodes) >= batch_size:
+                    write(nodes)
+                    count += len(nodes)
+                    nodes = []
+        if nodes:
+            write(nodes)
+            count += len(nodes)
+    return count
+
+
+def export_point_clouds_table(
+    slides: PathologySlideNode | Iterable[PathologySlideNode], path: str | Path, batch_size: int = 100_000
+) -> int:
+    """Export point clouds of one or many slides to a columnar Parquet (or Arrow IPC) file
+
+    Every point is a row with `slide_id`, `point_cloud_id`, `x`, `y`, `color_key`, `radius` and `score` columns.
+    Points are streamed from the API straight into columns written in record batches, so memory stays
+    bounded by `batch_size` points (with ijson installed, see `API.stream_graphql`).
+
+    Args:
+        slides: Slide or iterable of slides (e.g. a generator) to export
+        path: Output file path, `.arrow`/`.feather` suffix selects Arrow IPC format, otherwise Parquet
+        batch_size: Number of points in one record batch
+
+    Returns:
+        int: Number of exported points
+    """
+    pa = _import_pyarrow()
+    schema = pa.schema(
+        [
+            ("slide_id", pa.string()),
+            ("point_cloud_id", pa.string()),
+            ("x", pa.int32()),
+            ("y", pa.int32()),
+            ("color_key", pa.int32()),
+            ("radius", pa.float32()),
+            ("score", pa.int32()),
+        ]
+    )
+    columns: dict[str, list] = {name: [] for name in schema.names}
+
+    def write():
+        writer.write_table(pa.table(columns, schema=schema))
+        for values in columns.values():
+            values.clear()
+
+    count = 0
+    with _open_table_writer(path, schema) as writer:
+        for slide in _as_slide_list(slides):
+            point_cloud_id = None
+            for prefix, value in slide.api.stream_graphql(
+                queries.query_pathologyslide_point_clouds, (POINT_CLOUD_ID, POINT), variables={"id": slide.id}
+            ):
+                # the ID of a point cloud is selected before its points
+                if prefix == POINT_CLOUD_ID:
+                    point_cloud_id = value
+                    continue
+                columns["slide_id"].append(slide.id)
+                columns["point_cloud_id"].append(point_cloud_id)
+                columns["x"].append(value["x"])
+                columns["y"].append(value["y"])
+                columns["color_key"].append(value["v"])
+                columns["radius"].append(value.get("r"))
+                columns["score"].append(value.get("s"))
+                count += 1
+                if len(columns["x"]) >= batch_size:
+                    write()
+        if columns["x"]:
+            write()
+    return count
@@ -1,28 +1,39 @@
+import io
+import math
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import asdict
 from datetime import datetime
 from functools import cached_property
 from pathlib import Path, PurePosixPath
-from typing import Literal
+from typing import TYPE_CHECKING, Iterator, Literal
 
-import requests
-from dicomweb_client.api import DICOMwebClient
-from histpat_toolkit.dzi_file import DZIFile
-from histpat_toolkit.image_pyramid.dzi_pyramid import DZIPyramid
-from histpat_toolkit.image_pyramid.tiled_mask_pyramid import TiledMaskPyramid
+import numpy as np
 from histpat_toolkit.types import SlideProperties
-from pydantic import ConfigDict
-from pydantic.dataclasses import dataclass
 from typing_extensions import deprecated
 
 from ccai_client.api import API
 
 from . import queries
-from .core_classes import DiscussionMixin, Tag
+from .core_classes import DiscussionMixin, Tag, construct, dataclass, dataclass_state, parse_datetime
+from .dzi import DZIInfo
+from .geojson import GeoJSONImportResult, chunk_geojson_features, iter_geojson_features
 from .patho import Annotation, ColorMap, Marker, PointCloud, ShapeType, TiledMask
 
+if TYPE_CHECKING:
+    # imported when first used, they take most of the import time of the package
+    from dicomweb_client.api import DICOMwebClient
+    from histpat_toolkit.dzi_file import DZIFile
+    from histpat_toolkit.image_pyramid.dzi_pyramid import DZIPyramid
+    from histpat_toolkit.image_pyramid.tiled_mask_pyramid import TiledMaskPyramid
+    from histpat_toolkit.types import TiledMaskPyramidInfo
 
-@dataclass(config=ConfigDict(arbitrary_types_allowed=True))
+# JSON paths of streamed response items, see `API.stream_graphql`
+ANNOTATION_NODES = "data.file.annotations.edges.item.node"
+
+
+@dataclass
 class File(DiscussionMixin):
     """Class for keeping track of an item in inventory."""
 
@@ -31,8 +42,13 @@ class File(DiscussionMixin):
     name: str
     typename: str
     created_at: datetime
+    updated_at: datetime | None
     tags: list[Tag]
 
+    def __getstate__(self) -> dict:
+        # cached DZI files and DICOMweb clients are rebuilt on demand after unpickling
+        return dataclass_state(self)
+
     @classmethod
     def _parse_common_fields(cls, data: dict, api: API) -> dict:
         return {
@@ -40,7 +56,8 @@ class File(DiscussionMixin):
             "id": data["id"],
             "name": data["name"],
             "typename": data["__typename"],
-            "created_at": data["createdAt"],
+            "created_at": parse_datetime(data["createdAt"]),
+            "updated_at": parse_datetime(data["updatedAt"]) if data.get("updatedAt") else None,
             "tags": [Tag.from_graphql(tag) for tag in data.get("tags", {})],
             **DiscussionMixin.parse_graphql(data),
         }
@@ -48,7 +65,7 @@ class File(DiscussionMixin):
     @classmethod
     def from_graphql(cls, data: dict, api: API) -> "File":
         common_fields = cls._parse_common_fields(data, api)
-        return cls(**common_fields)
+        return construct(cls, **common_fields)
 
     def children(self, search: str | None = None, prefix_search: str | None = None) -> list["File"]:
         objects = []
@@ -178,15 +195,19 @@ class SimpleFileNode(File):
     @classmethod
     def from_graphql(cls, data: dict, api: API) -> "SimpleFileNode":
         common_fields = cls._parse_common_fields(data, api)
-        return cls(
+        return construct(
+            cls,
             **common_fields,
             file_name=data["fileName"],
             download_url=data["accessUrl"],
         )
 
     def download(self, path):
-        r = requests.get(self.download_url)
-        open(path, "wb").write(r.content)
+        with self.api.request("GET", self.download_url, stream=True) as r:
+            r.raise_for_status()
+            with open(path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
 
 
 @dataclass
@@ -199,7 +220,8 @@ class ProcessingTask:
     def from_graphql(cls, data: dict | None) -> "ProcessingTask | None":
         if data is None:
             return None
-        return cls(
+        return construct(
+            cls,
             status=data["status"],
             progress=data["progress"],
             error_message=data["errorMessage"],
@@ -218,12 +240,13 @@ class PathologySlideNode(File):
     @classmethod
     def from_graphql(cls, data: dict, api: API) -> "PathologySlideNode":
         common_fields = cls._parse_common_fields(data, api)
-        return cls(
+        return construct(
+            cls,
             **common_fields,
             is_ready=data.get("isReady", False),
             thumbnail_url=data.get("thumbnailUrl"),
             dzi_url=data.get("dziUrl"),
-            slide_properties=data.get("slideProperties"),
+            slide_properties=SlideProperties(**data["slideProperties"]) if data.get("slideProperties") else None,
             point_clouds=[
                 PointCloud.from_graphql(edge["node"]) for edge in data.get("pointClouds", {}).get("edges", [])
             ],
@@ -234,7 +257,7 @@ class PathologySlideNode(File):
         data = self.api.query_graphql(queries.query_pathologyslide_masks, variables={"id": self.id})
 
         edges = data["tiledMasks"]["edges"]
-        masks = [TiledMask.from_graphql(edge["node"]) for edge in edges]
+        masks = [self.api.identity_map.merge(TiledMask.from_graphql(edge["node"])) for edge in edges]
         return masks
 
     @deprecated("Use list_annotations instead")
@@ -247,14 +270,27 @@ class PathologySlideNode(File):
     def list_annotations(self):
         data = self.api.query_graphql(queries.query_pathologyslide_annotations, variables={"id": self.id})
         edges = data["annotations"]["edges"]
-        annotations = [Annotation.from_graphql(edge["node"]) for edge in edges]
+        annotations = [self.api.identity_map.merge(Annotation.from_graphql(edge["node"])) for edge in edges]
         return annotations
 
+    def iter_annotations(self) -> Iterator[Annotation]:
+        """Yield annotations while they are received, without keeping the whole response in memory
+
+        Requires ijson for incremental parsing (`pip install ccai-client[streaming]`), otherwise the
+        response is decoded at once and then annotations are yielded one by one.
+        """
+        for _, node in self.api.stream_graphql(
+            queries.query_pathologyslide_annotations, (ANNOTATION_NODES,), variables={"id": self.id}
+        ):
+            yield self.api.identity_map.merge(Annotation.from_graphql(node))
+
     def list_annotations_of_shape(self, shape_types: list[ShapeType]):
         data = self.api.query_graphql(queries.query_pathologyslide_annotations, variables={"id": self.id})
         edges = data["annotations"]["edges"]
         annotations = [
-            Annotation.from_graphql(edge["node"]) for edge in edges if edge["node"]["shapeType"] in shape_types
+            self.api.identity_map.merge(Annotation.from_graphql(edge["node"]))
+            for edge in edges
+            if edge["node"]["shapeType"] in shape_types
         ]
         return annotations
 
@@ -262,35 +298,129 @@ class PathologySlideNode(File):
         data = self.api.query_graphql(
             queries.mutation_import_annotations_from_geojson, variables={"id": self.id, "geojson": geojson}
         )
-        annotations = [Annotation.from_graphql(annotation) for annotation in data["annotations"]]
+        annotations = [self.api.identity_map.merge(Annotation.from_graphql(item)) for item in data["annotations"]]
         return annotations
 
+    def import_annotations_from_geojson_file(
+        self,
+        path: str | Path,
+        max_chunk_bytes: int = 4 << 20,
+        max_features_per_chunk: int = 5000,
+        max_workers: int = 4,
+        parse_annotations: bool = False,
+        retries: int = 0,
+        verbose: bool = False,
+    ) -> GeoJSONImportResult:
+        """Import annotations from a (possibly very large) GeoJSON file in chunks.
+
+        Features are streamed from the file and grouped into FeatureCollections bounded by size
+        and number of features, which are sent concurrently. Only a few chunks are kept in memory.
+        The mutation is not idempotent, so by default a chunk is retried only as far as the API retry
+        policy allows (before it reaches the server); chunks which still fail are returned in `failed_chunks`.
+
+        Args:
+            path: Path to a GeoJSON FeatureCollection or newline-delimited GeoJSON file
+            max_chunk_bytes: Maximum size of GeoJSON sent in a single mutation
+            max_features_per_chunk: Maximum number of features sent in a single mutation
+            max_workers: Number of chunks sent at the same time
+            parse_annotations: If True, created annotations are fetched and parsed, otherwise only their IDs
+            retries: Number of times a failed chunk is sent again. A chunk whose response was lost may
+                have been imported already, so resending it can duplicate its annotations.
+            verbose: If True, print progress messages
+
+        Returns:
+            GeoJSONImportResult: IDs (and optionally objects) of created annotations and chunks that failed
+        """
+        query = (
+            queries.mutation_import_annotations_from_geojson
+            if parse_annotations
+            else queries.mutation_import_annotations_from_geojson_ids
+        )
+
+        def send(geojson: str) -> dict:
+            variables = {"id": self.id, "geojson": geojson}
+            for attempt in range(retries + 1):
+                try:
+                    # with retries the API may resend the mutation after server errors too, like a query
+                    return self.api.query_graphql(query, variables=variables, retry=True if retries else None)
+                except Exception:
+                    if attempt == retries:
+                        raise
+                time.sleep(self.api.retry_policy.backoff(attempt))
+
+        result = GeoJSONImportResult()
+        chunk_results: dict[int, dict] = {}
+
+        def collect(done):
+            for future in done:
+                index, geojson = pending.pop(future)
+                try:
+                    chunk_results[index] = future.result()
+                except Exception as e:
+                    result.failed_chunks.append((geojson, e))
+                if verbose:
+                    print(f"Chunk {index + 1} done ({len(chunk_results)} imported, {len(result.failed_chunks)} failed)")
+
+        pending = {}
+        chunks = chunk_geojson_features(iter_geojson_features(path), max_chunk_bytes, max_features_per_chunk)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for index, geojson in enumerate(chunks):
+                # do not read further than needed to keep all workers busy
+                if len(pending) >= 2 * max_workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[executor.submit(send, geojson)] = (index, geojson)
+            collect(wait(pending).done)
+
+        for index in sorted(chunk_results):
+            for annotation in chunk_results[index]["annotations"]:
+                result.annotation_ids.append(annotation["id"])
+                if parse_annotations:
+                    result.annotations.append(self.api.identity_map.merge(Annotation.from_graphql(annotation)))
+        return result
+
+    @cached_property
+    def dzi_info(self) -> DZIInfo:
+        """Size and tiling of the slide image, read from its DZI file"""
+        return DZIInfo.fetch(self.api, self.dzi_url)
+
     @cached_property
-    def dzi_file(self):
+    def dzi_file(self) -> "DZIFile":
+        from histpat_toolkit.dzi_file import DZIFile
+
         return DZIFile(self.dzi_url, properties=asdict(self.slide_properties))
 
-    def download_original(self, path: str):
+    def download_original(self, path: str, verbose: bool = True) -> str:
         data = self.api.query_graphql(queries.query_pathologyslide_download, variables={"id": self.id})
         download_url = data["downloadUrl"]
-        r = requests.get(download_url, stream=True)
+        with self.api.request("GET", download_url, stream=True) as r:
+            # an error body (e.g. of an expired URL) must not be saved as the slide
+            r.raise_for_status()
+
+            try:
+                file_name = r.headers["Content-Disposition"].split("filename=")[1][1:-1]
+            except Exception:
+                file_name = os.path.split(download_url)[-1].split("?")[0]
 
-        try:
-            file_name = r.headers["Content-Disposition"].split("filename=")[1][1:-1]
-        except Exception:
-            file_name = os.path.split(download_url)[-1].split("?")[0]
+            full_path = os.path.join(path, file_name)
+            with open(full_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=8192):
+                    f.write(chunk)
 
-        full_path = os.path.join(path, file_name)
-        with open(full_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
+        if verbose:
+            print("Downloaded file to {}".format(full_path))
+        return full_path
 
-        print("Downloaded file to {}".format(full_path))
+    def get_dzi_pyramid(self) -> "DZIPyramid":
+        from histpat_toolkit.image_pyramid.dzi_pyramid import DZIPyramid
 
-    def get_dzi_pyramid(self) -> DZIPyramid:
         return DZIPyramid(self.dzi_file)
 
-    def get_tiled_mask_pyramid(self, mask: TiledMask) -> TiledMaskPyramid:
-        return TiledMaskPyramid(self.dzi_file, mask.get_pyramid_info(self.api))
+    def get_tiled_mask_pyramid(self, mask: TiledMask, info: "TiledMaskPyramidInfo | None" = None) -> "TiledMaskPyramid":
+        """Pyramid of `mask`, with its tiles listed by `info` if already fetched with `mask.get_pyramid_info`"""
+        from histpat_toolkit.image_pyramid.tiled_mask_pyramid import TiledMaskPyramid
+
+        return TiledMaskPyramid(self.dzi_file, info if info is not None else mask.get_pyramid_info(self.api))
 
     def upload_tiled_mask(
         self,
@@ -350,7 +480,7 @@ class PathologySlideNode(File):
             variables["tileSize"] = tile_size
 
         mask_data = self.api.query_graphql(queries.mutation_tiledmask_create, variables=variables)
-        return TiledMask.from_graphql(mask_data["tiledMask"])
+        return self.api.identity_map.merge(TiledMask.from_graphql(mask_data["tiledMask"]))
 
     @staticmethod
     def create_from_files(
@@ -425,7 +555,8 @@ class PresignUpload:
 
     @staticmethod
     def from_graphql(graphql_data):
-        return PresignUpload(
+        return construct(
+            PresignUpload,
             url=graphql_data["url"],
             method=graphql_data["method"],
             data=graphql_data["data"],
@@ -466,9 +597,9 @@ def upload_files_to_container(
             if verbose:
                 print(f"Uploading file {relative_files[i]}...")
             if presign.method.upper() == "POST":
-                response = requests.post(presign.url, data=f, headers=presign.headers)
+                response = api.request("POST", presign.url, idempotent=True, data=f, headers=presign.headers)
             elif presign.method.upper() == "PUT":
-                response = requests.put(presign.url, data=f, headers=presign.headers)
+                response = api.request("PUT", presign.url, data=f, headers=presign.headers)
             else:
                 raise ValueError(f"Unsupported HTTP method: {presign.method}")
             response.raise_for_status()
@@ -476,6 +607,51 @@ def upload_files_to_container(
     return container_id
 
 
+IMPLICIT_VR_LITTLE_ENDIAN = "1.2.840.10008.1.2"
+EXPLICIT_VR_LITTLE_ENDIAN = "1.2.840.10008.1.2.1"
+# transfer syntaxes of frames which are decoded with Pillow, with their DICOMweb media types
+_PIL_MEDIA_TYPES = {
+    "1.2.840.10008.1.2.4.50": "image/jpeg",  # JPEG Baseline (8 bit)
+    "1.2.840.10008.1.2.4.90": "image/jp2",  # JPEG 2000 lossless
+    "1.2.840.10008.1.2.4.91": "image/jp2",  # JPEG 2000
+}
+# NumPy types of uncompressed pixels by (BitsAllocated, PixelRepresentation is signed)
+_PIXEL_DTYPES = {
+    (8, False): np.dtype(np.uint8),
+    (8, True): np.dtype(np.int8),
+    (16, False): np.dtype("<u2"),
+    (16, True): np.dtype("<i2"),
+    (32, False): np.dtype("<u4"),
+    (32, True): np.dtype("<i4"),
+}
+
+
+def _dicom_value(dataset: dict, tag: str, default=None):
+    """Return the first value of a tag from a DICOM JSON dataset"""
+    values = dataset.get(tag, {}).get("Value")
+    return values[0] if values else default
+
+
+@dataclass
+class DicomSeries:
+    series_instance_uid: str
+    modality: str | None
+    description: str | None
+    number: int | None
+    instances_count: int | None
+
+    @staticmethod
+    def from_dicom_json(dataset: dict) -> "DicomSeries":
+        return construct(
+            DicomSeries,
+            series_instance_uid=_dicom_value(dataset, "0020000E"),
+            modality=_dicom_value(dataset, "00080060"),
+            description=_dicom_value(dataset, "0008103E"),
+            number=_dicom_value(dataset, "00200011"),
+            instances_count=_dicom_value(dataset, "00201209"),
+        )
+
+
 @dataclass
 class DicomStudyFile(File):
     access_token: str
@@ -485,15 +661,28 @@ class DicomStudyFile(File):
     @classmethod
     def from_graphql(cls, data: dict, api: API) -> "DicomStudyFile":
         common_fields = cls._parse_common_fields(data, api)
-        return cls(
+        return construct(
+            cls,
             **common_fields,
             access_token=data["study"]["accessToken"],
             dicomweb_url=data["study"]["dicomwebUrl"],
             study_instance_uid=data["study"]["studyInstanceUid"],
         )
 
+    @property
+    def dicomweb_headers(self) -> dict[str, str]:
+        return {"Authorization": "Bearer {}".format(self.access_token)}
+
+    @cached_property
+    def dicomweb_client(self) -> "DICOMwebClient":
+        from dicomweb_client.api import DICOMwebClient
+
+        return DICOMwebClient(
+            url=self.dicomweb_url, headers=self.dicomweb_headers, timeout=self.api.retry_policy.timeout
+        )
+
     def download(self, path):
-        client = DICOMwebClient(url=self.dicomweb_url, headers={"Authorization": "Bearer {}".format(self.access_token)})
+        client = self.dicomweb_client
         study = client.retrieve_study(self.study_instance_uid)
 
         new_folder_path = path + self.study_instance_uid
@@ -504,6 +693,204 @@ class DicomStudyFile(File):
             with open(f"{new_folder_path}/1-{image_number:02d}.dcm", "wb") as outfile:
                 image.save_as(outfile)
 
+    def get_metadata(self) -> list[dict]:
+        """Fetch metadata (DICOM JSON, without pixel data) of all instances in the study"""
+        return self.dicomweb_client.retrieve_study_metadata(self.study_instance_uid)
+
+    def get_series_metadata(self, series_instance_uid: str) -> list[dict]:
+        """Fetch metadata (DICOM JSON, without pixel data) of all instances in a series"""
+        return self.dicomweb_client.retrieve_series_metadata(self.study_instance_uid, series_instance_uid)
+
+    def list_series(self, modality: str | None = None, description: str | None = None) -> list[DicomSeries]:
+        """List series of the study
+
+        Args:
+            modality: Return only series of this modality (e.g. "CT", "SM")
+            description: Return only series whose description contains this text (case insensitive)
+        """
+        search_filters = {"Modality": modality} if modality else None
+        series = [
+            DicomSeries.from_dicom_json(dataset)
+            for dataset in self.dicomweb_client.search_for_series(
+                self.study_instance_uid, search_filters=search_filters, get_remaining=True
+            )
+        ]
+        if description:
+            series = [item for item in series if description.lower() in (item.description or "").lower()]
+        return series
+
+    def retrieve_frames(
+        self, series_instance_uid: str, sop_instance_uid: str, frame_numbers: list[int], metadata: dict | None = None
+    ) -> list[np.ndarray]:
+        """Retrieve selected frames of an instance as NumPy arrays
+
+        Args:
+            series_instance_uid: Series of the instance
+            sop_instance_uid: Instance to retrieve frames from
+            frame_numbers: Frame numbers, starting from 1
+            metadata: DICOM JSON metadata of the instance, fetched if not given
+
+        Frames stored as baseline JPEG or JPEG 2000 are retrieved as stored and decoded with Pillow.
+        Frames in any other transfer syntax (e.g. JPEG-LS, JPEG Lossless, RLE) are requested
+        uncompressed, so the server transcodes them.
+
+        Returns:
+            list[np.ndarray]: Frames in the order of `frame_numbers`
+        """
+        if metadata is None:
+            metadata = self.dicomweb_client.retrieve_instance_metadata(
+                self.study_instance_uid, series_instance_uid, sop_instance_uid
+            )
+        transfer_syntax_uid = _dicom_value(metadata, "00020010") or _dicom_value(metadata, "00083002")
+        if transfer_syntax_uid not in _PIL_MEDIA_TYPES:
+            transfer_syntax_uid = EXPLICIT_VR_LITTLE_ENDIAN
+        media_type = _PIL_MEDIA_TYPES.get(transfer_syntax_uid, "application/octet-stream")
+        frames = self.dicomweb_client.retrieve_instance_frames(
+            self.study_instance_uid,
+            series_instance_uid,
+            sop_instance_uid,
+            frame_numbers,
+            media_types=((media_type, transfer_syntax_uid),),
+        )
+        return [_decode_frame(frame, metadata, transfer_syntax_uid) for frame in frames]
+
+    def retrieve_tiles(
+        self,
+        series_instance_uid: str,
+        sop_instance_uid: str,
+        columns: range,
+        rows: range,
+        metadata: dict | None = None,
+    ) -> np.ndarray:
+        """Retrieve a range of tiles of a tiled (WSI) instance and stitch them into one array
+
+        Tiles are assumed to be stored in TILED_FULL organization, row by row.
+
+        Args:
+            series_instance_uid: Series of the instance (one level of the pyramid)
+            sop_instance_uid: Instance to retrieve tiles from
+            columns: Range of tile columns, e.g. `range(0, 4)`
+            rows: Range of tile rows
+            metadata: DICOM JSON metadata of the instance, fetched if not given
+
+        Returns:
+            np.ndarray: Region covered by the tiles
+        """
+        if metadata is None:
+            metadata = self.dicomweb_client.retrieve_instance_metadata(
+                self.study_instance_uid, series_instance_uid, sop_instance_uid
+            )
+        tile_width = _dicom_value(metadata, "00280011")
+        tile_height = _dicom_value(metadata, "00280010")
+        total_width = _dicom_value(metadata, "00480006", tile_width)
+        total_height = _dicom_value(metadata, "00480007", tile_height)
+        tiles_per_row = math.ceil(total_width / tile_width)
+
+        frame_numbers = [row * tiles_per_row + column + 1 for row in rows for column in columns]
+        frames = self.retrieve_frames(series_instance_uid, sop_instance_uid, frame_numbers, metadata=metadata)
+
+        region = None
+        for i, frame in enumerate(frames):
+            if region is None:
+                shape = (len(rows) * tile_height, len(columns) * tile_width) + frame.shape[2:]
+                region = np.zeros(shape, dtype=frame.dtype)
+            y = (i // len(columns)) * tile_height
+            x = (i % len(columns)) * tile_width
+            region[y : y + frame.shape[0], x : x + frame.shape[1]] = frame
+
+        # crop tiles sticking out of the image
+        width = min(len(columns) * tile_width, total_width - columns.start * tile_width)
+        height = min(len(rows) * tile_height, total_height - rows.start * tile_height)
+        return region[:height, :width]
+
+    def list_instances(self) -> list[tuple[str, str]]:
+        """List (SeriesInstanceUID, SOPInstanceUID) of all instances in the study"""
+        instances = self.dicomweb_client.search_for_instances(
+            self.study_instance_uid, fields=["SeriesInstanceUID", "SOPInstanceUID"], get_remaining=True
+        )
+        return [(instance["0020000E"]["Value"][0], instance["00080018"]["Value"][0]) for instance in instances]
+
+    def download_instances(self, path: str | Path, max_workers: int = 8, verbose: bool = False) -> list[Path]:
+        """Download the study instance by instance, streaming each one straight to disk.
+
+        Instances are saved as `<path>/<StudyInstanceUID>/<SeriesInstanceUID>/<SOPInstanceUID>.dcm` and
+        downloaded concurrently. Instances already present on disk are skipped, so an interrupted
+        download can be resumed by calling this method again.
+
+        Args:
+            path: Directory where the study folder will be created
+            max_workers: Number of instances downloaded at the same time
+            verbose: If True, print progress messages
+
+        Returns:
+            list[Path]: Paths of all instances of the study
+        """
+        study_path = Path(path) / self.study_instance_uid
+        instances = self.list_instances()
+        targets = [study_path / series_uid / f"{sop_uid}.dcm" for series_uid, sop_uid in instances]
+        missing = [(instance, target) for instance, target in zip(instances, targets) if not target.exists()]
+        if verbose:
+            print(f"Study has {len(instances)} instances, {len(missing)} to download")
+
+        def download(instance: tuple[str, str], target: Path):
+            series_uid, sop_uid = instance
+            target.parent.mkdir(parents=True, exist_ok=True)
+            url = "{}/studies/{}/series/{}/instances/{}".format(
+                self.dicomweb_url.rstrip("/"), self.study_instance_uid, series_uid, sop_uid
+            )
+            headers = {**self.dicomweb_headers, "Accept": "application/dicom; transfer-syntax=*"}
+            partial_path = target.with_name(target.name + ".part")
+            with self.api.request("GET", url, stream=True, headers=headers) as r:
+                r.raise_for_status()
+                if r.headers.get("Content-Type", "").startswith("multipart/related"):
+                    # server ignored the single part request, let the DICOMweb client decode the response
+                    self.dicomweb_client.retrieve_instance(self.study_instance_uid, series_uid, sop_uid).save_as(
+                        partial_path
+                    )
+                else:
+                    with open(partial_path, "wb") as f:
+                        for chunk in r.iter_content(chunk_size=1 << 20):
+                            f.write(chunk)
+            os.replace(partial_path, target)
+            if verbose:
+                print(f"Downloaded {target}")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(download, instance, target) for instance, target in missing]:
+                future.result()
+        return targets
+
+
+def _decode_frame(frame: bytes, metadata: dict, transfer_syntax_uid: str) -> np.ndarray:
+    """Decode a frame returned by DICOMweb in the given transfer syntax"""
+    if transfer_syntax_uid in _PIL_MEDIA_TYPES:
+        from PIL import Image
+
+        return np.asarray(Image.open(io.BytesIO(frame)))
+    if transfer_syntax_uid not in (EXPLICIT_VR_LITTLE_ENDIAN, IMPLICIT_VR_LITTLE_ENDIAN):
+        raise ValueError(f"Frames in transfer syntax {transfer_syntax_uid} cannot be decoded")
+
+    rows = _dicom_value(metadata, "00280010")
+    columns = _dicom_value(metadata, "00280011")
+    samples = _dicom_value(metadata, "00280002", 1)
+    bits_allocated = _dicom_value(metadata, "00280100", 8)
+    signed = _dicom_value(metadata, "00280103", 0) == 1
+    count = rows * columns * samples
+    if bits_allocated == 1:
+        # bits are packed eight pixels per byte, the first pixel in the least significant bit
+        pixels = np.unpackbits(np.frombuffer(frame, dtype=np.uint8), count=count, bitorder="little")
+    elif (bits_allocated, signed) in _PIXEL_DTYPES:
+        pixels = np.frombuffer(frame, dtype=_PIXEL_DTYPES[bits_allocated, signed], count=count)
+    else:
+        raise ValueError(f"Frames with {bits_allocated} bits allocated per sample cannot be decoded")
+
+    if samples == 1:
+        return pixels.reshape((rows, columns))
+    if _dicom_value(metadata, "00280006", 0) == 1:
+        # color-by-plane: all samples of the first channel, then of the next one
+        return pixels.reshape((samples, rows, columns)).transpose(1, 2, 0)
+    return pixels.reshape((rows, columns, samples))
+
 
 @dataclass
 class Form:
@@ -520,9 +907,10 @@ class FormFile(File):
     @classmethod
     def from_graphql(cls, data: dict, api: API) -> "FormFile":
         common_fields = cls._parse_common_fields(data, api)
-        return cls(
+        return construct(
+            cls,
             **common_fields,
-            form=Form(id=data["form"]["id"]),
+            form=construct(Form, id=data["form"]["id"]),
             # schema_id=data['form']['schema']['id'],
             # schema_name=data['form']['schema']['name'],
             # data=data['form']['data']
@@ -537,7 +925,8 @@ class StudyNode(File):
     @classmethod
     def from_graphql(cls, data: dict, api: API) -> "StudyNode":
         common_fields = cls._parse_common_fields(data, api)
-        return cls(
+        return construct(
+            cls,
             **common_fields,
             assigned_to=[item["entity"]["name"] for item in data["assignedTo"]],
             status=data["status"]["name"],
@@ -549,7 +938,7 @@ class StudyListNode(File):
     @classmethod
     def from_graphql(cls, data: dict, api: API) -> "StudyListNode":
         common_fields = cls._parse_common_fields(data, api)
-        return cls(**common_fields)
+        return construct(cls, **common_fields)
 
     def add_study(
         self,
@@ -570,19 +959,21 @@ class StudyListNode(File):
 
 
 def parse_graphql_file(returnedJSON, api):
+    """Build the file object of a GraphQL file node, or update the one already returned for its ID"""
     type_name = returnedJSON["__typename"]
     match type_name:
         case "DicomStudyFileNode":
-            return DicomStudyFile.from_graphql(returnedJSON, api)
+            file = DicomStudyFile.from_graphql(returnedJSON, api)
         case "SimpleFileNode":
-            return SimpleFileNode.from_graphql(returnedJSON, api)
+            file = SimpleFileNode.from_graphql(returnedJSON, api)
         case "PathologySlideNode" | "PathologySlideBaseNode":
-            return PathologySlideNode.from_graphql(returnedJSON, api)
+            file = PathologySlideNode.from_graphql(returnedJSON, api)
         case "FormFileNode":
-            return FormFile.from_graphql(returnedJSON, api)
+            file = FormFile.from_graphql(returnedJSON, api)
         case "StudyNode":
-            return StudyNode.from_graphql(returnedJSON, api)
+            file = StudyNode.from_graphql(returnedJSON, api)
         case "StudyListNode":
-            return StudyListNode.from_graphql(returnedJSON, api)
+            file = StudyListNode.from_graphql(returnedJSON, api)
         case _:
-            return File.from_graphql(returnedJSON, api)
+            file = File.from_graphql(returnedJSON, api)
+    return api.identity_map.merge(file)
@@ -0,0 +1,180 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+_WHITESPACE = " \t\n\r"
+_COLLECTION_START = '{"type":"FeatureCollection","features":['
+_COLLECTION_END = "]}"
+_EMPTY_COLLECTION_BYTES = len(_COLLECTION_START) + len(_COLLECTION_END)
+
+
+@dataclass
+class GeoJSONImportResult:
+    """Outcome of a chunked GeoJSON import"""
+
+    annotation_ids: list[str] = field(default_factory=list)
+    # filled only when the import was asked to parse the returned annotations
+    annotations: list = field(default_factory=list)
+    # serialized FeatureCollection of every chunk which failed, with its error
+    failed_chunks: list[tuple[str, Exception]] = field(default_factory=list)
+
+
+class _StreamDecoder:
+    """Decodes consecutive JSON values from a text stream without reading it whole."""
+
+    def __init__(self, stream: IO[str], read_size: int):
+        self.stream = stream
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.mark: int | None = None
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        # drop the consumed part of the buffer so memory stays proportional to one feature
+        cut = self.pos if self.mark is None else self.mark
+        self.buffer = self.buffer[cut:]
+        self.pos -= cut
+        if self.mark is not None:
+            self.mark -= cut
+        data = self.stream.read(self.read_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer += data
+        return True
+
+    def peek(self) -> str | None:
+        """Return the next non-whitespace character without consuming it, None at end of stream"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return None
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Invalid GeoJSON: expected '{char}', found {found!r}")
+        self.pos += 1
+
+    def decode(self) -> Any:
+        self.peek()
+        read_size = self.read_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number at the end of the buffer may be cut in half - make sure it is complete
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            data = self.stream.read(read_size)
+            if not data:
+                self.eof = True
+            self.buffer += data
+            # grow reads geometrically so a single huge feature is not decoded quadratically
+            read_size *= 2
+
+
+def iter_geojson_features(path: str | Path, read_size: int = 1 << 20) -> Iterator[dict]:
+    """Yield GeoJSON features one by one from a file without loading it into memory.
+
+    Supports a FeatureCollection document (the `features` array is streamed) as well as
+    newline-delimited GeoJSON where every line is a single Feature.
+
+    Args:
+        path: Path to the GeoJSON file
+        read_size: Number of characters read from the file at once
+
+    Yields:
+        dict: GeoJSON Feature objects
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _StreamDecoder(f, read_size)
+        if stream.peek() != "{":
+            raise ValueError("Invalid GeoJSON: expected an object")
+
+        # Look at the first key of the top-level object. Features on separate lines are
+        # decoded one after another, a collection is walked key by key.
+        stream.mark = stream.pos
+        stream.expect("{")
+        key = None
+        is_collection = False
+        while stream.peek() != "}":
+            key = stream.decode()
+            stream.expect(":")
+            if key == "features":
+                is_collection = True
+                break
+            value = stream.decode()
+            if key == "type":
+                is_collection = value == "FeatureCollection"
+                if not is_collection:
+                    break
+            if stream.peek() == ",":
+                stream.pos += 1
+
+        if not is_collection:
+            stream.pos = stream.mark
+            stream.mark = None
+            while stream.peek() is not None:
+                feature = stream.decode()
+                if feature.get("type") == "Feature":
+                    yield feature
+            return
+
+        stream.mark = None
+        if key != "features":
+            raise ValueError("Invalid GeoJSON: FeatureCollection without features")
+
+        stream.expect("[")
+        while stream.peek() != "]":
+            if stream.peek() is None:
+                raise ValueError("Invalid GeoJSON: unexpected end of file")
+            yield stream.decode()
+            if stream.peek() == ",":
+                stream.pos += 1
+
+
+def chunk_geojson_features(
+    features: Iterator[dict], max_chunk_bytes: int = 4 << 20, max_features: int = 5000
+) -> Iterator[str]:
+    """Group features into FeatureCollection documents bounded by size and number of features
+
+    Args:
+        features: Iterator of GeoJSON features
+        max_chunk_bytes: Maximum size in bytes of a single serialized FeatureCollection, exceeded only by
+            a collection of one feature which is larger on its own
+        max_features: Maximum number of features in a single FeatureCollection
+
+    Yields:
+        str: Serialized FeatureCollection
+    """
+    chunk: list[str] = []
+    chunk_size = _EMPTY_COLLECTION_BYTES
+    for feature in features:
+        serialized = json.dumps(feature, separators=(",", ":"))
+        # a comma separates the feature from the previous one
+        size = len(serialized.encode("utf-8")) + (1 if chunk else 0)
+        if chunk and (chunk_size + size > max_chunk_bytes or len(chunk) >= max_features):
+            yield _feature_collection(chunk)
+            chunk = []
+            chunk_size = _EMPTY_COLLECTION_BYTES
+            size -= 1
+        chunk.append(serialized)
+        chunk_size += size
+    if chunk:
+        yield _feature_collection(chunk)
+
+
+def _feature_collection(features: list[str]) -> str:
+    return _COLLECTION_START + ",".join(features) + _COLLECTION_END
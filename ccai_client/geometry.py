@@ -0,0 +1,137 @@
+import numpy as np
+
+# Shape types are compared by value, ShapeType is a StrEnum so its members compare equal to strings
+_POLYGON_TYPES = ("polygon", "closed_path", "path")
+
+
+class ShapeGeometry:
+    """Array-backed geometry of an annotation.
+
+    `data` holds the flat shape data as a NumPy array and `points` is a (N, 2) view over it,
+    so no per-vertex Python objects are created. `histpat_toolkit.geom` shapes are built only
+    when `as_shape` is called.
+
+    Shape data layout: rect - x, y, width, height; circle - center x, y, radius;
+    ellipse - center x, y, radius x, radius y; other types - x, y pairs.
+    """
+
+    def __init__(self, shape_type: str, shape_data):
+        self.shape_type = shape_type
+        self.data = np.asarray(shape_data)
+
+    @property
+    def points(self) -> np.ndarray:
+        """(N, 2) view over the shape data; for rectangles the four corners"""
+        if self.shape_type == "rect":
+            x, y, width, height = self.data[:4]
+            return np.array([[x, y], [x + width, y], [x + width, y + height], [x, y + height]])
+        return self.data[: len(self.data) // 2 * 2].reshape(-1, 2)
+
+    def bounds(self) -> tuple[float, float, float, float]:
+        """Axis-aligned bounding box as (min_x, min_y, max_x, max_y)"""
+        data = self.data
+        match self.shape_type:
+            case "rect":
+                return data[0], data[1], data[0] + data[2], data[1] + data[3]
+            case "circle":
+                return data[0] - data[2], data[1] - data[2], data[0] + data[2], data[1] + data[2]
+            case "ellipse":
+                return data[0] - data[2], data[1] - data[3], data[0] + data[2], data[1] + data[3]
+            case _:
+                points = self.points
+                if len(points) == 0:
+                    raise ValueError("Cannot compute bounds of an empty shape")
+                min_x, min_y = points.min(axis=0)
+                max_x, max_y = points.max(axis=0)
+                return min_x, min_y, max_x, max_y
+
+    def area(self) -> float:
+        """Area of the shape, 0 for points and lines"""
+        data = self.data
+        match self.shape_type:
+            case "rect":
+                return float(abs(data[2] * data[3]))
+            case "circle":
+                return float(np.pi * data[2] ** 2)
+            case "ellipse":
+                return float(np.pi * data[2] * data[3])
+            case _ if self.shape_type in _POLYGON_TYPES:
+                # shoelace formula
+                x = self.points[:, 0].astype(np.float64)
+                y = self.points[:, 1].astype(np.float64)
+                return float(abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2)
+            case _:
+                return 0.0
+
+    def scale(self, factor: float) -> "ShapeGeometry":
+        """Return the geometry with all coordinates (and sizes) multiplied by `factor`
+
+        Useful for relative coordinates, e.g. `scale(image_width)` as in `Marker.as_rectangle`.
+        """
+        return ShapeGeometry(self.shape_type, self.data * factor)
+
+    def contains(self, points) -> np.ndarray:
+        """Test which points lie inside the shape
+
+        Args:
+            points: Array-like of shape (M, 2) with x, y coordinates
+
+        Returns:
+            np.ndarray: Boolean array of shape (M,)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        x, y = points[:, 0], points[:, 1]
+        data = self.data.astype(np.float64)
+        match self.shape_type:
+            case "rect":
+                return (x >= data[0]) & (x <= data[0] + data[2]) & (y >= data[1]) & (y <= data[1] + data[3])
+            case "circle":
+                return (x - data[0]) ** 2 + (y - data[1]) ** 2 <= data[2] ** 2
+            case "ellipse":
+                return ((x - data[0]) / data[2]) ** 2 + ((y - data[1]) / data[3]) ** 2 <= 1
+            case _ if self.shape_type in _POLYGON_TYPES:
+                return self._polygon_contains(x, y)
+            case _:
+                return np.zeros(len(points), dtype=bool)
+
+    def _polygon_contains(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        vertices = self.points.astype(np.float64)
+        result = np.zeros(len(x), dtype=bool)
+        if len(vertices) < 3:
+            return result
+
+        min_x, min_y, max_x, max_y = self.bounds()
+        candidates = np.flatnonzero((x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y))
+
+        x1, y1 = vertices[:, 0], vertices[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+        # Ray casting - a point is inside if a horizontal ray going right from it crosses an odd number
+        # of edges. Points are sorted by y, so every edge is tested only against points within its y range.
+        order = candidates[np.argsort(y[candidates], kind="stable")]
+        sorted_y = y[order]
+        low, high = np.minimum(y1, y2), np.maximum(y1, y2)
+        starts = np.searchsorted(sorted_y, low, side="left")
+        ends = np.searchsorted(sorted_y, high, side="left")
+        for edge in np.flatnonzero(ends > starts):
+            index = order[starts[edge] : ends[edge]]
+            x_cross = (x2[edge] - x1[edge]) * (y[index] - y1[edge]) / (y2[edge] - y1[edge]) + x1[edge]
+            result[index] ^= x[index] < x_cross
+        return result
+
+    def as_shape(self):
+        """Build the corresponding `histpat_toolkit.geom` shape"""
+        from histpat_toolkit.geom import Circle, Ellipse, Point, Polygon, Rectangle
+
+        data = self.data.tolist()
+        match self.shape_type:
+            case "rect":
+                return Rectangle(data[0], data[1], data[2], data[3])
+            case _ if self.shape_type in _POLYGON_TYPES:
+                return Polygon(points=[Point(x, y) for x, y in self.points.tolist()])
+            case "circle":
+                return Circle(Point(data[0], data[1]), data[2])
+            case "ellipse":
+                return Ellipse(Point(data[0], data[1]), (data[2], data[3]))
+            case _:
+                raise ValueError(f"Shape type: {self.shape_type} not supported")
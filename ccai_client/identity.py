@@ -0,0 +1,87 @@
+import dataclasses
+import sys
+import threading
+import weakref
+from functools import cached_property, lru_cache
+from typing import Any, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=None)
+def _field_names(cls: type) -> tuple[str, ...]:
+    return tuple(field.name for field in dataclasses.fields(cls))
+
+
+@lru_cache(maxsize=None)
+def _cached_properties(cls: type) -> tuple[str, ...]:
+    return tuple(
+        {name for klass in cls.__mro__ for name, value in vars(klass).items() if isinstance(value, cached_property)}
+    )
+
+
+class IdentityMap:
+    """Canonical objects parsed from API responses, by GraphQL ID
+
+    Every `API` has one (`api.identity_map`). Files, annotations and tiled masks fetched again are
+    merged into the object returned before, so there is one instance of each entity in use and
+    objects held by the caller see the new values. Objects are held weakly and forgotten when
+    nothing else refers to them.
+    """
+
+    def __init__(self):
+        self._objects: weakref.WeakValueDictionary[str, Any] = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def merge(self, instance: T) -> T:
+        """Canonical object with the ID of `instance`, updated with its fields
+
+        Objects with an `updated_at` field are taken as unchanged while it is; others are always
+        updated.
+        """
+        with self._lock:
+            existing = self._objects.get(instance.id)
+            if existing is None or type(existing) is not type(instance):
+                self._objects[instance.id] = instance
+                return instance
+        updated_at = instance.__dict__.get("updated_at")
+        if updated_at is not None and updated_at == existing.__dict__.get("updated_at"):
+            return existing
+        # updated in place, other threads may be reading the object
+        existing.__dict__.update({name: instance.__dict__[name] for name in _field_names(type(instance))})
+        # cached properties (geometry, DZI files, ...) may depend on the changed fields
+        for name in _cached_properties(type(existing)):
+            existing.__dict__.pop(name, None)
+        return existing
+
+    def get(self, id: str) -> Any | None:
+        return self._objects.get(id)
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+
+_interned: weakref.WeakValueDictionary[tuple, Any] = weakref.WeakValueDictionary()
+_interned_lock = threading.Lock()
+
+
+def interned(cls: type[T], key: Hashable, build: Callable[[], T]) -> T:
+    """Shared instance of a small value object (tag, algorithm, color map), built if not in use yet
+
+    `key` must identify the whole value, e.g. (id, name) of an algorithm. Interned objects are
+    shared by all results, so they should not be modified.
+    """
+    with _interned_lock:
+        instance = _interned.get((cls, key))
+        if instance is None:
+            instance = _interned[(cls, key)] = build()
+        return instance
+
+
+def intern_name(value: str | None) -> str | None:
+    """One string object for every occurrence of a repeated name, e.g. an author"""
+    return sys.intern(value) if value is not None else None
@@ -0,0 +1,193 @@
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
+
+OPERATION_NAME = re.compile(r"(query|mutation) +([a-zA-Z0-9_]+)")
+
+# upper bounds (in seconds) of latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+@lru_cache(maxsize=256)
+def parse_operation(query: str) -> tuple[str, str]:
+    """Type and name of the GraphQL operation, e.g. `("query", "GetFile")` for `query GetFile($id: ID!) {...}`"""
+    match = OPERATION_NAME.search(query)
+    if not match:
+        return "query", "anonymous"
+    return match.group(1), match.group(2)
+
+
+def operation_name(query: str) -> str:
+    return parse_operation(query)[1]
+
+
+@dataclass
+class RequestEvent:
+    """Information about a single HTTP request sent by the client
+
+    `kind` is `graphql` for API queries and `transfer` for uploads and downloads, `operation` is the
+    GraphQL operation name or the HTTP method of a transfer. `error` is set when the request failed,
+    including GraphQL errors returned with a 200 status. Byte counts are sizes on the wire,
+    `bytes_saved` is how much smaller compressed request and response bodies were (not counted
+    for streamed responses). `latency` and `response_bytes` of streamed responses cover reading
+    the body, they are recorded when the response is closed.
+    """
+
+    kind: str
+    operation: str
+    status: int | None
+    latency: float
+    request_bytes: int
+    response_bytes: int
+    retries: int = 0
+    error: str | None = None
+    bytes_saved: int = 0
+
+
+Hook = Callable[[RequestEvent], None]
+
+
+class _Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """Built-in counters and latency histograms of requests, grouped by kind and operation
+
+    Every `API` records its requests in `api.metrics`. Use `snapshot()` to inspect them,
+    `to_prometheus()` to export them in Prometheus text format, or add your own hook to
+    `API` (see `otel_hook`) to forward events to another metrics system.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: dict[tuple[str, str], int] = {}
+        self._errors: dict[tuple[str, str], int] = {}
+        self._retries: dict[tuple[str, str], int] = {}
+        self._request_bytes: dict[tuple[str, str], int] = {}
+        self._response_bytes: dict[tuple[str, str], int] = {}
+        self._bytes_saved: dict[tuple[str, str], int] = {}
+        self._latency: dict[tuple[str, str], _Histogram] = {}
+
+    def __call__(self, event: RequestEvent):
+        key = (event.kind, event.operation)
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if event.error:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            self._retries[key] = self._retries.get(key, 0) + event.retries
+            self._request_bytes[key] = self._request_bytes.get(key, 0) + event.request_bytes
+            self._response_bytes[key] = self._response_bytes.get(key, 0) + event.response_bytes
+            self._bytes_saved[key] = self._bytes_saved.get(key, 0) + event.bytes_saved
+            if key not in self._latency:
+                self._latency[key] = _Histogram()
+            self._latency[key].observe(event.latency)
+
+    def reset(self):
+        with self._lock:
+            for values in (
+                self._requests,
+                self._errors,
+                self._retries,
+                self._request_bytes,
+                self._response_bytes,
+                self._bytes_saved,
+            ):
+                values.clear()
+            self._latency.clear()
+
+    def snapshot(self) -> dict[tuple[str, str], dict]:
+        """Totals per (kind, operation), sorted by total time spent - the most expensive operations first"""
+        with self._lock:
+            result = {
+                key: {
+                    "requests": count,
+                    "errors": self._errors.get(key, 0),
+                    "retries": self._retries[key],
+                    "request_bytes": self._request_bytes[key],
+                    "response_bytes": self._response_bytes[key],
+                    "bytes_saved": self._bytes_saved[key],
+                    "total_time": self._latency[key].sum,
+                    "average_time": self._latency[key].sum / count,
+                }
+                for key, count in self._requests.items()
+            }
+        return dict(sorted(result.items(), key=lambda item: -item[1]["total_time"]))
+
+    def to_prometheus(self, prefix: str = "ccai_client") -> str:
+        """Export metrics in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = [
+                ("requests_total", "Number of requests", self._requests),
+                ("request_errors_total", "Number of failed requests", self._errors),
+                ("request_retries_total", "Number of retried attempts", self._retries),
+                ("request_bytes_total", "Bytes sent in request bodies", self._request_bytes),
+                ("response_bytes_total", "Bytes received in response bodies", self._response_bytes),
+                ("compression_saved_bytes_total", "Bytes saved by compressing bodies", self._bytes_saved),
+            ]
+            for name, description, values in counters:
+                lines.append(f"# HELP {prefix}_{name} {description}")
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for (kind, operation), value in values.items():
+                    lines.append(f'{prefix}_{name}{{kind="{kind}",operation="{operation}"}} {value}')
+
+            name = f"{prefix}_request_duration_seconds"
+            lines.append(f"# HELP {name} Request latency")
+            lines.append(f"# TYPE {name} histogram")
+            for (kind, operation), histogram in self._latency.items():
+                labels = f'kind="{kind}",operation="{operation}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def otel_hook(meter) -> Hook:
+    """Create a hook recording request events with an OpenTelemetry meter
+
+    Args:
+        meter: OpenTelemetry meter, e.g. `opentelemetry.metrics.get_meter("ccai_client")`
+
+    Returns:
+        Hook: Callable to be passed to `API.add_hook`
+    """
+    requests = meter.create_counter("ccai_client.requests", description="Number of requests")
+    errors = meter.create_counter("ccai_client.request_errors", description="Number of failed requests")
+    retries = meter.create_counter("ccai_client.request_retries", description="Number of retried attempts")
+    sent = meter.create_counter("ccai_client.request_bytes", unit="By", description="Bytes sent")
+    received = meter.create_counter("ccai_client.response_bytes", unit="By", description="Bytes received")
+    saved = meter.create_counter("ccai_client.compression_saved_bytes", unit="By", description="Bytes saved")
+    duration = meter.create_histogram("ccai_client.request_duration", unit="s", description="Request latency")
+
+    def hook(event: RequestEvent):
+        attributes = {"kind": event.kind, "operation": event.operation, "status": event.status or 0}
+        requests.add(1, attributes)
+        if event.error:
+            errors.add(1, attributes)
+        if event.retries:
+            retries.add(event.retries, attributes)
+        sent.add(event.request_bytes, attributes)
+        received.add(event.response_bytes, attributes)
+        if event.bytes_saved:
+            saved.add(event.bytes_saved, attributes)
+        duration.record(event.latency, attributes)
+
+    return hook
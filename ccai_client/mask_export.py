@@ -0,0 +1,194 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import numpy as np
+
+from .file_classes import PathologySlideNode
+from .patho import ColorMap, TiledMask
+
+
+def _import_zarr():
+    try:
+        import zarr
+    except ImportError:
+        raise ImportError("Zarr export requires zarr. Install it with `pip install ccai-client[zarr]`")
+    return zarr
+
+
+class _MaskImage:
+    """A tiled mask at one scale, read in square blocks through its `TiledMaskPyramid`"""
+
+    def __init__(self, slide: PathologySlideNode, mask: TiledMask, scale: float | None):
+        info = mask.get_pyramid_info(slide.api)
+        self.pyramid = slide.get_tiled_mask_pyramid(mask, info)
+        self.scale = self.pyramid.scale if scale is None else scale
+        slide_info = slide.dzi_info
+        self.width = max(1, round(slide_info.width * self.scale))
+        self.height = max(1, round(slide_info.height * self.scale))
+        # blocks of the full resolution are the mask tiles
+        self.block_size = info.tile_size or slide_info.tile_size
+        self.blocks = [
+            (x, y) for y in range(0, self.height, self.block_size) for x in range(0, self.width, self.block_size)
+        ]
+
+    def read(self, x: int, y: int) -> np.ndarray:
+        from histpat_toolkit.geom import Rectangle
+
+        width, height = min(self.block_size, self.width - x), min(self.block_size, self.height - y)
+        region = Rectangle(x, y, width, height)
+        return np.asarray(self.pyramid.crop_rect(region, scale=self.scale, allow_out_of_bounds=True))
+
+
+def _converter(color_map: ColorMap | None, keys: bool, missing: int) -> Callable[[np.ndarray], np.ndarray]:
+    def convert(pixels: np.ndarray) -> np.ndarray:
+        if pixels.ndim == 2:
+            if keys:
+                # masks uploaded as keys
+                return pixels.astype(np.int32)
+            pixels = np.repeat(pixels[..., None], 3, axis=-1)
+        if pixels.shape[-1] == 3:
+            alpha = np.full(pixels.shape[:-1] + (1,), 255, dtype=np.uint8)
+            pixels = np.concatenate([pixels.astype(np.uint8), alpha], axis=-1)
+        return color_map.rgba_to_keys(pixels, missing=missing) if keys else pixels.astype(np.uint8)
+
+    return convert
+
+
+def _read_blocks(
+    image: _MaskImage, convert: Callable[[np.ndarray], np.ndarray], max_workers: int
+) -> Iterator[tuple[tuple[int, int], np.ndarray]]:
+    """Yield converted blocks as they are read, with at most 2 * max_workers blocks in memory"""
+
+    def read(block: tuple[int, int]) -> np.ndarray:
+        return convert(image.read(*block))
+
+    blocks = iter(image.blocks)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            for block in blocks:
+                pending[executor.submit(read, block)] = block
+                if len(pending) >= 2 * max_workers:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+def _export(
+    slide: PathologySlideNode,
+    mask: TiledMask,
+    scale: float | None,
+    keys: bool,
+    missing: int,
+    max_workers: int,
+    verbose: bool,
+    open_array: Callable[[_MaskImage, tuple[int, ...], np.dtype, int], Any],
+):
+    if keys and mask.color_map is None:
+        raise ValueError("Mask without a color map cannot be exported as keys")
+    image = _MaskImage(slide, mask, scale)
+    shape = (image.height, image.width) if keys else (image.height, image.width, 4)
+    fill_value = missing if keys else 0
+    array = open_array(image, shape, np.dtype(np.int32 if keys else np.uint8), fill_value)
+
+    convert = _converter(mask.color_map, keys, missing)
+    for count, ((x, y), pixels) in enumerate(_read_blocks(image, convert, max_workers), 1):
+        # empty areas keep the fill value, so that they are not stored in Zarr arrays
+        if (pixels != fill_value).any():
+            height, width = min(pixels.shape[0], shape[0] - y), min(pixels.shape[1], shape[1] - x)
+            array[y : y + height, x : x + width] = pixels[:height, :width]
+        if verbose and count % 100 == 0:
+            print(f"Exported {count}/{len(image.blocks)} blocks")
+    if verbose:
+        print(f"Exported mask {mask.id} at scale {image.scale:g} ({shape[1]}x{shape[0]})")
+    return array
+
+
+def export_tiled_mask(
+    slide: PathologySlideNode,
+    mask: TiledMask,
+    path: str | Path,
+    scale: float | None = None,
+    keys: bool = False,
+    missing: int = 0,
+    max_workers: int = 8,
+    verbose: bool = False,
+) -> np.memmap:
+    """Write a tiled mask at one scale to a `.npy` file and return it memory-mapped
+
+    The mask is read through its `TiledMaskPyramid` (`slide.get_tiled_mask_pyramid`) in blocks of
+    the mask tile size, in parallel. Empty areas stay zero (or `missing`). The file can be opened
+    again with `np.load(path, mmap_mode="r")`.
+
+    Args:
+        slide: Slide of the mask
+        mask: Tiled mask to export
+        path: Path of the `.npy` file
+        scale: Scale relative to the slide, e.g. `pyramid.get_scale_for(magnification=2)`, by default
+            the full resolution of the mask (`pyramid.scale`)
+        keys: If True, export color map keys (int32, height x width) instead of RGBA (height x width x 4)
+        missing: Key of pixels whose color is not in the color map and of empty areas, with `keys=True`
+        max_workers: Number of blocks read at the same time
+        verbose: If True, print progress messages
+
+    Returns:
+        np.memmap: The exported mask
+    """
+
+    def open_array(image: _MaskImage, shape: tuple[int, ...], dtype: np.dtype, fill_value: int) -> np.memmap:
+        array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        if fill_value:
+            # one band of blocks at a time, to keep memory bounded
+            for y in range(0, shape[0], image.block_size):
+                array[y : y + image.block_size] = fill_value
+        return array
+
+    array = _export(slide, mask, scale, keys, missing, max_workers, verbose, open_array)
+    array.flush()
+    return array
+
+
+def export_tiled_mask_zarr(
+    slide: PathologySlideNode,
+    mask: TiledMask,
+    path: str | Path,
+    scale: float | None = None,
+    keys: bool = False,
+    missing: int = 0,
+    max_workers: int = 8,
+    verbose: bool = False,
+):
+    """Write a tiled mask at one scale to a Zarr array chunked like the mask tiles
+
+    Every block is written to exactly one chunk and chunks of empty areas are not stored. The
+    scale, mask ID and color map codename are saved in the array attributes. Requires zarr
+    (`pip install ccai-client[zarr]`). See `export_tiled_mask` for the arguments.
+
+    Returns:
+        zarr.Array: The exported mask
+    """
+    zarr = _import_zarr()
+
+    def open_array(image: _MaskImage, shape: tuple[int, ...], dtype: np.dtype, fill_value: int):
+        array = zarr.open_array(
+            store=str(path),
+            mode="w",
+            shape=shape,
+            chunks=(image.block_size, image.block_size) + shape[2:],
+            dtype=dtype,
+            fill_value=fill_value,
+        )
+        array.attrs.update(
+            {
+                "mask_id": mask.id,
+                "scale": image.scale,
+                "color_map": mask.color_map.codename if mask.color_map else None,
+            }
+        )
+        return array
+
+    return _export(slide, mask, scale, keys, missing, max_workers, verbose, open_array)
@@ -0,0 +1,262 @@
+import io
+import math
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from .dzi import DZIInfo
+from .file_classes import PathologySlideNode
+from .mask_export import _import_zarr
+
+# chunks written so far, one "<dataset> <chunk row> <chunk column>" line each, removed when the export is complete
+PROGRESS_FILE = ".ccai_progress"
+
+CHANNELS = (("R", "FF0000"), ("G", "00FF00"), ("B", "0000FF"))
+# display range of every channel, the full range of uint8
+WINDOW = {"start": 0, "end": 255, "min": 0, "max": 255}
+
+
+@dataclass(frozen=True)
+class _Level:
+    """Part of a DZI level covered by one dataset of the store, in pixels of that level"""
+
+    dataset: int
+    dzi_level: int
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return len(CHANNELS), self.y1 - self.y0, self.x1 - self.x0
+
+
+def _levels(dzi: DZIInfo, region: tuple[int, int, int, int], levels: int) -> list[_Level]:
+    x, y, width, height = region
+    result = []
+    for dataset in range(levels):
+        factor = 2**dataset
+        level_width, level_height = dzi.level_dimensions(dzi.max_level - dataset)
+        result.append(
+            _Level(
+                dataset=dataset,
+                dzi_level=dzi.max_level - dataset,
+                x0=x // factor,
+                y0=y // factor,
+                x1=min(math.ceil((x + width) / factor), level_width),
+                y1=min(math.ceil((y + height) / factor), level_height),
+            )
+        )
+    return result
+
+
+def _metadata(slide: PathologySlideNode, levels: list[_Level]) -> dict:
+    """OME-NGFF 0.4 multiscales and omero metadata, coordinates in micrometers when the slide has an mpp"""
+    properties = slide.slide_properties
+    mpp = properties.mpp if properties else None
+    pixel = mpp or 1.0
+    space = {"type": "space", "unit": "micrometer"} if mpp else {"type": "space"}
+    datasets = [
+        {
+            "path": str(level.dataset),
+            "coordinateTransformations": [
+                {"type": "scale", "scale": [1.0, pixel * 2**level.dataset, pixel * 2**level.dataset]},
+                {
+                    "type": "translation",
+                    "translation": [0.0, level.y0 * pixel * 2**level.dataset, level.x0 * pixel * 2**level.dataset],
+                },
+            ],
+        }
+        for level in levels
+    ]
+    return {
+        "multiscales": [
+            {
+                "version": "0.4",
+                "name": slide.name,
+                "axes": [{"name": "c", "type": "channel"}, {"name": "y", **space}, {"name": "x", **space}],
+                "datasets": datasets,
+            }
+        ],
+        "omero": {
+            "name": slide.name,
+            "version": "0.4",
+            "rdefs": {"model": "color"},
+            "channels": [
+                {
+                    "label": label,
+                    "color": color,
+                    "active": True,
+                    "window": dict(WINDOW),
+                }
+                for label, color in CHANNELS
+            ],
+        },
+    }
+
+
+def _open_group(zarr, path: Path, mode: str):
+    # OME-NGFF 0.4 is defined for Zarr format 2, zarr-python 3 writes format 3 by default
+    try:
+        return zarr.open_group(str(path), mode=mode, zarr_format=2)
+    except TypeError:
+        return zarr.open_group(str(path), mode=mode)
+
+
+def _read_chunk(
+    slide: PathologySlideNode, dzi: DZIInfo, level: _Level, chunk_size: int, row: int, col: int
+) -> tuple[tuple[slice, slice], np.ndarray]:
+    """Assemble one chunk of a dataset from the DZI tiles overlapping it"""
+    from PIL import Image
+
+    x0, y0 = level.x0 + col * chunk_size, level.y0 + row * chunk_size
+    x1, y1 = min(x0 + chunk_size, level.x1), min(y0 + chunk_size, level.y1)
+    block = np.zeros((len(CHANNELS), y1 - y0, x1 - x0), dtype=np.uint8)
+    for tile_row in range(y0 // dzi.tile_size, (y1 - 1) // dzi.tile_size + 1):
+        for tile_col in range(x0 // dzi.tile_size, (x1 - 1) // dzi.tile_size + 1):
+            response = slide.api.request("GET", dzi.tile_url(slide.dzi_url, level.dzi_level, tile_col, tile_row))
+            response.raise_for_status()
+            tile = np.asarray(Image.open(io.BytesIO(response.content)).convert("RGB"))
+            tile_x0, tile_y0, tile_x1, tile_y1 = dzi.tile_bounds(level.dzi_level, tile_col, tile_row)
+            offset_x, offset_y = dzi.tile_offset(tile_col, tile_row)
+            left, top = max(x0, tile_x0), max(y0, tile_y0)
+            right, bottom = min(x1, tile_x1), min(y1, tile_y1)
+            pixels = tile[
+                offset_y + top - tile_y0 : offset_y + bottom - tile_y0,
+                offset_x + left - tile_x0 : offset_x + right - tile_x0,
+            ]
+            block[:, top - y0 : top - y0 + pixels.shape[0], left - x0 : left - x0 + pixels.shape[1]] = pixels.transpose(
+                2, 0, 1
+            )
+    return (slice(y0 - level.y0, y1 - level.y0), slice(x0 - level.x0, x1 - level.x0)), block
+
+
+def _chunks(level: _Level, chunk_size: int, done: set[tuple[int, int, int]]) -> Iterator[tuple[int, int]]:
+    _, height, width = level.shape
+    for row in range(math.ceil(height / chunk_size)):
+        for col in range(math.ceil(width / chunk_size)):
+            if (level.dataset, row, col) not in done:
+                yield row, col
+
+
+def export_ome_zarr(
+    slide: PathologySlideNode,
+    path: str | Path,
+    region: tuple[int, int, int, int] | None = None,
+    levels: int | None = None,
+    chunk_size: int | None = None,
+    max_workers: int = 8,
+    overwrite: bool = False,
+    verbose: bool = False,
+):
+    """Convert a slide to an OME-Zarr (OME-NGFF 0.4) multiscale image, reading its DZI tiles
+
+    Dataset `i` of the image is downsampled `2**i` times, the pixel size is taken from the slide mpp
+    (stored with the magnification under the `ccai` attribute). Chunks are read and written in
+    parallel, with at most `2 * max_workers` chunks in memory. Written chunks are recorded in the
+    store, so an interrupted export continues where it stopped when called again with the same
+    arguments. Chunks aligned with the DZI tiles (the default for whole slides) need one tile
+    each, other chunks read every tile they overlap. Requires zarr (`pip install ccai-client[zarr]`).
+
+    Example:
+        export_ome_zarr(slide, "slide.ome.zarr", region=(10_000, 20_000, 4096, 4096), levels=3)
+
+    Args:
+        slide: Slide to export
+        path: Directory of the Zarr store
+        region: (x, y, width, height) in pixels of the full resolution, by default the whole slide
+        levels: Number of resolution levels, by default down to a single chunk
+        chunk_size: Width and height of chunks, by default the DZI tile size
+        max_workers: Number of chunks read at the same time
+        overwrite: If True, replace an existing store instead of continuing it
+        verbose: If True, print progress messages
+
+    Returns:
+        zarr.Group: The exported image
+    """
+    zarr = _import_zarr()
+    path = Path(path)
+    dzi = slide.dzi_info
+    chunk_size = chunk_size or dzi.tile_size
+    x, y, width, height = region or (0, 0, dzi.width, dzi.height)
+    x, y = max(0, x), max(0, y)
+    width, height = min(width, dzi.width - x), min(height, dzi.height - y)
+    if width <= 0 or height <= 0:
+        raise ValueError("Region is outside of the slide")
+    if levels is None:
+        levels = 1 + max(0, math.ceil(math.log2(max(width, height) / chunk_size)))
+    levels = min(levels, dzi.max_level + 1)
+
+    properties = slide.slide_properties
+    parameters = {
+        "slide_id": slide.id,
+        "region": [x, y, width, height],
+        "levels": levels,
+        "chunk_size": chunk_size,
+        "mpp": properties.mpp if properties else None,
+        "magnification": properties.magnification if properties else None,
+    }
+    dataset_levels = _levels(dzi, (x, y, width, height), levels)
+    progress_path = path / PROGRESS_FILE
+
+    group = None if overwrite or not path.exists() else _open_group(zarr, path, "r+")
+    if group is not None:
+        saved = dict(group.attrs.get("ccai", {}))
+        complete = saved.pop("complete", False)
+        if saved != parameters:
+            raise ValueError(f"{path} contains a different export, use overwrite=True to replace it")
+        if complete:
+            return group
+    else:
+        group = _open_group(zarr, path, "w")
+        group.attrs.update({**_metadata(slide, dataset_levels), "ccai": {**parameters, "complete": False}})
+        for level in dataset_levels:
+            create = getattr(group, "require_array", None) or group.require_dataset
+            create(
+                str(level.dataset),
+                shape=level.shape,
+                chunks=(len(CHANNELS), chunk_size, chunk_size),
+                dtype="uint8",
+                fill_value=0,
+            )
+
+    done = set()
+    if progress_path.exists():
+        with open(progress_path) as f:
+            done = {tuple(map(int, line.split())) for line in f if line.strip()}
+
+    with open(progress_path, "a") as progress, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for level in dataset_levels:
+            array = group[str(level.dataset)]
+
+            def write(row: int, col: int, level: _Level = level, array=array):
+                index, block = _read_chunk(slide, dzi, level, chunk_size, row, col)
+                array[(slice(None), *index)] = block
+
+            chunks = _chunks(level, chunk_size, done)
+            pending = {}
+            written = 0
+            while True:
+                for row, col in chunks:
+                    pending[executor.submit(write, row, col)] = (row, col)
+                    if len(pending) >= 2 * max_workers:
+                        break
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    row, col = pending.pop(future)
+                    future.result()
+                    progress.write(f"{level.dataset} {row} {col}\n")
+                    written += 1
+                progress.flush()
+            if verbose:
+                print(f"Exported level {level.dataset} ({level.shape[2]}x{level.shape[1]}), {written} chunks written")
+
+    group.attrs["ccai"] = {**parameters, "complete": True}
+    progress_path.unlink()
+    return group
@@ -1,23 +1,29 @@
+import threading
+import weakref
 from datetime import datetime
 from enum import StrEnum
-from typing import Any
+from functools import cached_property, lru_cache
+from typing import TYPE_CHECKING, Any
 
-from histpat_toolkit.geom import Circle, Ellipse, Point, Polygon, Rectangle, Shape
+import numpy as np
 from histpat_toolkit.types import Tile, TiledMaskPyramidInfo
-from pydantic.dataclasses import dataclass
 
 from ccai_client.api import API
 
-from .core_classes import Comment, DiscussionMixin
+from .core_classes import Comment, DiscussionMixin, construct, dataclass, dataclass_state, parse_datetime
+from .geometry import ShapeGeometry
+from .identity import intern_name, interned
 from .queries import (
     mutation_run_algorithm,
     mutation_update_annotation,
     query_all_algorithms,
     query_all_color_maps,
-    query_colormap_by_codename,
     query_tiledmask_tiles,
 )
 
+if TYPE_CHECKING:
+    from histpat_toolkit.geom import Rectangle, Shape
+
 
 @dataclass
 class Marker(DiscussionMixin):
@@ -29,18 +35,21 @@ class Marker(DiscussionMixin):
     author: str | None
     number: int | None
 
-    def as_rectangle(self, image_width: float) -> Rectangle:
+    def as_rectangle(self, image_width: float) -> "Rectangle":
+        from histpat_toolkit.geom import Rectangle
+
         return Rectangle(self.x, self.y, self.width, self.height, self.rotation).scale(image_width)
 
     @staticmethod
     def from_graphql(data):
-        return Marker(
+        return construct(
+            Marker,
             x=data["x"],
             y=data["y"],
             rotation=data["rotation"],
             width=data["width"],
             height=data["height"],
-            author=data["author"]["name"] if data["author"] else None,
+            author=intern_name(data["author"]["name"]) if data["author"] else None,
             number=data["number"],
             **DiscussionMixin.parse_graphql(data),
         )
@@ -75,18 +84,19 @@ class Annotation(DiscussionMixin):
 
     @staticmethod
     def from_graphql(data):
-        return Annotation(
+        return construct(
+            Annotation,
             id=data["id"],
             shape_type=ShapeType(data["shapeType"]),
             shape_data=data["shapeData"],
-            author=data["author"]["name"] if data["author"] else None,
+            author=intern_name(data["author"]["name"]) if data["author"] else None,
             slide_id=data["slideId"],
             number=data["number"],
             label=data["label"],
             is_label_visible=data["isLabelVisible"],
             color=data["color"],
             point_type=data["pointType"],
-            created_at=data["createdAt"],
+            created_at=parse_datetime(data["createdAt"]),
             **DiscussionMixin.parse_graphql(data),
         )
 
@@ -95,20 +105,16 @@ class Annotation(DiscussionMixin):
         data = api.query_graphql(mutation_update_annotation, variables=variables)
         self.is_label_visible = data["annotation"]["isLabelVisible"]
 
-    def as_shape(self) -> Shape:
-        shape_type = self.shape_type
-        shape_data = self.shape_data
-        match shape_type:
-            case ShapeType.RECT:
-                return Rectangle(shape_data[0], shape_data[1], shape_data[2], shape_data[3])
-            case ShapeType.POLYGON | ShapeType.CLOSED_PATH | ShapeType.PATH:
-                return Polygon(points=[Point(x, y) for x, y in zip(shape_data[::2], shape_data[1::2])])
-            case ShapeType.CIRCLE:
-                return Circle(Point(shape_data[0], shape_data[1]), shape_data[2])
-            case ShapeType.ELLIPSE:
-                return Ellipse(Point(shape_data[0], shape_data[1]), (shape_data[2], shape_data[3]))
-            case _:
-                raise ValueError(f"Shape type: {shape_type} not supported")
+    def __getstate__(self) -> dict:
+        return dataclass_state(self)
+
+    @cached_property
+    def geometry(self) -> ShapeGeometry:
+        """Array-backed geometry with vectorized area, bounds, scaling and point-in-polygon tests"""
+        return ShapeGeometry(self.shape_type, self.shape_data)
+
+    def as_shape(self) -> "Shape":
+        return self.geometry.as_shape()
 
 
 @dataclass
@@ -118,7 +124,7 @@ class Rating:
 
     @staticmethod
     def from_graphql(data: dict[str, Any]) -> "Rating":
-        return Rating(score=data["score"], author=data["author"]["name"])
+        return construct(Rating, score=data["score"], author=intern_name(data["author"]["name"]))
 
 
 @dataclass
@@ -129,7 +135,9 @@ class PointCloudStatistic:
 
     @staticmethod
     def from_graphql(data: dict[str, Any]) -> "PointCloudStatistic":
-        return PointCloudStatistic(color=data["color"]["name"], key=data["color"]["value"], count=data["value"])
+        return construct(
+            PointCloudStatistic, color=data["color"]["name"], key=data["color"]["value"], count=data["value"]
+        )
 
 
 @dataclass
@@ -142,7 +150,9 @@ class PointCloudPoint:
 
     @staticmethod
     def from_graphql(data: dict[str, Any]) -> "PointCloudPoint":
-        return PointCloudPoint(x=data["x"], y=data["y"], color_key=data["v"], radius=data["r"], score=data["s"])
+        return construct(
+            PointCloudPoint, x=data["x"], y=data["y"], color_key=data["v"], radius=data["r"], score=data["s"]
+        )
 
 
 @dataclass
@@ -153,7 +163,8 @@ class PointCloud:
 
     @staticmethod
     def from_graphql(data: dict[str, Any]) -> "PointCloud":
-        return PointCloud(
+        return construct(
+            PointCloud,
             id=data["id"],
             statistics=[PointCloudStatistic.from_graphql(item) for item in data["statistics"]],
             points=[PointCloudPoint.from_graphql(item) for item in data["pointsList"]],
@@ -167,7 +178,8 @@ class Algorithm:
 
     @staticmethod
     def from_graphql(data: dict[str, Any]) -> "Algorithm":
-        return Algorithm(id=data["id"], name=data["name"])
+        key = (data["id"], data["name"])
+        return interned(Algorithm, key, lambda: construct(Algorithm, id=data["id"], name=data["name"]))
 
     @staticmethod
     def get_all_algorithms(api: API) -> list["Algorithm"]:
@@ -180,14 +192,16 @@ class RunAlgorithm:
     algorithm: Algorithm
     comments: list[Comment] | None = None
     ratings: list[Rating] | None = None
+    id: str | None = None
 
     @staticmethod
     def from_graphql(data: dict[str, Any]) -> "RunAlgorithm":
-        return RunAlgorithm(
+        return construct(
+            RunAlgorithm,
+            id=data["id"],
             algorithm=Algorithm.from_graphql(data["algorithm"]),
             comments=[Comment.from_graphql(edge["node"]) for edge in data["discussion"]["comments"]["edges"]],
             ratings=[Rating.from_graphql(item) for item in data["ratings"]],
-            **DiscussionMixin.parse_graphql(data),
         )
 
     @staticmethod
@@ -197,6 +211,23 @@ class RunAlgorithm:
         return RunAlgorithm.from_graphql(response["algorithmRun"])
 
 
+@lru_cache(maxsize=1024)
+def parse_hex_color(value: str) -> tuple[int, int, int, int]:
+    """RGBA tuple of a `#RRGGBB` or `#RRGGBBAA` color, alpha is 255 for RGB colors"""
+    hex_value = value.lstrip("#")
+    rgba = tuple(int(hex_value[i : i + 2], 16) for i in range(0, len(hex_value), 2))
+    return rgba + (255,) if len(rgba) == 3 else rgba
+
+
+def _pack_rgba(image: np.ndarray) -> np.ndarray:
+    """One uint32 per pixel of an (..., 3) RGB or (..., 4) RGBA uint8 image"""
+    image = np.asarray(image, dtype=np.uint8)
+    if image.shape[-1] == 3:
+        alpha = np.full(image.shape[:-1] + (1,), 255, dtype=np.uint8)
+        image = np.concatenate([image, alpha], axis=-1)
+    return np.ascontiguousarray(image).view(np.uint32)[..., 0]
+
+
 @dataclass
 class Color:
     name: str
@@ -204,14 +235,7 @@ class Color:
     value: str
 
     def as_rgba(self):
-        hex_value = self.value.lstrip("#")
-        # Handle both RGB (6 chars) and RGBA (8 chars) formats
-        if len(hex_value) == 6:
-            # RGB format - assume alpha = 255
-            return tuple(int(hex_value[i : i + 2], 16) for i in range(0, 6, 2)) + (255,)
-        else:
-            # RGBA format
-            return tuple(int(hex_value[i : i + 2], 16) for i in range(0, len(hex_value), 2))
+        return parse_hex_color(self.value)
 
 
 @dataclass
@@ -223,11 +247,19 @@ class ColorMap:
 
     @staticmethod
     def from_graphql(data):
-        return ColorMap(
-            id=data["id"],
-            name=data["name"],
-            codename=data["codename"],
-            colors=[Color(**color["node"]) for color in data["colors"]["edges"]],
+        colors = tuple(
+            (edge["node"]["name"], edge["node"]["key"], edge["node"]["value"]) for edge in data["colors"]["edges"]
+        )
+        return interned(
+            ColorMap,
+            (data["id"], data["name"], data["codename"], colors),
+            lambda: construct(
+                ColorMap,
+                id=data["id"],
+                name=data["name"],
+                codename=data["codename"],
+                colors=[construct(Color, name=name, key=key, value=value) for name, key, value in colors],
+            ),
         )
 
     @staticmethod
@@ -237,17 +269,117 @@ class ColorMap:
 
     @staticmethod
     def get_by_codename(api: API, codename: str) -> "ColorMap":
-        all_maps = ColorMap.get_all_color_maps(api)
-        for color_map in all_maps:
-            if color_map.codename == codename:
-                return color_map
-        raise ValueError(f"Color map with codename '{codename}' not found")
+        return ColorMapRegistry.of(api).by_codename(codename)
 
     @staticmethod
     def colormap_by_codename(api: API, codename: str):
-        data = api.query_graphql(query_colormap_by_codename, variables={"codename": codename})
-        assert len(data["edges"]) == 1, f"Expected one colormap with codename {codename}, got {len(data['edges'])}"
-        return ColorMap.from_graphql(data["edges"][0]["node"])
+        return ColorMapRegistry.of(api).by_codename(codename)
+
+    def __getstate__(self) -> dict:
+        return dataclass_state(self)
+
+    @cached_property
+    def colors_by_key(self) -> dict[int, Color]:
+        return {color.key: color for color in self.colors}
+
+    def color(self, key: int) -> Color:
+        return self.colors_by_key[key]
+
+    @cached_property
+    def palette(self) -> np.ndarray:
+        """(max key + 2, 4) uint8 array, `palette[key]` is the RGBA color of `key`
+
+        Keys without a color and the last row (used for keys out of range) are transparent.
+        """
+        size = max((color.key for color in self.colors), default=-1) + 2
+        palette = np.zeros((size, 4), dtype=np.uint8)
+        for color in self.colors:
+            palette[color.key] = color.as_rgba()
+        palette.flags.writeable = False
+        return palette
+
+    @cached_property
+    def reverse_lookup(self) -> tuple[np.ndarray, np.ndarray]:
+        """Sorted packed RGBA values (see `_pack_rgba`) of the colors and their keys"""
+        packed = _pack_rgba(np.array([color.as_rgba() for color in self.colors], dtype=np.uint8).reshape(-1, 4))
+        order = np.argsort(packed, kind="stable")
+        keys = np.array([color.key for color in self.colors], dtype=np.int32)[order]
+        return packed[order], keys
+
+    def keys_to_rgba(self, keys: np.ndarray) -> np.ndarray:
+        """Color a mask of keys, e.g. a mask of type KEYS, giving an (..., 4) RGBA image"""
+        keys = np.asarray(keys)
+        last = len(self.palette) - 1
+        return self.palette[np.where((keys >= 0) & (keys < last), keys, last)]
+
+    def rgba_to_keys(self, image: np.ndarray, missing: int = -1) -> np.ndarray:
+        """Keys of the pixels of an RGB or RGBA mask, `missing` for pixels of colors not in the map"""
+        packed = _pack_rgba(image)
+        colors, keys = self.reverse_lookup
+        if not len(colors):
+            return np.full(packed.shape, missing, dtype=np.int32)
+        index = np.minimum(np.searchsorted(colors, packed), len(colors) - 1)
+        return np.where(colors[index] == packed, keys[index], missing).astype(np.int32)
+
+
+class ColorMapRegistry:
+    """Color maps of the platform, loaded once per `API` and indexed by ID and codename
+
+    Example:
+        gleason = ColorMapRegistry.of(api).by_codename("gleason")
+        keys = gleason.rgba_to_keys(mask_image)
+    """
+
+    _registries: "weakref.WeakKeyDictionary[API, ColorMapRegistry]" = weakref.WeakKeyDictionary()
+    _registries_lock = threading.Lock()
+
+    def __init__(self, api: API):
+        # a weak reference, so that registries do not keep their APIs alive
+        self._api = weakref.ref(api)
+        self._lock = threading.Lock()
+        self._by_id: dict[str, ColorMap] | None = None
+        self._by_codename: dict[str, ColorMap] = {}
+
+    @classmethod
+    def of(cls, api: API) -> "ColorMapRegistry":
+        """Registry shared by all users of `api`"""
+        with cls._registries_lock:
+            registry = cls._registries.get(api)
+            if registry is None:
+                registry = cls._registries[api] = cls(api)
+            return registry
+
+    def refresh(self):
+        """Load all color maps again, e.g. after new ones are created"""
+        color_maps = ColorMap.get_all_color_maps(self._api())
+        with self._lock:
+            self._by_id = {color_map.id: color_map for color_map in color_maps}
+            self._by_codename = {color_map.codename: color_map for color_map in color_maps}
+
+    def _loaded(self) -> dict[str, ColorMap]:
+        if self._by_id is None:
+            self.refresh()
+        return self._by_id
+
+    def all(self) -> list[ColorMap]:
+        return list(self._loaded().values())
+
+    def by_id(self, id: str) -> ColorMap:
+        color_map = self._loaded().get(id)
+        if color_map is None:
+            raise ValueError(f"Color map with id '{id}' not found")
+        return color_map
+
+    def by_codename(self, codename: str) -> ColorMap:
+        self._loaded()
+        color_map = self._by_codename.get(codename)
+        if color_map is None:
+            raise ValueError(f"Color map with codename '{codename}' not found")
+        return color_map
+
+    def resolve(self, color_map: "ColorMap | str") -> ColorMap:
+        """Color map given as an object or a codename"""
+        return color_map if isinstance(color_map, ColorMap) else self.by_codename(color_map)
 
 
 @dataclass
@@ -260,11 +392,14 @@ class TiledMask:
 
     @staticmethod
     def from_graphql(data):
-        return TiledMask(
+        return construct(
+            TiledMask,
             id=data["id"],
-            author=data["author"]["name"] if data["author"] else None,
+            author=intern_name(data["author"]["name"]) if data["author"] else None,
             algorithm=(
-                RunAlgorithm(
+                construct(
+                    RunAlgorithm,
+                    id=data["algorithmRun"]["id"],
                     algorithm=Algorithm.from_graphql(data["algorithmRun"]["algorithm"]),
                     comments=[
                         Comment.from_graphql(edge["node"])
@@ -276,7 +411,7 @@ class TiledMask:
                 else None
             ),
             color_map=ColorMap.from_graphql(data["colorMap"]) if data["colorMap"] else None,
-            updated_at=data["updatedAt"],
+            updated_at=parse_datetime(data["updatedAt"]),
         )
 
     def get_pyramid_info(self, api: API):
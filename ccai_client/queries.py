@@ -64,6 +64,7 @@ fragment FileBasic on FileInterface {
     name
     __typename
     createdAt
+    updatedAt
     tags {
         id
         value
@@ -308,6 +309,114 @@ query GetPathologySlideAnnotations($id: ID!) {
 }
 """ + annotations_fragment
 
+query_pathologyslide_annotations_export = """
+query GetPathologySlideAnnotationsExport($id: ID!) {
+    file(id: $id) {
+        ... on PathologySlideNode {
+            annotations {
+                edges {
+                    node {
+                        id
+                        number
+                        author {
+                            name
+                        }
+                        shapeType
+                        shapeData
+                        color
+                        label
+                        slideId
+                        pointType
+                        createdAt
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+query_pathologyslide_total_counts = """
+query GetPathologySlideTotalCounts($id: ID!) {
+    file(id: $id) {
+        ... on PathologySlideNode {
+            annotations {
+                totalCount
+            }
+            tiledMasks {
+                totalCount
+            }
+        }
+    }
+}
+"""
+
+query_pathologyslide_counts = """
+query GetPathologySlideCounts($id: ID!) {
+    file(id: $id) {
+        ... on PathologySlideNode {
+            annotations {
+                edges {
+                    node {
+                        id
+                    }
+                }
+            }
+            tiledMasks {
+                edges {
+                    node {
+                        id
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+query_pathologyslide_algorithm_outputs = """
+query GetPathologySlideAlgorithmOutputs($id: ID!) {
+    file(id: $id) {
+        ... on PathologySlideNode {
+            tiledMasks {
+                edges {
+                    node {
+                        id
+                        algorithmRun {
+                            id
+                        }
+                    }
+                }
+            }
+            pointClouds {
+                edges {
+                    node {
+                        id
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+query_pathologyslide_point_clouds = """
+query GetPathologySlidePointClouds($id: ID!) {
+    file(id: $id) {
+        ... on PathologySlideNode {
+            pointClouds {
+                edges {
+                    node {
+                        id
+                        pointsList
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
 query_tiledmask_tiles = """
 query GetTiledMaskTiles($id: ID!) {
     tiledMask(id: $id) {
@@ -352,6 +461,19 @@ mutation ImportAnnotationsFromGeojson($id: ID!, $geojson: String!) {
 }
 """ + annotations_fragment
 
+mutation_import_annotations_from_geojson_ids = """
+mutation ImportAnnotationsFromGeojsonIds($id: ID!, $geojson: String!) {
+    importAnnotationsFromGeojson(input: {
+        id: $id,
+        geojson: $geojson
+    }) {
+        annotations {
+            id
+        }
+    }
+}
+"""
+
 mutation_update_annotation = """
 mutation AnnotationUpdateMutation(
     $id: ID!,
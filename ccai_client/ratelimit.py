@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket rate limiter combined with a cap on requests in flight
+
+    One limiter can be shared by many threads (`with limiter:`) and asyncio tasks
+    (`async with limiter:`). With `adaptive` enabled the rate is halved whenever the server
+    answers 429 and then grows back by `increase` requests per second after every successful
+    request, up to `rate` (additive increase, multiplicative decrease), so large parallel jobs
+    settle at the maximum sustainable rate. Once the rate is back at `rate`, or no request was
+    throttled for `recovery` seconds, the configured rate and burst (or no limit) are restored.
+
+    Args:
+        rate: Requests per second, None for no limit until the server starts throttling
+        burst: Number of requests which can be sent at once after a period of inactivity
+        max_in_flight: Maximum number of requests sent at the same time, None for no limit
+        adaptive: Adjust the rate to 429 responses
+        throttled_rate: Rate used after the first 429 response when `rate` is None
+        min_rate: Rate never goes below this value
+        increase: Requests per second added to the rate after every successful request
+        recovery: Seconds without 429 responses after which the configured rate is restored
+    """
+
+    def __init__(
+        self,
+        rate: float | None = None,
+        burst: int | None = None,
+        max_in_flight: int | None = None,
+        adaptive: bool = True,
+        throttled_rate: float = 10.0,
+        min_rate: float = 0.5,
+        increase: float = 0.1,
+        recovery: float = 60.0,
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.max_burst = burst
+        self.burst = burst or max(1, int(rate or 1))
+        self.max_in_flight = max_in_flight
+        self.adaptive = adaptive
+        self.throttled_rate = throttled_rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.recovery = recovery
+        # time of the last 429 response, None when the configured rate is in effect
+        self._throttled_at: float | None = None
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"], state["_semaphore"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(self.max_in_flight) if self.max_in_flight else None
+
+    def _take_token(self) -> float:
+        """Take a token if available and return 0, otherwise return seconds to wait for one"""
+        with self._lock:
+            if self.rate is None:
+                return 0.0
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        if self._semaphore:
+            self._semaphore.acquire()
+        while (wait := self._take_token()) > 0:
+            time.sleep(wait)
+
+    def release(self):
+        if self._semaphore:
+            self._semaphore.release()
+
+    async def acquire_async(self):
+        if self._semaphore:
+            while not self._semaphore.acquire(blocking=False):
+                await asyncio.sleep(0.01)
+        while (wait := self._take_token()) > 0:
+            await asyncio.sleep(wait)
+
+    def __enter__(self) -> "RateLimiter":
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    async def __aenter__(self) -> "RateLimiter":
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *args):
+        self.release()
+
+    def on_throttled(self):
+        """Slow down after the server answered 429"""
+        if not self.adaptive:
+            return
+        with self._lock:
+            self._throttled_at = time.monotonic()
+            if self.rate is None:
+                self.rate = self.throttled_rate
+                self.burst = self.max_burst or max(1, int(self.throttled_rate))
+                self._tokens = 0.0
+                self._updated = self._throttled_at
+            else:
+                self.rate = max(self.min_rate, self.rate / 2)
+
+    def on_success(self):
+        if not self.adaptive or self._throttled_at is None:
+            return
+        with self._lock:
+            if self._throttled_at is None:
+                return
+            self.rate += self.increase
+            recovered = self.max_rate is not None and self.rate >= self.max_rate
+            if recovered or time.monotonic() - self._throttled_at >= self.recovery:
+                # back to the configured rate and burst, or to no limit
+                self.rate = self.max_rate
+                self.burst = self.max_burst or max(1, int(self.max_rate or 1))
+                self._tokens = min(self._tokens, self.burst)
+                self._throttled_at = None
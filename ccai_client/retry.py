@@ -0,0 +1,63 @@
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+import requests
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+@dataclass
+class RetryPolicy:
+    """Timeouts and retries applied to every HTTP request sent by `API`
+
+    Failed requests are retried with exponential backoff and full jitter, honouring the
+    `Retry-After` header. Non-idempotent requests (GraphQL mutations, POST uploads) are
+    retried only when nothing was processed by the server - on connect timeouts and 429
+    responses - unless `retry_mutations` is set or retrying is requested for a single call.
+    """
+
+    connect_timeout: float = 10.0
+    read_timeout: float = 120.0
+    max_retries: int = 5
+    backoff_factor: float = 0.5
+    max_backoff: float = 60.0
+    retry_statuses: tuple[int, ...] = (429, 500, 502, 503, 504)
+    retry_mutations: bool = False
+
+    @property
+    def timeout(self) -> tuple[float, float]:
+        return self.connect_timeout, self.read_timeout
+
+    def should_retry(
+        self,
+        attempt: int,
+        idempotent: bool,
+        response: requests.Response | None = None,
+        error: Exception | None = None,
+    ) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if error is not None:
+            # after a connect timeout the request surely did not reach the server
+            if isinstance(error, requests.ConnectTimeout):
+                return True
+            return idempotent and isinstance(error, (requests.ConnectionError, requests.Timeout))
+        if response.status_code not in self.retry_statuses:
+            return False
+        return idempotent or response.status_code == 429
+
+    def backoff(self, attempt: int, response: requests.Response | None = None) -> float:
+        """Seconds to wait before the next attempt"""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    return min(max(delay, 0.0), self.max_backoff)
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2**attempt))
@@ -0,0 +1,66 @@
+import json
+from typing import IO, Any, Iterator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def loads(data: bytes | str) -> Any:
+    """Decode JSON, using orjson when it is installed (`pip install ccai-client[fast-json]`)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _walk(value: Any, path: str, prefixes: frozenset[str]) -> Iterator[tuple[str, Any]]:
+    if path in prefixes:
+        yield path, value
+        return
+    if isinstance(value, dict):
+        for key, item in value.items():
+            item_path = f"{path}.{key}" if path else key
+            if any(prefix == item_path or prefix.startswith(item_path + ".") for prefix in prefixes):
+                yield from _walk(item, item_path, prefixes)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _walk(item, f"{path}.item", prefixes)
+
+
+def iter_json_items(stream: IO[bytes], prefixes: tuple[str, ...]) -> Iterator[tuple[str, Any]]:
+    """Yield (prefix, value) of every value at one of the paths, in the order of the document
+
+    Paths use ijson notation: keys separated by dots and `item` for elements of arrays, e.g.
+    `data.file.annotations.edges.item.node`. With ijson installed (`pip install ccai-client[streaming]`)
+    the stream is parsed incrementally and only one value is kept in memory at a time, otherwise
+    the whole document is decoded first.
+    """
+    targets = frozenset(prefixes)
+    if ijson is None:
+        yield from _walk(loads(stream.read()), "", targets)
+        return
+
+    builder = None
+    building = None
+    add_event = None
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            add_event(event, value)
+            # containers nested in the value have longer prefixes, so this ends the value itself
+            if prefix == building and (event == "end_map" or event == "end_array"):
+                yield building, builder.value
+                builder = None
+        elif prefix in targets:
+            if event == "start_map" or event == "start_array":
+                builder = ijson.ObjectBuilder()
+                add_event = builder.event
+                add_event(event, value)
+                building = prefix
+            elif event not in ("map_key", "end_map", "end_array"):
+                yield prefix, value
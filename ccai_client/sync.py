@@ -0,0 +1,283 @@
+import json
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterator
+
+from .crawler import crawl
+from .file_classes import DicomStudyFile, File, PathologySlideNode, SimpleFileNode
+from .patho import TiledMask
+
+STATE_FILE = ".ccai_sync.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    updated_at TEXT,
+    size INTEGER,
+    synced_at TEXT NOT NULL
+)
+"""
+
+
+@dataclass
+class SyncResult:
+    """Outcome of a folder sync, paths are relative to the local directory"""
+
+    transferred: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+    # local copies of files no longer present remotely, deleted only with `remove=True`
+    stale: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    # slides still being processed, their local copies (if any) are kept as they are
+    skipped: list[str] = field(default_factory=list)
+    failed: list[tuple[str, Exception]] = field(default_factory=list)
+
+
+@dataclass
+class _Entry:
+    path: str
+    id: str
+    kind: str
+    updated_at: datetime | None
+    # None for entries which cannot be transferred yet
+    transfer: Callable[[Path], None] | None
+
+
+class SyncState:
+    """Local SQLite database of synced entries, stored in the synced directory"""
+
+    def __init__(self, path: str | Path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(_SCHEMA)
+
+    def get(self, path: str) -> tuple[str | None, int | None] | None:
+        row = self.connection.execute("SELECT updated_at, size FROM entries WHERE path = ?", (path,)).fetchone()
+        return tuple(row) if row else None
+
+    def paths(self) -> set[str]:
+        return {row[0] for row in self.connection.execute("SELECT path FROM entries")}
+
+    def save(self, entry: _Entry, size: int):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                entry.path,
+                entry.id,
+                entry.kind,
+                entry.updated_at.isoformat() if entry.updated_at else None,
+                size,
+                datetime.now(timezone.utc).isoformat(),
+            ),
+        )
+        self.connection.commit()
+
+    def delete(self, path: str):
+        self.connection.execute("DELETE FROM entries WHERE path = ?", (path,))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def _local_size(path: Path) -> int | None:
+    if path.is_file():
+        return path.stat().st_size
+    if path.is_dir():
+        return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+    return None
+
+
+def _replace(source: Path, target: Path):
+    if target.is_dir():
+        shutil.rmtree(target)
+    os.replace(source, target)
+
+
+def _download_file(file: SimpleFileNode) -> Callable[[Path], None]:
+    def transfer(target: Path):
+        partial = target.with_name(target.name + ".part")
+        file.download(partial)
+        _replace(partial, target)
+
+    return transfer
+
+
+def _download_slide(slide: PathologySlideNode) -> Callable[[Path], None]:
+    def transfer(target: Path):
+        partial = target.with_name(target.name + ".part")
+        shutil.rmtree(partial, ignore_errors=True)
+        partial.mkdir(parents=True)
+        slide.download_original(str(partial), verbose=False)
+        _replace(partial, target)
+
+    return transfer
+
+
+def _download_study(study: DicomStudyFile) -> Callable[[Path], None]:
+    def transfer(target: Path):
+        # download_instances skips instances already on disk, so a changed study only fetches what is missing
+        staging = target.parent / study.study_instance_uid
+        if target.exists() and not staging.exists():
+            os.replace(target, staging)
+        study.download_instances(target.parent, max_workers=4)
+        _replace(staging, target)
+
+    return transfer
+
+
+def _save_mask(slide: PathologySlideNode, mask: TiledMask) -> Callable[[Path], None]:
+    def transfer(target: Path):
+        info = asdict(mask.get_pyramid_info(slide.api))
+        # the tiles URL is signed and expires, it is fetched again when the mask is exported
+        info.pop("tiles_url", None)
+        data = {
+            "id": mask.id,
+            "slide_id": slide.id,
+            "author": mask.author,
+            "color_map": mask.color_map.codename if mask.color_map else None,
+            "updated_at": mask.updated_at.isoformat(),
+            **info,
+        }
+        partial = target.with_name(target.name + ".part")
+        partial.write_text(json.dumps(data))
+        _replace(partial, target)
+
+    return transfer
+
+
+def _mask_entries(mask_lists: dict, done) -> Iterator[_Entry]:
+    for future in done:
+        path, slide = mask_lists.pop(future)
+        for mask in future.result():
+            yield _Entry(f"{path}.masks/{mask.id}.json", mask.id, "mask", mask.updated_at, _save_mask(slide, mask))
+
+
+def _walk(folder: File, masks: bool, max_workers: int) -> Iterator[_Entry]:
+    # masks are listed in the background, one query per slide would hold up the walk and the transfers
+    listing = ThreadPoolExecutor(max_workers=max_workers)
+    mask_lists = {}
+    try:
+        # files and folders linked in several folders are mirrored to every path they are reached by
+        for file_path, child in crawl(folder, max_workers=max_workers, unique=False):
+            path = str(file_path)
+            if isinstance(child, SimpleFileNode):
+                yield _Entry(path, child.id, "file", child.updated_at, _download_file(child))
+            elif isinstance(child, PathologySlideNode):
+                transfer = _download_slide(child) if child.is_ready else None
+                yield _Entry(path, child.id, "slide", child.updated_at, transfer)
+                if masks:
+                    mask_lists[listing.submit(child.list_tiled_masks)] = (path, child)
+            elif isinstance(child, DicomStudyFile):
+                yield _Entry(path, child.id, "dicom", child.updated_at, _download_study(child))
+            yield from _mask_entries(mask_lists, [future for future in mask_lists if future.done()])
+        yield from _mask_entries(mask_lists, wait(mask_lists).done)
+    finally:
+        listing.shutdown(wait=False, cancel_futures=True)
+
+
+def sync_folder(
+    folder: File,
+    path: str | Path,
+    remove: bool = False,
+    masks: bool = True,
+    max_workers: int = 8,
+    verbose: bool = False,
+) -> SyncResult:
+    """Mirror a remote folder subtree to a local directory, transferring only new or changed files
+
+    Subfolders become directories. Simple files are saved under their name, slides as a directory with
+    the original slide file(s) and DICOM studies as a directory of instances. Slides which are still
+    being processed are skipped, keeping their local copies. Tiled masks are synced as metadata only:
+    a JSON file per mask in `<slide name>.masks/` with its author, color map, scale and tile list.
+    Their pixels are not downloaded, use `ccai_client.mask_export` to export them.
+
+    The state of every entry is kept in `<path>/.ccai_sync.sqlite`; an entry is transferred again
+    when its remote `updated_at` changed or the local copy is missing or has a different size than
+    after the last sync.
+
+    Args:
+        folder: Remote folder to mirror
+        path: Local directory
+        remove: If True, delete local copies of files which were removed remotely
+        masks: If True, sync tiled masks of slides
+        max_workers: Number of transfers (and of folders and slide masks listed) running at the same time
+        verbose: If True, print progress messages
+
+    Returns:
+        SyncResult: Transferred, unchanged, stale, removed, skipped and failed paths
+    """
+    root = Path(path)
+    root.mkdir(parents=True, exist_ok=True)
+    state = SyncState(root / STATE_FILE)
+    result = SyncResult()
+    seen = set()
+
+    def collect(done):
+        for future in done:
+            entry = pending.pop(future)
+            try:
+                future.result()
+                state.save(entry, _local_size(root / entry.path))
+                result.transferred.append(entry.path)
+                if verbose:
+                    print(f"Synced {entry.path}")
+            except Exception as e:
+                result.failed.append((entry.path, e))
+                if verbose:
+                    print(f"Failed to sync {entry.path}: {e}")
+
+    pending = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # transfers start while the rest of the tree is still being listed
+            for entry in _walk(folder, masks, max_workers):
+                seen.add(entry.path)
+                if entry.transfer is None:
+                    result.skipped.append(entry.path)
+                    continue
+                saved = state.get(entry.path)
+                if saved is not None and entry.updated_at is not None:
+                    saved_updated_at, saved_size = saved
+                    if saved_updated_at == entry.updated_at.isoformat() and saved_size == _local_size(
+                        root / entry.path
+                    ):
+                        result.unchanged.append(entry.path)
+                        continue
+                elif saved is not None and (root / entry.path).exists():
+                    # without updated_at only missing files can be detected
+                    result.unchanged.append(entry.path)
+                    continue
+
+                target = root / entry.path
+                target.parent.mkdir(parents=True, exist_ok=True)
+                pending[executor.submit(entry.transfer, target)] = entry
+                collect([future for future in pending if future.done()])
+            collect(wait(pending).done)
+
+        for stale_path in sorted(state.paths() - seen):
+            result.stale.append(stale_path)
+            if remove:
+                target = root / stale_path
+                if target.is_dir():
+                    shutil.rmtree(target)
+                elif target.exists():
+                    target.unlink()
+                # drop directories left empty, e.g. `.masks` of a removed slide
+                parent = target.parent
+                while parent != root and parent.is_dir() and not any(parent.iterdir()):
+                    parent.rmdir()
+                    parent = parent.parent
+                state.delete(stale_path)
+                result.removed.append(stale_path)
+                if verbose:
+                    print(f"Removed {stale_path}")
+    finally:
+        state.close()
+    return result
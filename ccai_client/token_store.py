@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def locked(path: Path):
+    """Hold an exclusive inter-process lock on the token file (a `.lock` file next to it)"""
+    lock_path = path.with_name(path.name + ".lock")
+    with open(lock_path, "a+") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+
+def load_token(path: Path, key: str) -> dict[str, str] | None:
+    """Read saved authentication headers; the file is replaced atomically, so no lock is needed"""
+    return _read(path).get(key)
+
+
+def save_token(path: Path, key: str, auth_headers: dict[str, str]):
+    """Save authentication headers, keeping tokens of other APIs/organizations stored in the same file
+
+    Must be called while holding `locked(path)`.
+    """
+    data = _read(path)
+    data[key] = auth_headers
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,120 @@
+import io
+import random
+import time
+
+import pytest
+import requests
+
+from ccai_client import API
+from ccai_client.file_classes import parse_graphql_file
+
+
+def file_node(typename: str, id: str, name: str, updated_at: str = "2024-01-01T00:00:00+00:00", **fields) -> dict:
+    return {
+        "__typename": typename,
+        "id": id,
+        "name": name,
+        "createdAt": "2024-01-01T00:00:00+00:00",
+        "updatedAt": updated_at,
+        "tags": [],
+        "discussion": {"id": f"discussion-{id}", "comments": {"edges": []}},
+        **fields,
+    }
+
+
+def slide_node(name: str, updated_at: str = "2024-01-01T00:00:00+00:00") -> dict:
+    return file_node(
+        "PathologySlideNode",
+        "slide",
+        name,
+        updated_at,
+        dziUrl="http://files.invalid/slide.dzi",
+        slideProperties=None,
+        isReady=True,
+        processingTask=None,
+        thumbnailUrl=None,
+    )
+
+
+class FakeResponse:
+    def __init__(self, content: bytes, status_code: int = 200, headers: dict[str, str] | None = None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {"Content-Length": str(len(content)), **(headers or {})}
+        # the connection, read by the API to count received bytes
+        self.raw = io.BytesIO(content)
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size: int = 1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start : start + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FakeTree:
+    """Folder tree served by an `API` without a server
+
+    Folders are listed with a random delay, so listings complete in a different order every time.
+    """
+
+    def __init__(self, max_delay: float = 0.005):
+        self.api = API(api_url="http://ccai.invalid", auth_headers={})
+        self.api.query_graphql = self.query_graphql
+        self.api.request = self.request
+        self.max_delay = max_delay
+        self.folders: dict[str, list[dict]] = {}
+        self.nodes: dict[str, dict] = {}
+        self.contents: dict[str, bytes] = {}
+        self.listed: list[str] = []
+        self.downloads: list[str] = []
+
+    def folder(self, id: str, name: str | None = None) -> dict:
+        self.folders.setdefault(id, [])
+        return self.nodes.setdefault(id, file_node("FolderNode", id, name or id))
+
+    def file(self, id: str, name: str, content: bytes, updated_at: str = "2024-01-01T00:00:00+00:00") -> dict:
+        url = f"http://files.invalid/{id}"
+        self.contents[url] = content
+        node = file_node("SimpleFileNode", id, name, updated_at, fileName=name, accessUrl=url)
+        self.nodes[id] = node
+        return node
+
+    def link(self, parent: str, *children: str):
+        self.folders[parent].extend(self.nodes[child] for child in children)
+
+    def root(self, id: str):
+        return parse_graphql_file(self.nodes[id], self.api)
+
+    def query_graphql(self, query: str, variables: dict | None = None, retry: bool | None = None):
+        assert "FileChildren" in query, query
+        time.sleep(random.uniform(0, self.max_delay))
+        self.listed.append(variables["id"])
+        return {"children": {"edges": [{"node": node} for node in self.folders[variables["id"]]]}}
+
+    def request(self, method: str, url: str, **kwargs) -> FakeResponse:
+        self.downloads.append(url)
+        return FakeResponse(self.contents[url])
+
+
+@pytest.fixture
+def tree() -> FakeTree:
+    return FakeTree()
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from ccai_client import API
+from ccai_client import api as api_module
+from ccai_client.auth import AuthenticationError
+from ccai_client.token_store import load_token, locked, save_token
+
+from .conftest import FakeResponse
+
+API_URL = "http://ccai.invalid"
+KEY = f"{API_URL}:org"
+ENTITY = {"data": {"entity": {"name": "Jan", "organization": {"name": "Org"}}}}
+
+
+class Server:
+    """GraphQL endpoint accepting one token, answering 401 (or a GraphQL error) to any other"""
+
+    def __init__(self, token: str, rejected_status: int = 401):
+        self.token = token
+        self.rejected_status = rejected_status
+        self.tokens: list[str] = []
+        self.lock = threading.Lock()
+
+    def request(self, method: str, url: str, headers: dict | None = None, **kwargs) -> FakeResponse:
+        with self.lock:
+            self.tokens.append(headers["Authorization"])
+        time.sleep(0.01)
+        if headers["Authorization"] == self.token:
+            return FakeResponse(json.dumps(ENTITY).encode())
+        if self.rejected_status == 401:
+            return FakeResponse(b"Unauthorized", 401)
+        return FakeResponse(json.dumps({"errors": [{"message": "Invalid token"}], "data": None}).encode())
+
+
+class Login:
+    def __init__(self, token: str):
+        self.token = token
+        self.calls = 0
+
+    def __call__(self, api_url: str, organization: str | None, timeout=None) -> dict[str, str]:
+        self.calls += 1
+        # logging in takes a while, other threads find the token rejected meanwhile
+        time.sleep(0.05)
+        return {"Authorization": self.token}
+
+
+@pytest.fixture
+def token_path(tmp_path):
+    path = tmp_path / "tokens.json"
+    with locked(path):
+        save_token(path, KEY, {"Authorization": "old"})
+        save_token(path, "other", {"Authorization": "other"})
+    return path
+
+
+def connect(monkeypatch, token_path, server: Server, login: Login, **kwargs) -> API:
+    monkeypatch.setattr(api_module, "authenticate", login)
+    monkeypatch.setattr(API, "session", server)
+    return API(organization="org", api_url=API_URL, save_token_to=token_path, **kwargs)
+
+
+def test_save_token_replaces_the_file_atomically(token_path, monkeypatch):
+    def fail(source, target):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError), locked(token_path):
+        save_token(token_path, KEY, {"Authorization": "new"})
+
+    # the file is intact and the temporary file is removed
+    assert load_token(token_path, KEY) == {"Authorization": "old"}
+    assert sorted(path.name for path in token_path.parent.iterdir()) == ["tokens.json", "tokens.json.lock"]
+
+
+def test_save_token_keeps_other_tokens(token_path):
+    with locked(token_path):
+        save_token(token_path, KEY, {"Authorization": "new"})
+    assert json.loads(token_path.read_text()) == {KEY: {"Authorization": "new"}, "other": {"Authorization": "other"}}
+
+
+def test_locked_is_exclusive(token_path):
+    events = []
+    holding = threading.Event()
+
+    def hold():
+        with locked(token_path):
+            holding.set()
+            time.sleep(0.1)
+            events.append("released")
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    holding.wait()
+    with locked(token_path):
+        events.append("acquired")
+    thread.join()
+    assert events == ["released", "acquired"]
+
+
+def test_saved_token_is_trusted_without_a_query(token_path, monkeypatch):
+    server = Server("old")
+    login = Login("new")
+    api = connect(monkeypatch, token_path, server, login)
+    assert api.auth_headers == {"Authorization": "old"}
+    assert server.tokens == [] and login.calls == 0
+
+
+def test_rejected_token_is_refreshed_once(token_path, monkeypatch):
+    server = Server("new")
+    login = Login("new")
+    api = connect(monkeypatch, token_path, server, login)
+
+    threads = [
+        threading.Thread(target=api.query_graphql, args=("query GetEntity { entity { name } }",)) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert login.calls == 1
+    assert server.tokens.count("new") == 8
+    assert load_token(token_path, KEY) == {"Authorization": "new"}
+    assert load_token(token_path, "other") == {"Authorization": "other"}
+
+
+def test_token_saved_by_another_process_is_used(token_path, monkeypatch):
+    server = Server("fresh")
+    login = Login("new")
+    api = connect(monkeypatch, token_path, server, login)
+    with locked(token_path):
+        save_token(token_path, KEY, {"Authorization": "fresh"})
+
+    api.query_graphql("query GetEntity { entity { name } }")
+    assert login.calls == 0
+    assert api.auth_headers == {"Authorization": "fresh"}
+
+
+@pytest.mark.parametrize("rejected_status", [401, 200])
+def test_verify_token_logs_in_again(token_path, monkeypatch, rejected_status):
+    server = Server("new", rejected_status)
+    login = Login("new")
+    api = connect(monkeypatch, token_path, server, login, verify_token=True)
+    assert login.calls == 1
+    assert api.auth_headers == {"Authorization": "new"}
+    assert load_token(token_path, KEY) == {"Authorization": "new"}
+
+
+@pytest.mark.parametrize("rejected_status", [401, 200])
+def test_verify_token_without_interactive_login_raises(token_path, monkeypatch, rejected_status):
+    server = Server("new", rejected_status)
+    with pytest.raises(AuthenticationError):
+        connect(monkeypatch, token_path, server, Login("new"), verify_token=True, interactive_login=False)
+
+
+def test_rejected_token_without_interactive_login_raises(token_path, monkeypatch):
+    api = connect(monkeypatch, token_path, Server("new"), Login("new"), interactive_login=False)
+    with pytest.raises(AuthenticationError):
+        api.query_graphql("query GetEntity { entity { name } }")
@@ -0,0 +1,94 @@
+import re
+import threading
+
+import pytest
+
+from ccai_client.batch import BATCH_SIZES, BatchMutation, _split, batch_documents, batch_rename_file, run_batch
+
+
+@pytest.mark.parametrize("chunk_size", BATCH_SIZES)
+@pytest.mark.parametrize("count", [0, 1, 2, 3, 7, 63, 64, 65, 100, 1000])
+def test_split(count, chunk_size):
+    sizes = _split(count, chunk_size)
+    assert sum(sizes) == count
+    assert all(size in BATCH_SIZES and size <= chunk_size for size in sizes)
+    # full chunks first, the remainder in as few requests as possible
+    assert sizes == sorted(sizes, reverse=True)
+    assert len(sizes) == count // chunk_size + bin(count % chunk_size).count("1")
+
+
+def test_split_examples():
+    assert _split(100, 64) == [64, 32, 4]
+    assert _split(100, 16) == [16] * 6 + [4]
+    assert _split(0, 64) == []
+
+
+def test_document():
+    mutation = BatchMutation("RenameFile", "fileUpdate", (("id", "ID!"), ("name", "String!")), "file { id }")
+    assert mutation.document(2) == (
+        "mutation BatchRenameFile2($id_0: ID!, $name_0: String!, $id_1: ID!, $name_1: String!) {\n"
+        "    item_0: fileUpdate(input: {id: $id_0, name: $name_0}) { file { id } }\n"
+        "    item_1: fileUpdate(input: {id: $id_1, name: $name_1}) { file { id } }\n"
+        "}\n"
+    )
+    # documents are built once per size
+    assert mutation.document(2) is mutation.document(2)
+
+
+def test_batch_documents_are_named_after_their_size():
+    documents = batch_documents()
+    for name, document in documents.items():
+        size = int(re.search(r"\d+$", name).group())
+        assert document.startswith(f"mutation {name}(")
+        assert document.count("item_") == size
+    assert f"BatchRenameFile{BATCH_SIZES[0]}" in documents
+
+
+class FakeAPI:
+    """Answers batch documents, failing the items whose name is "bad" and whole requests with a "boom" item"""
+
+    def __init__(self):
+        self.sizes = []
+        self.lock = threading.Lock()
+
+    def execute_graphql(self, document: str, variables: dict) -> dict:
+        size = len(re.findall(r"item_\d+:", document))
+        with self.lock:
+            self.sizes.append(size)
+        names = [variables[f"name_{i}"] for i in range(size)]
+        if "boom" in names:
+            raise ConnectionError("connection reset")
+        data = {}
+        errors = []
+        for i, name in enumerate(names):
+            if name == "bad":
+                data[f"item_{i}"] = None
+                errors.append({"message": f"Invalid name {i}", "path": [f"item_{i}", "file"]})
+            else:
+                data[f"item_{i}"] = {"file": {"id": variables[f"id_{i}"]}}
+        return {"data": data, "errors": errors}
+
+
+def test_run_batch_reports_every_item_in_order():
+    api = FakeAPI()
+    items = [{"id": str(i), "name": "bad" if i % 10 == 3 else f"file {i}"} for i in range(100)]
+    report = run_batch(api, batch_rename_file, items, chunk_size=32, max_workers=3)
+
+    assert sorted(api.sizes) == [4, 32, 32, 32]
+    assert [result.item for result in report.results] == items
+    assert [result.item["id"] for result in report.failed] == [str(i) for i in range(3, 100, 10)]
+    assert all(result.data == {"file": {"id": result.item["id"]}} for result in report.succeeded)
+    assert report.failed[0].error == "Invalid name 3"
+
+
+def test_run_batch_request_failure_fails_its_chunk_only():
+    items = [{"id": str(i), "name": "boom" if i == 5 else "ok"} for i in range(16)]
+    report = run_batch(FakeAPI(), batch_rename_file, items, chunk_size=8)
+    assert [result.item["id"] for result in report.failed] == [str(i) for i in range(8)]
+    assert {result.error for result in report.failed} == {"connection reset"}
+    assert len(report.succeeded) == 8
+
+
+def test_run_batch_rejects_other_chunk_sizes():
+    with pytest.raises(ValueError):
+        run_batch(FakeAPI(), batch_rename_file, [], chunk_size=10)
@@ -0,0 +1,70 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ccai_client.catalog import Catalog
+
+VALIDATION_ERRORS = [
+    # rejected before execution: no data and no path
+    {"errors": [{"message": "Cannot query field 'totalCount' on type 'AnnotationConnection'.", "locations": []}]},
+    {"errors": [{"message": "Unknown field.", "extensions": {"code": "GRAPHQL_VALIDATION_FAILED"}}], "data": None},
+]
+
+
+class CountsAPI:
+    """Counts annotations and masks of slides, optionally without totalCount in the schema"""
+
+    def __init__(self, validation_error: dict | None = None):
+        self.validation_error = validation_error
+        self.operations: list[str] = []
+        self.lock = threading.Lock()
+
+    def execute_graphql(self, query: str, variables: dict | None = None, retry: bool | None = None) -> dict:
+        with self.lock:
+            self.operations.append("totalCount")
+        time.sleep(0.01)
+        if self.validation_error is not None:
+            return self.validation_error
+        if variables["id"] == "missing":
+            return {"errors": [{"message": "File not found", "path": ["file"]}], "data": {"file": None}}
+        count = int(variables["id"])
+        return {"data": {"file": {"annotations": {"totalCount": count}, "tiledMasks": {"totalCount": 1}}}}
+
+    def query_graphql(self, query: str, variables: dict | None = None, retry: bool | None = None):
+        assert "GetPathologySlideCounts" in query
+        with self.lock:
+            self.operations.append("edges")
+        edges = [{"node": {"id": str(i)}} for i in range(int(variables["id"]))]
+        return {"annotations": {"edges": edges}, "tiledMasks": {"edges": [{"node": {"id": "mask"}}]}}
+
+
+def count(api: CountsAPI, tmp_path, ids: list[str]) -> list[tuple[int, int]]:
+    catalog = Catalog(tmp_path / "catalog.sqlite", api)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        return list(executor.map(catalog._fetch_counts, ids))
+
+
+def test_counts_with_total_count(tmp_path):
+    api = CountsAPI()
+    assert count(api, tmp_path, ["3", "0", "5", "2"]) == [(3, 1), (0, 1), (5, 1), (2, 1)]
+    assert api.operations == ["totalCount"] * 4
+
+
+@pytest.mark.parametrize("validation_error", VALIDATION_ERRORS)
+def test_counts_without_total_count_are_probed_once(tmp_path, validation_error):
+    api = CountsAPI(validation_error)
+    assert count(api, tmp_path, ["3", "0", "5", "2"]) == [(3, 1), (0, 1), (5, 1), (2, 1)]
+    # the other threads waited for the first one to find out
+    assert api.operations == ["totalCount"] + ["edges"] * 4
+
+
+def test_execution_errors_are_raised(tmp_path):
+    api = CountsAPI()
+    catalog = Catalog(tmp_path / "catalog.sqlite", api)
+    for _ in range(2):
+        with pytest.raises(Exception, match="File not found"):
+            catalog._fetch_counts("missing")
+    assert catalog._total_count is True
+    assert catalog._fetch_counts("4") == (4, 1)
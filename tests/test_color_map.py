@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from ccai_client.patho import ColorMap, ColorMapRegistry, parse_hex_color
+
+
+def color_map_node(id: str, codename: str, colors: list[tuple[str, int, str]]) -> dict:
+    edges = [{"node": {"name": name, "key": key, "value": value}} for name, key, value in colors]
+    return {"id": id, "name": codename.title(), "codename": codename, "colors": {"edges": edges}}
+
+
+GLEASON = color_map_node(
+    "gleason-id", "gleason", [("benign", 0, "#00ff00"), ("grade 3", 1, "#ffff0080"), ("grade 5", 3, "#ff0000")]
+)
+EMPTY = color_map_node("empty-id", "empty", [])
+
+
+class ColorMapsAPI:
+    def __init__(self, *nodes: dict):
+        self.nodes = list(nodes)
+        self.queries = 0
+
+    def query_graphql(self, query: str, variables: dict | None = None, retry: bool | None = None) -> dict:
+        assert "GetAllColorMaps" in query
+        self.queries += 1
+        return {"edges": [{"node": node} for node in self.nodes]}
+
+
+@pytest.fixture
+def gleason() -> ColorMap:
+    return ColorMap.from_graphql(GLEASON)
+
+
+def test_parse_hex_color():
+    assert parse_hex_color("#102030") == (16, 32, 48, 255)
+    assert parse_hex_color("#10203040") == (16, 32, 48, 64)
+
+
+def test_palette(gleason):
+    assert gleason.palette.tolist() == [
+        [0, 255, 0, 255],
+        [255, 255, 0, 128],
+        # keys without a color and the last row for keys out of range are transparent
+        [0, 0, 0, 0],
+        [255, 0, 0, 255],
+        [0, 0, 0, 0],
+    ]
+    assert not gleason.palette.flags.writeable
+    assert ColorMap.from_graphql(EMPTY).palette.tolist() == [[0, 0, 0, 0]]
+
+
+def test_keys_to_rgba(gleason):
+    keys = np.array([[0, 1, 2], [3, 4, -1]])
+    rgba = gleason.keys_to_rgba(keys)
+    assert rgba.shape == (2, 3, 4) and rgba.dtype == np.uint8
+    assert [tuple(pixel) for pixel in rgba.reshape(-1, 4)] == [
+        (0, 255, 0, 255),
+        (255, 255, 0, 128),
+        (0, 0, 0, 0),
+        (255, 0, 0, 255),
+        (0, 0, 0, 0),
+        (0, 0, 0, 0),
+    ]
+
+
+def test_rgba_to_keys_round_trip(gleason):
+    keys = np.random.default_rng(0).choice([0, 1, 3], size=(16, 16))
+    rgba = gleason.keys_to_rgba(keys)
+    assert np.array_equal(gleason.rgba_to_keys(rgba), keys)
+    assert gleason.rgba_to_keys(rgba).dtype == np.int32
+
+
+def test_rgba_to_keys_missing_colors(gleason):
+    image = np.array([[[0, 255, 0, 255], [0, 255, 0, 254], [1, 2, 3, 255], [0, 0, 0, 0]]], dtype=np.uint8)
+    assert gleason.rgba_to_keys(image).tolist() == [[0, -1, -1, -1]]
+    assert gleason.rgba_to_keys(image, missing=255).tolist() == [[0, 255, 255, 255]]
+    assert ColorMap.from_graphql(EMPTY).rgba_to_keys(image).tolist() == [[-1, -1, -1, -1]]
+
+
+def test_rgba_to_keys_of_rgb(gleason):
+    # RGB pixels are opaque, so the translucent grade 3 color does not match
+    image = np.array([[[0, 255, 0], [255, 0, 0], [255, 255, 0]]], dtype=np.uint8)
+    assert gleason.rgba_to_keys(image).tolist() == [[0, 3, -1]]
+
+
+def test_registry_loads_once_per_api():
+    api = ColorMapsAPI(GLEASON, EMPTY)
+    registry = ColorMapRegistry.of(api)
+    assert ColorMapRegistry.of(api) is registry
+    assert ColorMapRegistry.of(ColorMapsAPI()) is not registry
+
+    assert registry.by_codename("gleason").id == "gleason-id"
+    assert registry.by_id("empty-id").codename == "empty"
+    assert registry.resolve("gleason") is registry.by_id("gleason-id")
+    assert registry.resolve(registry.by_id("empty-id")).codename == "empty"
+    assert [color_map.codename for color_map in registry.all()] == ["gleason", "empty"]
+    assert api.queries == 1
+
+
+def test_registry_lookup_errors_and_refresh():
+    api = ColorMapsAPI(GLEASON)
+    registry = ColorMapRegistry.of(api)
+    with pytest.raises(ValueError, match="codename 'empty'"):
+        registry.by_codename("empty")
+    with pytest.raises(ValueError, match="id 'empty-id'"):
+        registry.by_id("empty-id")
+
+    api.nodes.append(EMPTY)
+    registry.refresh()
+    assert registry.by_codename("empty").id == "empty-id"
+    assert ColorMap.get_by_codename(api, "gleason") is registry.by_codename("gleason")
+    assert api.queries == 2
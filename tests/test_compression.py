@@ -0,0 +1,79 @@
+import gzip
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ccai_client import API
+from ccai_client.compression import CompressionPolicy
+
+from .conftest import FakeResponse
+
+QUERY = "mutation ImportAnnotations($geojson: String!) { importAnnotations(geojson: $geojson) { ok } }"
+VARIABLES = {"geojson": "x" * 1000}
+OK = json.dumps({"data": {"importAnnotations": {"ok": True}}}).encode()
+
+
+class Server:
+    """GraphQL endpoint answering compressed requests with `rejection`, or normally when it is None"""
+
+    def __init__(self, rejection: FakeResponse | None):
+        self.rejection = rejection
+        self.encodings: list[str | None] = []
+        self.lock = threading.Lock()
+
+    def request(self, method: str, url: str, data: bytes, headers: dict, **kwargs) -> FakeResponse:
+        encoding = headers.get("Content-Encoding")
+        with self.lock:
+            self.encodings.append(encoding)
+        time.sleep(0.01)
+        if encoding == "gzip":
+            if self.rejection is not None:
+                return self.rejection
+            data = gzip.decompress(data)
+        assert json.loads(data)["variables"] == VARIABLES
+        return FakeResponse(OK)
+
+
+def connect(monkeypatch, server: Server) -> API:
+    monkeypatch.setattr(API, "session", server)
+    return API(api_url="http://ccai.invalid", auth_headers={}, compression=CompressionPolicy(True, min_size=100))
+
+
+def test_compressed_requests_are_accepted(monkeypatch):
+    server = Server(None)
+    api = connect(monkeypatch, server)
+    for _ in range(3):
+        assert api.query_graphql(QUERY, VARIABLES) == {"ok": True}
+    assert server.encodings == ["gzip"] * 3
+    assert all(totals["bytes_saved"] > 0 for totals in api.metrics.snapshot().values())
+
+
+@pytest.mark.parametrize(
+    "rejection",
+    [
+        FakeResponse(b"Unsupported Media Type", 415),
+        FakeResponse(b'{"detail": "JSON parse error - Could not decode request body"}', 400),
+        FakeResponse(b"Content-Encoding gzip is not supported", 400),
+    ],
+)
+def test_rejected_compression_is_probed_once(monkeypatch, rejection):
+    server = Server(rejection)
+    api = connect(monkeypatch, server)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: api.query_graphql(QUERY, VARIABLES), range(8)))
+
+    assert results == [{"ok": True}] * 8
+    # the other threads waited for the first compressed request
+    assert server.encodings == ["gzip"] + [None] * 8
+
+
+def test_other_bad_requests_are_not_resent(monkeypatch):
+    server = Server(FakeResponse(b'{"errors": [{"message": "Syntax Error"}]}', 400))
+    api = connect(monkeypatch, server)
+    with pytest.raises(Exception):
+        api.query_graphql(QUERY, VARIABLES)
+    assert server.encodings == ["gzip"]
+    assert api._compression_accepted is None
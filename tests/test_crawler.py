@@ -0,0 +1,86 @@
+from pathlib import PurePosixPath
+
+import pytest
+
+from ccai_client.crawler import crawl
+
+
+def paths(results) -> set[str]:
+    return {str(path) for path, _ in results}
+
+
+@pytest.fixture
+def linked(tree):
+    """Folder C linked in both A and B"""
+    tree.folder("root")
+    tree.folder("A")
+    tree.folder("B")
+    tree.folder("C")
+    tree.file("x", "x.txt", b"x")
+    tree.file("y", "y.txt", b"y")
+    tree.link("root", "A", "B")
+    tree.link("A", "C", "x")
+    tree.link("B", "C")
+    tree.link("C", "y")
+    return tree
+
+
+def test_linked_folder_under_every_path(linked):
+    expected = {"A", "B", "A/C", "B/C", "A/x.txt", "A/C/y.txt", "B/C/y.txt"}
+    # listings finish in a different order every time, the result must not depend on it
+    for _ in range(20):
+        assert paths(crawl(linked.root("root"), max_workers=4, unique=False)) == expected
+
+
+def test_linked_folder_is_listed_once(linked):
+    list(crawl(linked.root("root"), unique=False))
+    assert sorted(linked.listed) == ["A", "B", "C", "root"]
+
+
+def test_unique_yields_every_file_once(linked):
+    results = list(crawl(linked.root("root"), max_workers=4))
+    assert sorted(file.id for _, file in results) == ["A", "B", "C", "x", "y"]
+    assert paths(results) & {"A/C", "B/C"}
+    assert paths(results) & {"A/C/y.txt", "B/C/y.txt"}
+
+
+def test_cycles(tree):
+    tree.folder("root")
+    tree.folder("A")
+    tree.folder("B")
+    tree.file("z", "z.txt", b"z")
+    tree.link("root", "A")
+    tree.link("A", "B")
+    # B contains its parent and the root
+    tree.link("B", "A", "root", "z")
+
+    assert paths(crawl(tree.root("root"), unique=False)) == {"A", "A/B", "A/B/A", "A/B/root", "A/B/z.txt"}
+    assert sorted(tree.listed) == ["A", "B", "root"]
+    # A is yielded once, the root link is the only path to the root
+    assert paths(crawl(tree.root("root"))) == {"A", "A/B", "A/B/root", "A/B/z.txt"}
+
+
+def test_linked_folder_inside_itself(tree):
+    tree.folder("root")
+    tree.folder("A")
+    tree.folder("B")
+    tree.link("root", "A", "B")
+    tree.link("A", "B")
+    tree.link("B", "A")
+    assert paths(crawl(tree.root("root"), unique=False)) == {"A", "B", "A/B", "B/A", "A/B/A", "B/A/B"}
+
+
+def test_max_depth_and_types(linked):
+    assert paths(crawl(linked.root("root"), max_depth=2, unique=False)) == {"A", "B", "A/C", "B/C", "A/x.txt"}
+    results = list(crawl(linked.root("root"), types=["SimpleFileNode"], unique=False))
+    assert paths(results) == {"A/x.txt", "A/C/y.txt", "B/C/y.txt"}
+    assert all(isinstance(path, PurePosixPath) for path, _ in results)
+
+
+def test_duplicate_names_get_ids(tree):
+    tree.folder("root")
+    tree.file("a1", "same.txt", b"1")
+    tree.file("a2", "same.txt", b"2")
+    tree.file("a3", "sub/dir", b"3")
+    tree.link("root", "a1", "a2", "a3")
+    assert paths(crawl(tree.root("root"))) == {"same.txt", "same.txt (a2)", "sub_dir"}
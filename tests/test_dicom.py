@@ -0,0 +1,150 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from ccai_client.file_classes import EXPLICIT_VR_LITTLE_ENDIAN, _decode_frame, parse_graphql_file
+
+from .conftest import file_node
+
+JPEG_BASELINE = "1.2.840.10008.1.2.4.50"
+JPEG_LS = "1.2.840.10008.1.2.4.80"
+
+
+def metadata(rows: int, columns: int, **values) -> dict:
+    tags = {
+        "rows": "00280010",
+        "columns": "00280011",
+        "samples": "00280002",
+        "planar": "00280006",
+        "bits": "00280100",
+        "signed": "00280103",
+        "total_columns": "00480006",
+        "total_rows": "00480007",
+        "transfer_syntax": "00020010",
+    }
+    values = {"rows": rows, "columns": columns, **values}
+    return {tags[name]: {"Value": [value]} for name, value in values.items()}
+
+
+class StubDICOMwebClient:
+    """Serves the frames of one instance, encoded in the transfer syntax of the Accept media type"""
+
+    def __init__(self, frames: list[np.ndarray], metadata: dict):
+        self.frames = frames
+        self.metadata = metadata
+        self.requests = []
+
+    def retrieve_instance_metadata(self, study_instance_uid: str, series_instance_uid: str, sop_instance_uid: str):
+        return self.metadata
+
+    def retrieve_instance_frames(self, study_uid, series_uid, sop_uid, frame_numbers, media_types=None):
+        self.requests.append((list(frame_numbers), media_types))
+        ((media_type, transfer_syntax_uid),) = media_types
+        frames = [self.frames[number - 1] for number in frame_numbers]
+        if transfer_syntax_uid == JPEG_BASELINE:
+            return [encode_jpeg(frame) for frame in frames]
+        assert (media_type, transfer_syntax_uid) == ("application/octet-stream", EXPLICIT_VR_LITTLE_ENDIAN)
+        return [frame.astype(frame.dtype.newbyteorder("<")).tobytes() for frame in frames]
+
+
+def encode_jpeg(frame: np.ndarray) -> bytes:
+    output = io.BytesIO()
+    Image.fromarray(frame).save(output, format="JPEG", quality=100)
+    return output.getvalue()
+
+
+@pytest.fixture
+def study(tree):
+    node = file_node(
+        "DicomStudyFileNode",
+        "study",
+        "study",
+        study={"accessToken": "token", "dicomwebUrl": "http://dicomweb.invalid", "studyInstanceUid": "1.2.3"},
+    )
+    return parse_graphql_file(node, tree.api)
+
+
+def stub_client(study, frames: list[np.ndarray], metadata: dict) -> StubDICOMwebClient:
+    client = StubDICOMwebClient(frames, metadata)
+    study.__dict__["dicomweb_client"] = client
+    return client
+
+
+@pytest.mark.parametrize(
+    "bits, signed, dtype",
+    [(8, 0, np.uint8), (8, 1, np.int8), (16, 0, np.uint16), (16, 1, np.int16), (32, 0, np.uint32), (32, 1, np.int32)],
+)
+def test_decode_uncompressed(bits, signed, dtype):
+    info = np.iinfo(dtype)
+    pixels = np.random.default_rng(0).integers(info.min, info.max, size=(5, 7), dtype=dtype, endpoint=True)
+    frame = pixels.astype(pixels.dtype.newbyteorder("<")).tobytes()
+
+    result = _decode_frame(frame, metadata(5, 7, bits=bits, signed=signed), EXPLICIT_VR_LITTLE_ENDIAN)
+    assert result.dtype == dtype
+    assert np.array_equal(result, pixels)
+
+
+def test_decode_one_bit():
+    pixels = np.random.default_rng(0).integers(0, 1, size=(3, 5), dtype=np.uint8, endpoint=True)
+    # 15 pixels in two bytes, the first pixel in the least significant bit
+    frame = np.packbits(pixels.ravel(), bitorder="little").tobytes()
+    assert len(frame) == 2
+    assert np.array_equal(_decode_frame(frame, metadata(3, 5, bits=1), EXPLICIT_VR_LITTLE_ENDIAN), pixels)
+
+
+def test_decode_color_planes():
+    pixels = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+    interleaved = _decode_frame(pixels.tobytes(), metadata(2, 3, samples=3), EXPLICIT_VR_LITTLE_ENDIAN)
+    assert np.array_equal(interleaved, pixels)
+
+    planes = pixels.transpose(2, 0, 1).tobytes()
+    assert np.array_equal(_decode_frame(planes, metadata(2, 3, samples=3, planar=1), EXPLICIT_VR_LITTLE_ENDIAN), pixels)
+
+
+def test_decode_unsupported():
+    with pytest.raises(ValueError):
+        _decode_frame(b"\xff\xd8\xff\xf7", metadata(2, 2), JPEG_LS)
+    with pytest.raises(ValueError):
+        _decode_frame(bytes(8), metadata(2, 2, bits=12), EXPLICIT_VR_LITTLE_ENDIAN)
+
+
+def test_retrieve_frames_uncompressed(study):
+    frames = [np.full((4, 4), i * 1000, dtype=np.uint16) for i in range(5)]
+    client = stub_client(study, frames, metadata(4, 4, bits=16))
+
+    result = study.retrieve_frames("series", "instance", [3, 1])
+    assert [frame.tolist() for frame in result] == [frames[2].tolist(), frames[0].tolist()]
+    assert client.requests == [([3, 1], (("application/octet-stream", EXPLICIT_VR_LITTLE_ENDIAN),))]
+
+
+def test_retrieve_frames_transcodes_syntaxes_pillow_cannot_decode(study):
+    frames = [np.full((4, 4), 7, dtype=np.uint16)]
+    client = stub_client(study, frames, metadata(4, 4, bits=16, transfer_syntax=JPEG_LS))
+
+    assert study.retrieve_frames("series", "instance", [1])[0].tolist() == frames[0].tolist()
+    assert client.requests[0][1] == (("application/octet-stream", EXPLICIT_VR_LITTLE_ENDIAN),)
+
+
+def test_retrieve_frames_jpeg(study):
+    frames = [np.full((16, 16, 3), (10 * i, 100, 200), dtype=np.uint8) for i in range(3)]
+    client = stub_client(study, frames, metadata(16, 16, samples=3, transfer_syntax=JPEG_BASELINE))
+
+    result = study.retrieve_frames("series", "instance", [2])
+    assert client.requests[0][1] == (("image/jpeg", JPEG_BASELINE),)
+    assert result[0].shape == (16, 16, 3)
+    assert np.abs(result[0].astype(int) - frames[1]).max() <= 2
+
+
+def test_retrieve_tiles_stitches_and_crops(study):
+    # 10 x 7 image in 4 x 4 tiles, 3 tiles per row
+    image = np.arange(7 * 10, dtype=np.uint16).reshape(7, 10)
+    padded = np.zeros((8, 12), dtype=np.uint16)
+    padded[:7, :10] = image
+    tiles = [padded[y : y + 4, x : x + 4] for y in range(0, 8, 4) for x in range(0, 12, 4)]
+    client = stub_client(study, tiles, metadata(4, 4, bits=16, total_columns=10, total_rows=7))
+
+    assert np.array_equal(study.retrieve_tiles("series", "instance", range(0, 3), range(0, 2)), image)
+    assert np.array_equal(study.retrieve_tiles("series", "instance", range(1, 3), range(1, 2)), image[4:, 4:])
+    assert [numbers for numbers, _ in client.requests] == [[1, 2, 3, 4, 5, 6], [5, 6]]
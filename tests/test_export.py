@@ -0,0 +1,156 @@
+import json
+
+import pytest
+
+from ccai_client.export import (
+    ANNOTATION_NODES,
+    POINT,
+    POINT_CLOUD_ID,
+    annotation_geometry,
+    export_annotations_geojsonl,
+    export_annotations_table,
+    export_point_clouds_table,
+)
+from ccai_client.file_classes import parse_graphql_file
+
+from .conftest import slide_node
+
+
+def annotation(slide_id: str, number: int, shape_type: str = "rect", shape_data: list[int] | None = None) -> dict:
+    return {
+        "id": f"{slide_id}-{number}",
+        "slideId": slide_id,
+        "number": number,
+        "shapeType": shape_type,
+        "shapeData": shape_data if shape_data is not None else [number, 0, 10, 20],
+        "label": f"label {number}" if number % 2 else None,
+        "color": "#ff0000",
+        "author": {"name": "Jan"} if number % 3 else None,
+        "pointType": None,
+        "createdAt": "2024-01-01T00:00:00+00:00",
+    }
+
+
+class ExportAPI:
+    """Streams the annotations and point clouds of every slide like `API.stream_graphql`"""
+
+    def __init__(self, api, annotations: dict[str, list[dict]], point_clouds: dict[str, list[tuple[str, list]]]):
+        self.annotations = annotations
+        self.point_clouds = point_clouds
+        api.stream_graphql = self.stream_graphql
+
+    def stream_graphql(self, query: str, prefixes: tuple[str, ...], variables: dict | None = None, retry=None):
+        if prefixes == (ANNOTATION_NODES,):
+            for node in self.annotations[variables["id"]]:
+                yield ANNOTATION_NODES, node
+            return
+        assert prefixes == (POINT_CLOUD_ID, POINT)
+        for point_cloud_id, points in self.point_clouds[variables["id"]]:
+            yield POINT_CLOUD_ID, point_cloud_id
+            for point in points:
+                yield POINT, point
+
+
+@pytest.fixture
+def slides(tree):
+    annotations = {
+        "s1": [annotation("s1", i) for i in range(5)],
+        "s2": [annotation("s2", 0, "polygon", [0, 0, 10, 0, 10, 10]), annotation("s2", 1, "text", [1, 2])],
+    }
+    point_clouds = {
+        "s1": [("pc1", [{"x": 1, "y": 2, "v": 3}, {"x": 4, "y": 5, "v": 6, "r": 1.5, "s": 90}]), ("pc2", [])],
+        "s2": [("pc3", [{"x": i, "y": -i, "v": i % 2} for i in range(7)])],
+    }
+    ExportAPI(tree.api, annotations, point_clouds)
+    # slide_node gives every slide the same ID, and parsed files are merged by ID
+    result = []
+    for id in annotations:
+        node = slide_node(id)
+        node["id"] = id
+        result.append(parse_graphql_file(node, tree.api))
+    return result
+
+
+@pytest.mark.parametrize(
+    "shape_type, shape_data, expected",
+    [
+        ("rect", [1, 2, 3, 4], {"type": "Polygon", "coordinates": [[[1, 2], [4, 2], [4, 6], [1, 6], [1, 2]]]}),
+        ("polygon", [0, 0, 5, 0, 5, 5], {"type": "Polygon", "coordinates": [[[0, 0], [5, 0], [5, 5], [0, 0]]]}),
+        ("closed_path", [0, 0, 5, 0, 0, 0], {"type": "Polygon", "coordinates": [[[0, 0], [5, 0], [0, 0]]]}),
+        ("path", [0, 0, 5, 5], {"type": "LineString", "coordinates": [[0, 0], [5, 5]]}),
+        ("arrow_line", [1, 1, 2, 2], {"type": "LineString", "coordinates": [[1, 1], [2, 2]]}),
+        ("circle", [7, 8, 3], {"type": "Point", "coordinates": [7, 8]}),
+        ("ellipse", [7, 8, 3, 2], {"type": "Point", "coordinates": [7, 8]}),
+        ("point", [7, 8], {"type": "Point", "coordinates": [7, 8]}),
+        ("text", [7, 8], None),
+    ],
+)
+def test_annotation_geometry(shape_type, shape_data, expected):
+    assert annotation_geometry(shape_type, shape_data) == expected
+
+
+def test_export_annotations_geojsonl(slides, tmp_path):
+    path = tmp_path / "annotations.geojsonl"
+    assert export_annotations_geojsonl(slides, path) == 7
+
+    features = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [feature["id"] for feature in features] == ["s1-0", "s1-1", "s1-2", "s1-3", "s1-4", "s2-0", "s2-1"]
+    assert features[1] == {
+        "type": "Feature",
+        "id": "s1-1",
+        "geometry": {"type": "Polygon", "coordinates": [[[1, 0], [11, 0], [11, 20], [1, 20], [1, 0]]]},
+        "properties": {
+            "slide_id": "s1",
+            "number": 1,
+            "shape_type": "rect",
+            "shape_data": [1, 0, 10, 20],
+            "label": "label 1",
+            "color": "#ff0000",
+            "author": "Jan",
+            "point_type": None,
+            "created_at": "2024-01-01T00:00:00+00:00",
+        },
+    }
+    assert features[0]["properties"]["author"] is None
+    assert features[6]["geometry"] is None
+
+
+def test_export_annotations_geojsonl_single_slide(slides, tmp_path):
+    path = tmp_path / "annotations.geojsonl"
+    assert export_annotations_geojsonl(slides[1], path) == 2
+    assert len(path.read_text().splitlines()) == 2
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+@pytest.mark.parametrize("batch_size", [1, 2, 7, 100])
+def test_export_annotations_table(slides, tmp_path, suffix, batch_size):
+    pa = pytest.importorskip("pyarrow")
+    path = tmp_path / f"annotations{suffix}"
+    assert export_annotations_table(iter(slides), path, batch_size=batch_size) == 7
+
+    table = read_table(pa, path)
+    assert table.column("id").to_pylist() == ["s1-0", "s1-1", "s1-2", "s1-3", "s1-4", "s2-0", "s2-1"]
+    assert table.column("shape_data").to_pylist()[5] == [0, 0, 10, 0, 10, 10]
+    assert table.column("author").to_pylist() == [None, "Jan", "Jan", None, "Jan", None, "Jan"]
+    assert table.column("label").to_pylist()[:2] == [None, "label 1"]
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 100])
+def test_export_point_clouds_table(slides, tmp_path, batch_size):
+    pa = pytest.importorskip("pyarrow")
+    path = tmp_path / "points.parquet"
+    assert export_point_clouds_table(slides, path, batch_size=batch_size) == 9
+
+    table = read_table(pa, path)
+    assert table.column("point_cloud_id").to_pylist() == ["pc1", "pc1"] + ["pc3"] * 7
+    assert table.column("slide_id").to_pylist() == ["s1", "s1"] + ["s2"] * 7
+    assert table.column("x").to_pylist() == [1, 4, 0, 1, 2, 3, 4, 5, 6]
+    assert table.column("color_key").to_pylist()[:4] == [3, 6, 0, 1]
+    assert table.column("radius").to_pylist()[:3] == [None, 1.5, None]
+    assert table.column("score").to_pylist()[:3] == [None, 90, None]
+
+
+def read_table(pa, path):
+    if path.suffix == ".arrow":
+        return pa.ipc.open_file(str(path)).read_all()
+    return pa.parquet.read_table(str(path))
@@ -0,0 +1,160 @@
+import io
+import json
+import threading
+
+import pytest
+
+from ccai_client.file_classes import parse_graphql_file
+from ccai_client.geojson import _StreamDecoder, chunk_geojson_features, iter_geojson_features
+from ccai_client.retry import RetryPolicy
+
+from .conftest import slide_node
+
+
+def feature(index: int, name_length: int = 10) -> dict:
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [index * 1.5, -index]},
+        "properties": {"name": "ż" * name_length, "index": index},
+    }
+
+
+FEATURES = [feature(i, name_length=i % 7) for i in range(25)]
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_stream_decoder_across_read_boundaries(read_size):
+    text = ' {"a": [1, 2.5e3, "x\\"y"]}  12345 \n -0.25 "ąę" true null [] '
+    stream = _StreamDecoder(io.StringIO(text), read_size)
+    values = []
+    while stream.peek() is not None:
+        values.append(stream.decode())
+    assert values == [{"a": [1, 2500.0, 'x"y']}, 12345, -0.25, "ąę", True, None, []]
+
+
+def test_stream_decoder_expect():
+    stream = _StreamDecoder(io.StringIO("  [1]"), 1)
+    stream.expect("[")
+    assert stream.decode() == 1
+    with pytest.raises(ValueError, match="expected ','"):
+        stream.expect(",")
+
+
+def test_stream_decoder_invalid_json():
+    stream = _StreamDecoder(io.StringIO('{"a": }'), 2)
+    with pytest.raises(json.JSONDecodeError):
+        stream.decode()
+
+
+@pytest.mark.parametrize("read_size", [1, 5, 100, 1 << 20])
+def test_iter_feature_collection(tmp_path, read_size):
+    path = tmp_path / "collection.geojson"
+    # features do not have to be the first key
+    path.write_text(json.dumps({"type": "FeatureCollection", "name": "test", "features": FEATURES}, indent=2))
+    assert list(iter_geojson_features(path, read_size=read_size)) == FEATURES
+
+
+@pytest.mark.parametrize("read_size", [1, 5, 1 << 20])
+def test_iter_newline_delimited(tmp_path, read_size):
+    path = tmp_path / "features.geojsonl"
+    path.write_text("\n".join(json.dumps(item) for item in FEATURES) + "\n")
+    assert list(iter_geojson_features(path, read_size=read_size)) == FEATURES
+
+
+def test_iter_collection_without_features(tmp_path):
+    path = tmp_path / "empty.geojson"
+    path.write_text('{"type": "FeatureCollection"}')
+    with pytest.raises(ValueError, match="without features"):
+        list(iter_geojson_features(path))
+
+
+def test_iter_truncated_collection(tmp_path):
+    path = tmp_path / "truncated.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": FEATURES})[:-2])
+    with pytest.raises(ValueError, match="unexpected end of file"):
+        list(iter_geojson_features(path))
+
+
+@pytest.mark.parametrize("max_chunk_bytes", [200, 300, 500, 2000])
+def test_chunks_respect_size_limit(max_chunk_bytes):
+    chunks = list(chunk_geojson_features(iter(FEATURES), max_chunk_bytes=max_chunk_bytes, max_features=1000))
+    decoded = [json.loads(chunk) for chunk in chunks]
+
+    assert [item for chunk in decoded for item in chunk["features"]] == FEATURES
+    assert all(chunk["type"] == "FeatureCollection" for chunk in decoded)
+    for chunk, next_chunk in zip(chunks, decoded[1:]):
+        assert len(chunk.encode("utf-8")) <= max_chunk_bytes
+        # a chunk is closed only when the next feature does not fit
+        next_feature = json.dumps(next_chunk["features"][0], separators=(",", ":"))
+        assert len(chunk.encode("utf-8")) + 1 + len(next_feature.encode("utf-8")) > max_chunk_bytes
+
+
+def test_chunks_respect_feature_limit():
+    chunks = [json.loads(chunk) for chunk in chunk_geojson_features(iter(FEATURES), max_features=10)]
+    assert [len(chunk["features"]) for chunk in chunks] == [10, 10, 5]
+
+
+def test_feature_larger_than_limit_is_sent_alone():
+    large = feature(0, name_length=1000)
+    chunks = list(chunk_geojson_features(iter([FEATURES[1], large, FEATURES[2]]), max_chunk_bytes=500))
+    assert [len(json.loads(chunk)["features"]) for chunk in chunks] == [1, 1, 1]
+    assert json.loads(chunks[1])["features"] == [large]
+
+
+def test_no_features_no_chunks():
+    assert list(chunk_geojson_features(iter([]))) == []
+
+
+class ImportAPI:
+    """Answers GeoJSON import mutations, failing a chunk as many times as `failures` gives for its first feature"""
+
+    def __init__(self, api, failures: dict[int, int]):
+        self.failures = failures
+        self.calls: list[tuple[int, bool | None]] = []
+        self.lock = threading.Lock()
+        api.query_graphql = self.query_graphql
+        api.retry_policy = RetryPolicy(backoff_factor=0)
+
+    def query_graphql(self, query: str, variables: dict | None = None, retry: bool | None = None):
+        indexes = [feature["properties"]["index"] for feature in json.loads(variables["geojson"])["features"]]
+        with self.lock:
+            self.calls.append((indexes[0], retry))
+            attempts = sum(first == indexes[0] for first, _ in self.calls)
+        if attempts <= self.failures.get(indexes[0], 0):
+            raise Exception("GraphQL query failed: timeout")
+        return {"annotations": [{"id": f"annotation-{index}"} for index in indexes]}
+
+
+def import_file(tree, tmp_path, failures: dict[int, int], **kwargs):
+    path = tmp_path / "features.geojsonl"
+    path.write_text("\n".join(json.dumps(feature(i)) for i in range(20)))
+    slide = parse_graphql_file(slide_node("slide"), tree.api)
+    api = ImportAPI(tree.api, failures)
+    return api, slide.import_annotations_from_geojson_file(path, max_features_per_chunk=5, **kwargs)
+
+
+def test_import_does_not_resend_failed_chunks_by_default(tree, tmp_path):
+    api, result = import_file(tree, tmp_path, {5: 1})
+
+    assert sorted(api.calls) == [(0, None), (5, None), (10, None), (15, None)]
+    assert result.annotation_ids == [f"annotation-{i}" for i in [0, 1, 2, 3, 4, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19]]
+    assert [json.loads(geojson)["features"][0]["properties"]["index"] for geojson, _ in result.failed_chunks] == [5]
+
+
+def test_import_resends_failed_chunks_with_retries(tree, tmp_path):
+    api, result = import_file(tree, tmp_path, {5: 2, 15: 3}, retries=2, max_workers=2)
+
+    assert sorted(api.calls) == [
+        (0, True),
+        (5, True),
+        (5, True),
+        (5, True),
+        (10, True),
+        (15, True),
+        (15, True),
+        (15, True),
+    ]
+    # chunks are reported in file order, whenever they succeeded
+    assert result.annotation_ids == [f"annotation-{i}" for i in range(15)]
+    assert len(result.failed_chunks) == 1
+    assert str(result.failed_chunks[0][1]) == "GraphQL query failed: timeout"
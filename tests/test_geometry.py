@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+
+from ccai_client.geometry import ShapeGeometry
+from ccai_client.patho import Annotation
+
+
+def polygon_contains(vertices: list[tuple[float, float]], x: float, y: float) -> bool:
+    """Ray casting, one point and one edge at a time"""
+    inside = False
+    for (x1, y1), (x2, y2) in zip(vertices, vertices[1:] + vertices[:1]):
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+    return inside
+
+
+def contains(shape_type: str, data: list[float], x: float, y: float) -> bool:
+    match shape_type:
+        case "rect":
+            return data[0] <= x <= data[0] + data[2] and data[1] <= y <= data[1] + data[3]
+        case "circle":
+            return (x - data[0]) ** 2 + (y - data[1]) ** 2 <= data[2] ** 2
+        case "ellipse":
+            return ((x - data[0]) / data[2]) ** 2 + ((y - data[1]) / data[3]) ** 2 <= 1
+        case "polygon" | "closed_path" | "path":
+            return polygon_contains(list(zip(data[::2], data[1::2])), x, y)
+        case _:
+            return False
+
+
+def star(points: int, center: tuple[float, float] = (50, 50)) -> list[float]:
+    angles = np.linspace(0, 2 * np.pi, 2 * points, endpoint=False)
+    radii = np.where(np.arange(2 * points) % 2 == 0, 40, 15)
+    return np.column_stack([center[0] + radii * np.cos(angles), center[1] + radii * np.sin(angles)]).ravel().tolist()
+
+
+SHAPES = [
+    ("rect", [10, 20, 50, 30]),
+    ("circle", [50, 50, 25]),
+    ("ellipse", [40, 60, 30, 10]),
+    ("polygon", [0, 0, 100, 0, 100, 100, 0, 100]),
+    ("polygon", [10, 10, 90, 20, 50, 90]),
+    ("polygon", star(7)),
+    # concave, with a horizontal edge
+    ("closed_path", [0, 0, 80, 0, 80, 80, 60, 80, 60, 20, 20, 20, 20, 80, 0, 80]),
+    ("path", [5, 5, 95, 50, 5, 95]),
+    ("point", [50, 50]),
+]
+
+
+@pytest.mark.parametrize("shape_type, data", SHAPES)
+def test_contains_matches_scalar_reference(shape_type, data):
+    points = np.random.default_rng(0).uniform(-10, 110, size=(2000, 2))
+    result = ShapeGeometry(shape_type, data).contains(points)
+
+    assert result.dtype == bool
+    assert result.tolist() == [contains(shape_type, data, x, y) for x, y in points.tolist()]
+
+
+def test_contains_integer_data_and_points():
+    geometry = ShapeGeometry("polygon", np.array([0, 0, 10, 0, 10, 10, 0, 10], dtype=np.int32))
+    assert geometry.contains([[5, 5], [15, 5], [-1, 3]]).tolist() == [True, False, False]
+
+
+def test_contains_degenerate_polygon():
+    assert not ShapeGeometry("polygon", [0, 0, 10, 10]).contains([[5, 5]]).any()
+
+
+@pytest.mark.parametrize(
+    "shape_type, data, area, bounds",
+    [
+        ("rect", [10, 20, 50, 30], 1500, (10, 20, 60, 50)),
+        ("circle", [50, 50, 2], 4 * np.pi, (48, 48, 52, 52)),
+        ("ellipse", [40, 60, 30, 10], 300 * np.pi, (10, 50, 70, 70)),
+        ("polygon", [0, 0, 100, 0, 100, 100, 0, 100], 10000, (0, 0, 100, 100)),
+        # clockwise vertices give the same area
+        ("polygon", [0, 100, 100, 100, 100, 0, 0, 0], 10000, (0, 0, 100, 100)),
+        (
+            "closed_path",
+            [0, 0, 80, 0, 80, 80, 60, 80, 60, 20, 20, 20, 20, 80, 0, 80],
+            80 * 80 - 40 * 60,
+            (0, 0, 80, 80),
+        ),
+        ("polygon", [10, 10, 90, 20, 50, 90], 3000, (10, 10, 90, 90)),
+        ("line", [5, 5, 95, 50], 0, (5, 5, 95, 50)),
+        ("point", [7, 8], 0, (7, 8, 7, 8)),
+    ],
+)
+def test_area_and_bounds(shape_type, data, area, bounds):
+    geometry = ShapeGeometry(shape_type, data)
+    assert geometry.area() == pytest.approx(area)
+    assert geometry.bounds() == bounds
+
+
+def test_bounds_of_empty_shape():
+    with pytest.raises(ValueError):
+        ShapeGeometry("polygon", []).bounds()
+
+
+def test_points_are_a_view_over_the_data():
+    data = np.array([0, 1, 2, 3, 4, 5, 6], dtype=np.int32)
+    geometry = ShapeGeometry("path", data)
+    # an odd trailing value is ignored
+    assert geometry.points.tolist() == [[0, 1], [2, 3], [4, 5]]
+    assert np.shares_memory(geometry.points, data)
+    assert ShapeGeometry("rect", [1, 2, 3, 4]).points.tolist() == [[1, 2], [4, 2], [4, 6], [1, 6]]
+
+
+@pytest.mark.parametrize("shape_type, data", SHAPES)
+def test_scale(shape_type, data):
+    geometry = ShapeGeometry(shape_type, data)
+    scaled = geometry.scale(2.5)
+
+    assert scaled.shape_type == shape_type
+    assert np.allclose(scaled.data, np.asarray(data) * 2.5)
+    assert scaled.area() == pytest.approx(geometry.area() * 2.5**2)
+    assert np.allclose(scaled.bounds(), np.asarray(geometry.bounds()) * 2.5)
+    # scaled points are contained in the scaled shape
+    points = np.random.default_rng(1).uniform(-10, 110, size=(500, 2))
+    assert scaled.contains(points * 2.5).tolist() == geometry.contains(points).tolist()
+
+
+def test_annotation_geometry_is_built_once():
+    annotation = Annotation.from_graphql(
+        {
+            "id": "a",
+            "shapeType": "polygon",
+            "shapeData": [0, 0, 10, 0, 10, 10],
+            "author": None,
+            "slideId": "slide",
+            "number": 1,
+            "label": None,
+            "isLabelVisible": True,
+            "color": None,
+            "pointType": None,
+            "createdAt": "2024-01-01T00:00:00+00:00",
+            "discussion": {"id": "discussion-a", "comments": {"edges": []}},
+        }
+    )
+    geometry = annotation.geometry
+    assert annotation.geometry is geometry
+    assert geometry.shape_type == "polygon"
+    assert geometry.area() == 50
+    assert geometry.contains([[8, 2], [2, 8]]).tolist() == [True, False]
@@ -0,0 +1,66 @@
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+
+from ccai_client.file_classes import parse_graphql_file
+from ccai_client.identity import IdentityMap
+
+from .conftest import slide_node
+
+
+def test_parsed_files_are_merged(tree):
+    first = parse_graphql_file(slide_node("a"), tree.api)
+    first.__dict__["dzi_info"] = "cached"
+
+    assert parse_graphql_file(slide_node("a"), tree.api) is first
+    assert first.__dict__["dzi_info"] == "cached"
+
+    assert parse_graphql_file(slide_node("b", "2024-02-01T00:00:00+00:00"), tree.api) is first
+    assert first.name == "b"
+    # cached properties are computed again from the new fields
+    assert "dzi_info" not in first.__dict__
+
+
+@dataclass
+class Label:
+    id: str
+    text: str
+
+    @cached_property
+    def upper(self) -> str:
+        return self.text.upper()
+
+
+def test_objects_without_updated_at_are_always_updated():
+    identity_map = IdentityMap()
+    first = identity_map.merge(Label("1", "tumor"))
+    assert first.upper == "TUMOR"
+
+    assert identity_map.merge(Label("1", "stroma")) is first
+    assert first.text == "stroma" and first.upper == "STROMA"
+    assert identity_map.merge(Label("2", "tumor")) is not first
+
+
+def test_merge_keeps_fields_readable(tree):
+    slide = parse_graphql_file(slide_node("name 0"), tree.api)
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        while not stop.is_set():
+            try:
+                slide.name, slide.api, slide.id
+            except AttributeError as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for i in range(20000):
+            parse_graphql_file(slide_node(f"name {i}"), tree.api)
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+    assert errors == []
@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+from histpat_toolkit.types import TiledMaskPyramidInfo
+
+from ccai_client.dzi import DZIInfo
+from ccai_client.file_classes import PathologySlideNode, parse_graphql_file
+from ccai_client.mask_export import export_tiled_mask, export_tiled_mask_zarr
+from ccai_client.patho import ColorMap, TiledMask
+
+from .conftest import slide_node
+
+COLORS = {1: (255, 0, 0, 255), 2: (0, 0, 255, 255)}
+COLOR_MAP = ColorMap.from_graphql(
+    {
+        "id": "color-map",
+        "name": "Tissue",
+        "codename": "tissue",
+        "colors": {
+            "edges": [
+                {"node": {"name": "tumor", "key": 1, "value": "#ff0000"}},
+                {"node": {"name": "stroma", "key": 2, "value": "#0000ff"}},
+            ]
+        },
+    }
+)
+
+
+@dataclass
+class Region:
+    x: int
+    y: int
+    w: int
+    h: int
+
+
+class StubPyramid:
+    """Mask of 10 x 6 pixels at scale 0.5 of the slide, cropped at that scale or half of it"""
+
+    scale = 0.5
+
+    def __init__(self, keys: np.ndarray):
+        self.image = np.zeros(keys.shape + (4,), dtype=np.uint8)
+        for key, color in COLORS.items():
+            self.image[keys == key] = color
+        self.regions = []
+
+    def crop_rect(self, region: Region, scale: float, allow_out_of_bounds: bool = False) -> np.ndarray:
+        assert allow_out_of_bounds
+        self.regions.append((region.x, region.y, region.w, region.h))
+        step = round(self.scale / scale)
+        image = self.image[::step, ::step]
+        crop = np.zeros((region.h, region.w, 4), dtype=np.uint8)
+        part = image[region.y : region.y + region.h, region.x : region.x + region.w]
+        crop[: part.shape[0], : part.shape[1]] = part
+        return crop
+
+
+@pytest.fixture
+def keys() -> np.ndarray:
+    keys = np.zeros((6, 10), dtype=np.int32)
+    keys[1:3, 1:6] = 1
+    keys[5, 8:] = 2
+    return keys
+
+
+@pytest.fixture
+def pyramid(keys) -> StubPyramid:
+    return StubPyramid(keys)
+
+
+@pytest.fixture
+def slide_and_mask(tree, monkeypatch, pyramid):
+    slide = parse_graphql_file(slide_node("slide"), tree.api)
+    slide.__dict__["dzi_info"] = DZIInfo(width=20, height=12, tile_size=256)
+    mask = TiledMask("mask", None, None, COLOR_MAP, datetime(2024, 1, 1, tzinfo=timezone.utc))
+    info = TiledMaskPyramidInfo(tiles=[], scale=0.5, tiles_url="http://tiles.invalid", tile_size=4)
+
+    def get_tiled_mask_pyramid(self, tiled_mask, pyramid_info=None):
+        assert tiled_mask is mask and pyramid_info is info
+        return pyramid
+
+    monkeypatch.setattr("histpat_toolkit.geom.Rectangle", Region, raising=False)
+    monkeypatch.setattr(TiledMask, "get_pyramid_info", lambda self, api: info)
+    monkeypatch.setattr(PathologySlideNode, "get_tiled_mask_pyramid", get_tiled_mask_pyramid)
+    return slide, mask
+
+
+def test_export_rgba(slide_and_mask, pyramid, tmp_path):
+    array = export_tiled_mask(*slide_and_mask, tmp_path / "mask.npy", max_workers=2)
+    assert np.array_equal(np.load(tmp_path / "mask.npy"), pyramid.image)
+    assert np.array_equal(array, pyramid.image)
+    # blocks of the tile size, clipped to the image
+    assert sorted(pyramid.regions) == [(x, y, min(4, 10 - x), min(4, 6 - y)) for x in (0, 4, 8) for y in (0, 4)]
+
+
+def test_export_keys_at_half_scale(slide_and_mask, keys, tmp_path):
+    export_tiled_mask(*slide_and_mask, tmp_path / "mask.npy", scale=0.25, keys=True, missing=-1)
+    expected = np.where(keys[::2, ::2] == 0, -1, keys[::2, ::2])
+    assert np.array_equal(np.load(tmp_path / "mask.npy"), expected)
+
+
+@pytest.mark.parametrize("keys_mode", [False, True])
+def test_export_zarr(slide_and_mask, pyramid, keys, tmp_path, keys_mode):
+    zarr = pytest.importorskip("zarr")
+    export_tiled_mask_zarr(*slide_and_mask, tmp_path / "mask.zarr", keys=keys_mode)
+
+    array = zarr.open_array(str(tmp_path / "mask.zarr"), mode="r")
+    assert np.array_equal(array[:], keys if keys_mode else pyramid.image)
+    assert array.chunks[:2] == (4, 4)
+    assert dict(array.attrs) == {"mask_id": "mask", "scale": 0.5, "color_map": "tissue"}
+    # only the 3 of 6 blocks with mask pixels are stored
+    assert array.nchunks_initialized == 3
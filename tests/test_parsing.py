@@ -0,0 +1,71 @@
+import pytest
+
+from ccai_client import core_classes
+from ccai_client.core_classes import Comment
+from ccai_client.patho import Algorithm, Rating, RunAlgorithm
+
+RUN = {
+    "id": "run",
+    "algorithm": {"id": "algorithm", "name": "Mitosis detection"},
+    "discussion": {
+        "id": "discussion-run",
+        "comments": {
+            "edges": [
+                {
+                    "node": {
+                        "id": f"comment-{i}",
+                        "text": f"comment {i}",
+                        "author": {"name": "Jan"},
+                        "createdAt": "2024-01-01T00:00:00+00:00",
+                    }
+                }
+                for i in range(3)
+            ]
+        },
+    },
+    "ratings": [{"score": 4, "author": {"name": "Anna"}}],
+}
+
+
+@pytest.fixture(params=[False, True], ids=["construct", "strict"])
+def strict(request, monkeypatch):
+    monkeypatch.setattr(core_classes, "_strict_validation", request.param)
+    return request.param
+
+
+def test_run_algorithm_from_graphql(strict):
+    run = RunAlgorithm.from_graphql(RUN)
+
+    assert run.id == "run"
+    assert run.algorithm == Algorithm(id="algorithm", name="Mitosis detection")
+    # every comment of the discussion once
+    assert [comment.id for comment in run.comments] == ["comment-0", "comment-1", "comment-2"]
+    assert all(isinstance(comment, Comment) for comment in run.comments)
+    assert run.ratings == [Rating(score=4, author="Anna")]
+
+
+def test_construct_matches_validated_instance(monkeypatch):
+    monkeypatch.setattr(core_classes, "_strict_validation", False)
+    constructed = RunAlgorithm.from_graphql(RUN)
+    monkeypatch.setattr(core_classes, "_strict_validation", True)
+    assert constructed == RunAlgorithm.from_graphql(RUN)
+
+
+def test_construct_fills_defaults(strict):
+    run = core_classes.construct(RunAlgorithm, algorithm=Algorithm(id="algorithm", name="name"))
+    assert (run.id, run.comments, run.ratings) == (None, None, None)
+
+
+def test_run_returns_the_created_run(tree):
+    calls = []
+
+    def query_graphql(query: str, variables: dict | None = None, retry: bool | None = None):
+        calls.append(variables)
+        return {"algorithmRun": RUN}
+
+    tree.api.query_graphql = query_graphql
+    run = RunAlgorithm.run(tree.api, "slide", "algorithm")
+
+    assert calls == [{"slide": "slide", "algorithm": "algorithm", "roi": None}]
+    assert run.id == "run"
+    assert len(run.comments) == 3
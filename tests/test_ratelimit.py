@@ -0,0 +1,94 @@
+import pytest
+
+from ccai_client import ratelimit
+from ccai_client.ratelimit import RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket(clock):
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter._take_token() for _ in range(4)] == [0, 0, 0, 0.5]
+    clock.now += 1
+    assert [limiter._take_token() for _ in range(3)] == [0, 0, 0.5]
+
+
+def test_no_limit_by_default(clock):
+    limiter = RateLimiter()
+    assert all(limiter._take_token() == 0 for _ in range(1000))
+
+
+def test_configured_rate_and_burst_recover(clock):
+    limiter = RateLimiter(rate=8, burst=4, increase=1)
+    limiter.on_throttled()
+    limiter.on_throttled()
+    assert limiter.rate == 2
+
+    rates = []
+    for _ in range(6):
+        limiter.on_success()
+        rates.append(limiter.rate)
+    assert rates == [3, 4, 5, 6, 7, 8]
+    assert (limiter.burst, limiter._throttled_at) == (4, None)
+
+
+def test_no_limit_recovers(clock):
+    limiter = RateLimiter(throttled_rate=10, increase=1, recovery=60)
+    limiter.on_throttled()
+    assert (limiter.rate, limiter.burst) == (10, 10)
+    assert limiter._take_token() == pytest.approx(0.1)
+
+    clock.now += 30
+    limiter.on_success()
+    assert limiter.rate == 11
+    limiter.on_throttled()
+    assert limiter.rate == 5.5
+
+    # 60 seconds after the last 429, not the first one
+    clock.now += 59
+    limiter.on_success()
+    assert limiter.rate == 6.5
+    clock.now += 1
+    limiter.on_success()
+    assert limiter.rate is None
+    assert all(limiter._take_token() == 0 for _ in range(1000))
+
+    # throttled again, from the start
+    limiter.on_throttled()
+    assert (limiter.rate, limiter.burst) == (10, 10)
+
+
+def test_configured_burst_is_kept_after_no_limit(clock):
+    limiter = RateLimiter(burst=3, throttled_rate=10)
+    limiter.on_throttled()
+    assert limiter.burst == 3
+
+
+def test_configured_rate_recovers_after_quiet_period(clock):
+    limiter = RateLimiter(rate=100, burst=20, min_rate=1, increase=0.1, recovery=60)
+    for _ in range(10):
+        limiter.on_throttled()
+    assert limiter.rate == 1
+    clock.now += 60
+    limiter.on_success()
+    assert (limiter.rate, limiter.burst) == (100, 20)
+
+
+def test_not_adaptive(clock):
+    limiter = RateLimiter(rate=8, adaptive=False)
+    limiter.on_throttled()
+    limiter.on_success()
+    assert limiter.rate == 8
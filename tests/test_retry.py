@@ -0,0 +1,88 @@
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from ccai_client.retry import RetryPolicy
+
+
+def response(status: int, headers: dict[str, str] | None = None) -> requests.Response:
+    result = requests.Response()
+    result.status_code = status
+    result.headers.update(headers or {})
+    return result
+
+
+@pytest.mark.parametrize(
+    "idempotent, status, expected",
+    [
+        (True, 503, True),
+        (True, 429, True),
+        (True, 404, False),
+        (True, 200, False),
+        # the server may have processed a mutation which failed with 5xx
+        (False, 503, False),
+        (False, 429, True),
+    ],
+)
+def test_should_retry_status(idempotent, status, expected):
+    assert RetryPolicy().should_retry(0, idempotent, response(status)) is expected
+
+
+@pytest.mark.parametrize(
+    "idempotent, error, expected",
+    [
+        (True, requests.ConnectTimeout(), True),
+        (False, requests.ConnectTimeout(), True),
+        (True, requests.ReadTimeout(), True),
+        (False, requests.ReadTimeout(), False),
+        (True, requests.ConnectionError(), True),
+        (False, requests.ConnectionError(), False),
+        (True, requests.TooManyRedirects(), False),
+    ],
+)
+def test_should_retry_error(idempotent, error, expected):
+    assert RetryPolicy().should_retry(0, idempotent, error=error) is expected
+
+
+def test_should_retry_stops_after_max_retries():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.should_retry(1, True, response(503))
+    assert not policy.should_retry(2, True, response(503))
+    assert not policy.should_retry(2, True, error=requests.ConnectTimeout())
+
+
+def test_timeout():
+    assert RetryPolicy(connect_timeout=3, read_timeout=30).timeout == (3, 30)
+
+
+def test_backoff_is_jittered_exponential(monkeypatch):
+    policy = RetryPolicy(backoff_factor=0.5, max_backoff=3.0)
+    monkeypatch.setattr("random.uniform", lambda low, high: high)
+    assert [policy.backoff(attempt) for attempt in range(5)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+
+    monkeypatch.undo()
+    delays = [policy.backoff(2) for _ in range(200)]
+    assert all(0 <= delay <= 2.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_backoff_retry_after_seconds():
+    policy = RetryPolicy(max_backoff=60)
+    assert policy.backoff(0, response(429, {"Retry-After": "7"})) == 7.0
+    assert policy.backoff(0, response(429, {"Retry-After": "600"})) == 60
+
+
+def test_backoff_retry_after_date():
+    policy = RetryPolicy(max_backoff=60)
+    delay = policy.backoff(0, response(503, {"Retry-After": formatdate(time.time() + 20, usegmt=True)}))
+    assert 18 <= delay <= 20
+    assert policy.backoff(0, response(503, {"Retry-After": formatdate(time.time() - 20, usegmt=True)})) == 0
+
+
+def test_backoff_invalid_retry_after(monkeypatch):
+    monkeypatch.setattr("random.uniform", lambda low, high: high)
+    policy = RetryPolicy(backoff_factor=1.0)
+    assert policy.backoff(1, response(503, {"Retry-After": "soon"})) == 2.0
+    assert policy.backoff(1, response(503)) == 2.0
@@ -0,0 +1,78 @@
+import io
+import json
+
+import pytest
+
+from ccai_client import streaming
+from ccai_client.streaming import iter_json_items
+
+DOCUMENT = {
+    "data": {
+        "file": {
+            "id": "slide",
+            "annotations": {
+                "totalCount": 3,
+                "edges": [
+                    {"node": {"id": "a1", "shapeData": [1, 2, 3, 4], "meta": {"tags": [{"id": "t"}]}}},
+                    {"node": {"id": "a2", "shapeData": [], "label": None, "score": 0.5}},
+                    {"node": {"id": "a3", "nested": [[1, [2]], {"edges": [{"node": 1}]}]}},
+                ],
+            },
+        },
+        "empty": [],
+    },
+    "errors": [{"message": "partial", "path": ["data", "file"]}],
+}
+
+
+@pytest.fixture(params=["ijson", "json"])
+def parser(request, monkeypatch):
+    if request.param == "ijson":
+        pytest.importorskip("ijson")
+    else:
+        monkeypatch.setattr(streaming, "ijson", None)
+    return request.param
+
+
+def items(document, *prefixes: str) -> list:
+    return list(iter_json_items(io.BytesIO(json.dumps(document).encode()), prefixes))
+
+
+def test_array_items(parser):
+    nodes = [edge["node"] for edge in DOCUMENT["data"]["file"]["annotations"]["edges"]]
+    assert items(DOCUMENT, "data.file.annotations.edges.item.node") == [
+        ("data.file.annotations.edges.item.node", node) for node in nodes
+    ]
+
+
+def test_scalars_objects_and_document_order(parser):
+    result = items(DOCUMENT, "errors.item", "data.file.id", "data.file.annotations.totalCount")
+    assert result == [
+        ("data.file.id", "slide"),
+        ("data.file.annotations.totalCount", 3),
+        ("errors.item", {"message": "partial", "path": ["data", "file"]}),
+    ]
+
+
+def test_nested_prefixes_are_not_confused(parser):
+    # "edges.item.node" inside a node has a longer prefix and is part of the yielded value
+    result = items(DOCUMENT, "data.file.annotations.edges.item.node.nested")
+    assert result == [("data.file.annotations.edges.item.node.nested", [[1, [2]], {"edges": [{"node": 1}]}])]
+
+
+def test_empty_and_missing(parser):
+    assert items(DOCUMENT, "data.empty") == [("data.empty", [])]
+    assert items(DOCUMENT, "data.empty.item", "data.missing") == []
+    assert items({"data": None}, "data.file.id") == []
+
+
+def test_null_and_float_values(parser):
+    assert items({"data": {"value": None, "score": 0.25}}, "data.value", "data.score") == [
+        ("data.value", None),
+        ("data.score", 0.25),
+    ]
+
+
+def test_loads_bytes_and_text():
+    assert streaming.loads(b'{"a": [1, 2.5]}') == {"a": [1, 2.5]}
+    assert streaming.loads('{"a": "ż"}') == {"a": "ż"}
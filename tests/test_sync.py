@@ -0,0 +1,88 @@
+import pytest
+
+from ccai_client.sync import STATE_FILE, SyncState, _Entry, sync_folder
+
+from .conftest import file_node
+
+
+@pytest.fixture
+def linked(tree):
+    """Folder C linked in both A and B, which links back to the root"""
+    tree.folder("root")
+    tree.folder("A")
+    tree.folder("B")
+    tree.folder("C")
+    tree.file("x", "x.txt", b"x" * 10)
+    tree.file("y", "y.txt", b"y" * 20)
+    tree.link("root", "A", "B")
+    tree.link("A", "C", "x")
+    tree.link("B", "C", "root")
+    tree.link("C", "y")
+    return tree
+
+
+def test_linked_folder_is_mirrored_to_every_path(linked, tmp_path):
+    result = sync_folder(linked.root("root"), tmp_path, max_workers=4)
+
+    assert sorted(result.transferred) == ["A/C/y.txt", "A/x.txt", "B/C/y.txt"]
+    assert not result.failed
+    assert (tmp_path / "A/C/y.txt").read_bytes() == (tmp_path / "B/C/y.txt").read_bytes() == b"y" * 20
+
+
+def test_unchanged_tree_is_not_transferred_again(linked, tmp_path):
+    sync_folder(linked.root("root"), tmp_path, max_workers=4)
+    for _ in range(5):
+        linked.downloads.clear()
+        result = sync_folder(linked.root("root"), tmp_path, remove=True, max_workers=4)
+        assert linked.downloads == []
+        assert result.transferred == result.stale == result.removed == []
+        assert sorted(result.unchanged) == ["A/C/y.txt", "A/x.txt", "B/C/y.txt"]
+    assert (tmp_path / "A/C/y.txt").exists() and (tmp_path / "B/C/y.txt").exists()
+
+
+def test_changed_file_is_updated_under_every_path(linked, tmp_path):
+    sync_folder(linked.root("root"), tmp_path)
+    linked.file("y", "y.txt", b"new", updated_at="2024-02-01T00:00:00+00:00")
+    linked.folders["C"] = [linked.nodes["y"]]
+
+    result = sync_folder(linked.root("root"), tmp_path, remove=True)
+    assert sorted(result.transferred) == ["A/C/y.txt", "B/C/y.txt"]
+    assert result.unchanged == ["A/x.txt"]
+    assert (tmp_path / "A/C/y.txt").read_bytes() == (tmp_path / "B/C/y.txt").read_bytes() == b"new"
+
+
+def test_removed_link_removes_only_its_copies(linked, tmp_path):
+    sync_folder(linked.root("root"), tmp_path)
+    linked.folders["B"] = [linked.nodes["root"]]
+
+    result = sync_folder(linked.root("root"), tmp_path, remove=True)
+    assert result.removed == ["B/C/y.txt"]
+    assert (tmp_path / "A/C/y.txt").exists()
+    assert not (tmp_path / "B/C").exists()
+
+
+def test_slide_being_processed_keeps_its_local_copy(linked, tmp_path):
+    slide = file_node(
+        "PathologySlideNode",
+        "slide",
+        "slide.svs",
+        dziUrl=None,
+        slideProperties=None,
+        isReady=False,
+        processingTask=None,
+        thumbnailUrl=None,
+    )
+    linked.nodes["slide"] = slide
+    linked.link("A", "slide")
+    # synced before the slide was uploaded again
+    (tmp_path / "A/slide.svs").mkdir(parents=True)
+    (tmp_path / "A/slide.svs/slide.svs").write_bytes(b"s" * 30)
+    state = SyncState(tmp_path / STATE_FILE)
+    state.save(_Entry("A/slide.svs", "slide", "slide", None, None), 30)
+    state.close()
+
+    result = sync_folder(linked.root("root"), tmp_path, remove=True, masks=False)
+    assert result.skipped == ["A/slide.svs"]
+    assert result.stale == result.removed == []
+    assert "A/slide.svs" not in result.transferred
+    assert (tmp_path / "A/slide.svs/slide.svs").read_bytes() == b"s" * 30
@@ -3,6 +3,7 @@ import sys
 
 import requests
 
+import ccai_client.batch
 import ccai_client.queries
 
 GRAPHQL_URL = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000/graphql"
@@ -18,3 +19,7 @@ for query in dir(ccai_client.queries):
     query_name = query_search.group(2)
     print(f"{query}: {query_name}")
     requests.post(GRAPHQL_URL, json={"query": query_body, "operationName": query_name}, headers={"x-save-query": "1"})
+
+for query_name, query_body in ccai_client.batch.batch_documents().items():
+    print(f"batch: {query_name}")
+    requests.post(GRAPHQL_URL, json={"query": query_body, "operationName": query_name}, headers={"x-save-query": "1"})